@@ -1,15 +1,29 @@
 import os
 import json
+import threading
+import time
+import uuid
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-import joblib
-
-from train import train_models, MODEL_FILES, META_FILE, build_text
-from scripts.parse_logs import parse_lines, enrich_record
+from train import build_text
+from compression import COMPRESSION_SUFFIXES, base_suffix, open_text, strip_compression
+from inference import PREDICT_BATCH_SIZE, PredictionCache, predict_texts
+from chunks import ChunkedPredictor, ChunkStore
+import metrics
+from metrics import StageTimings, count_bytes, count_json_warnings, observe_stage
+from reports import FILTER_COLUMNS, REPORT_SUFFIX, PagedReport, StreamingReportWriter, is_paged_report, report_size
+from logcol import LogColReader, is_logcol, jsonl_to_logcol, logcol_size, logcol_to_jsonl
+from jobs import JobManager, JobProgress
+from registry import ModelRegistry, UnknownModelVersion
+from split import SPLIT_KEYS, split_jsonl, split_lines
+from scripts.parse_logs import (LogFollower, atomize_file as atomize_raw_file, atomize_to_path, iter_enriched,
+                                iter_templated, open_follow_output, parse_lines, write_jsonl)
+from watch import WatchContext, WatchManager
+from scripts.templates import TemplateMiner, templates_path, write_templates
 
 APP_PORT = int(os.getenv("ML_LOG_ANALYZER_PORT", "5050"))
 MODEL_DIR = os.getenv("ML_LOG_ANALYZER_MODEL_DIR", "models")
@@ -17,18 +31,95 @@ CORS_ORIGINS = os.getenv("ML_LOG_ANALYZER_CORS_ORIGINS", "*")
 DATA_DIR = os.getenv("ML_LOG_ANALYZER_DATA_DIR", "data")
 TRAINING_DIR = os.getenv("ML_LOG_ANALYZER_TRAINING_DIR", "training")
 ANALYSIS_DIR = os.getenv("ML_LOG_ANALYZER_ANALYSIS_DIR", "analysis")
+JOBS_DIR = os.getenv("ML_LOG_ANALYZER_JOBS_DIR", "jobs")
+JOB_WORKERS = int(os.getenv("ML_LOG_ANALYZER_JOB_WORKERS", "2"))
+TRAIN_JOB_LIMIT = int(os.getenv("ML_LOG_ANALYZER_TRAIN_JOB_LIMIT", "1"))
+# Seconds a stopping worker waits for its jobs and watches (keep it below
+# gunicorn's graceful timeout)
+SHUTDOWN_SECONDS = float(os.getenv("ML_LOG_ANALYZER_SHUTDOWN_SECONDS", "10"))
+# Store analysis report rows gzip-compressed (in independently readable blocks)
+REPORT_COMPRESS = os.getenv("ML_LOG_ANALYZER_REPORT_COMPRESS", "0").lower() in ("1", "true", "yes")
+# "background": each process answers right away and loads + warms the models
+# in a thread (see /health/ready); "blocking": startup() does it first (with
+# gunicorn once in the master, so the workers share the loaded model)
+WARMUP_MODE = os.getenv("ML_LOG_ANALYZER_WARMUP", "background").lower()
+WARMUP_RETRY_SECONDS = float(os.getenv("ML_LOG_ANALYZER_WARMUP_RETRY_SECONDS", "10"))
+WATCH_DIR = os.getenv("ML_LOG_ANALYZER_WATCH_DIR", "watches")
+# Results of analyzed chunks per model version: re-analyzing a file only
+# predicts its new or changed chunks
+CHUNK_DIR = os.getenv("ML_LOG_ANALYZER_CHUNK_DIR", "chunks")
+CHUNK_REUSE = os.getenv("ML_LOG_ANALYZER_CHUNK_REUSE", "0").lower() in ("1", "true", "yes")
+# Seconds between sweeps of chunks no manifest refers to any more
+CHUNK_SWEEP_SECONDS = float(os.getenv("ML_LOG_ANALYZER_CHUNK_SWEEP_SECONDS", "3600"))
+# Followed logs: seconds between polls; a watch's analysis report is closed
+# (and its position committed) after this many seconds or rows
+WATCH_POLL_SECONDS = float(os.getenv("ML_LOG_ANALYZER_WATCH_POLL_SECONDS", "1"))
+WATCH_REPORT_SECONDS = float(os.getenv("ML_LOG_ANALYZER_WATCH_REPORT_SECONDS", "60"))
+WATCH_REPORT_ROWS = int(os.getenv("ML_LOG_ANALYZER_WATCH_REPORT_ROWS", "100000"))
+# Upper bound for remembered template group predictions within one analysis
+TEMPLATE_GROUPS_MAX = 100000
+# Largest page /analysis-report/rows hands out
+REPORT_PAGE_MAX = 1000
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": CORS_ORIGINS}})
 
-_models = {
-    "priority": None,
-    "category": None,
-    "reason": None,
-    "meta": None
-}
+_prediction_cache = PredictionCache()
+# Cached predictions are keyed by model version; drop the old ones on a swap
+_registry = ModelRegistry(MODEL_DIR, on_swap=lambda models: _prediction_cache.clear())
+_chunk_store = ChunkStore(CHUNK_DIR)
+_chunk_sweeper: Dict[str, Any] = {"pid": None}
 
 _UPLOAD_EXTENSIONS = {".jsonl", ".json", ".log", ".txt", ".html"}
+_RAW_EXTENSIONS = {".txt", ".log", ".html"}
+_LOG_EXTENSIONS = {".jsonl", ".json"}
+# Streamed request bodies are written in blocks of this size
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+_jobs = JobManager(JOBS_DIR, max_workers=JOB_WORKERS, kind_limits={"train": TRAIN_JOB_LIMIT})
+
+metrics.register_gauge(
+    "model_loaded", "Model versions held in memory by the answering process (current=1 for the active one)",
+    ("version", "current"),
+    lambda: {(str(v), "1" if i == 0 else "0"): 1 for i, v in enumerate(_registry.loaded_versions())}
+)
+metrics.register_gauge(
+    "ready", "1 once the answering process has loaded and warmed up its models", (),
+    lambda: {(): 1 if _readiness["state"] == "ready" else 0}
+)
+metrics.register_gauge(
+    "prediction_cache_entries", "Entries in the prediction cache of the answering process", (),
+    lambda: {(): _prediction_cache.stats()["size"]}
+)
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _observe_request(response):
+    # Route templates (/jobs/<job_id>), not raw paths, keep the series bounded.
+    # A streamed response is measured until its first byte.
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+    return response
+
+
+class _BadRequest(ValueError):
+    # Raised by the _prepare_*/_run_* helpers; rendered as a 400 response
+    # for synchronous calls and as the error of a failed job.
+    def __init__(self, message: str, **extra: Any):
+        super().__init__(message)
+        self.extra = extra
+
+
+@app.errorhandler(_BadRequest)
+def _handle_bad_request(exc: _BadRequest):
+    return jsonify({"error": str(exc), **exc.extra}), 400
 
 
 def _safe_join_data(path_value: str) -> Optional[str]:
@@ -70,37 +161,57 @@ def _safe_join_analysis(path_value: str) -> Optional[str]:
     return candidate
 
 
-def _read_logs_file(file_path: str) -> tuple[List[Dict[str, Any]], List[str]]:
-    if file_path.endswith(".jsonl"):
-        logs: List[Dict[str, Any]] = []
+def _iter_jsonl(fh, warnings: List[str]) -> Iterator[Any]:
+    for idx, line in enumerate(fh, start=1):
+        raw = line.strip()
+        if not raw:
+            continue
+        try:
+            yield json.loads(raw)
+        except json.JSONDecodeError as exc:
+            warnings.append(f"Invalid JSON at line {idx}: {exc}")
+            count_json_warnings("read_logs_file")
+
+
+def _read_logs_file(file_path: str,
+                    timings: Optional[StageTimings] = None) -> tuple[List[Dict[str, Any]], List[str]]:
+    started = time.perf_counter()
+    logs, warnings = _load_logs_file(file_path)
+    observe_stage("read_logs_file", time.perf_counter() - started, len(logs), timings=timings)
+    count_bytes("read_logs_file", _file_size(file_path))
+    return logs, warnings
+
+
+def _file_size(file_path: str) -> int:
+    # On-disk size (compressed size for .gz etc., all columns for .logcol)
+    if is_logcol(file_path):
+        return logcol_size(file_path)
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+def _load_logs_file(file_path: str) -> tuple[List[Dict[str, Any]], List[str]]:
+    if is_logcol(file_path):
+        return list(LogColReader(file_path).iter_rows()), []
+
+    # .gz/.bz2/.xz/.zst are decompressed while reading
+    fmt = base_suffix(file_path)
+    if fmt == ".jsonl":
         warnings: List[str] = []
-        with open(file_path, "r", encoding="utf-8") as fh:
-            for idx, line in enumerate(fh, start=1):
-                raw = line.strip()
-                if not raw:
-                    continue
-                try:
-                    logs.append(json.loads(raw))
-                except json.JSONDecodeError as exc:
-                    warnings.append(f"Invalid JSON at line {idx}: {exc}")
+        with open_text(file_path) as fh:
+            logs: List[Dict[str, Any]] = list(_iter_jsonl(fh, warnings))
         return logs, warnings
 
-    if file_path.endswith(".json"):
+    if fmt == ".json":
         warnings: List[str] = []
-        with open(file_path, "r", encoding="utf-8") as fh:
+        with open_text(file_path) as fh:
             try:
                 data = json.load(fh)
             except json.JSONDecodeError:
                 fh.seek(0)
-                logs: List[Dict[str, Any]] = []
-                for idx, line in enumerate(fh, start=1):
-                    raw = line.strip()
-                    if not raw:
-                        continue
-                    try:
-                        logs.append(json.loads(raw))
-                    except json.JSONDecodeError as exc:
-                        warnings.append(f"Invalid JSON at line {idx}: {exc}")
+                logs: List[Dict[str, Any]] = list(_iter_jsonl(fh, warnings))
                 return logs, warnings
 
         if isinstance(data, dict) and "logs" in data:
@@ -114,93 +225,253 @@ def _read_logs_file(file_path: str) -> tuple[List[Dict[str, Any]], List[str]]:
     raise ValueError("unsupported file format")
 
 
-def _write_jsonl(file_path: str, rows: List[Dict[str, Any]]) -> None:
-    with open(file_path, "w", encoding="utf-8") as out:
-        for row in rows:
-            out.write(json.dumps(row, ensure_ascii=True) + "\n")
+def _iter_logs_file(file_path: str, warnings: List[str]) -> Iterator[Any]:
+    # Lazy counterpart of _read_logs_file: JSONL is read line by line, a
+    # .json document has to be decoded as a whole first.
+    if base_suffix(file_path) == ".jsonl":
+        with open_text(file_path) as fh:
+            yield from _iter_jsonl(fh, warnings)
+        return
+    if is_logcol(file_path):
+        yield from LogColReader(file_path).iter_rows()
+        return
+    logs, file_warnings = _load_logs_file(file_path)
+    warnings.extend(file_warnings)
+    yield from logs
+
+
+def _iter_batches(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch: List[Any] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 
 def _estimate_jsonl_bytes(rows: List[Dict[str, Any]]) -> int:
     return sum(len(json.dumps(r, ensure_ascii=True).encode("utf-8")) + 1 for r in rows)
 
 
-def _load_models() -> None:
-    priority_path = os.path.join(MODEL_DIR, MODEL_FILES["priority"])
-    category_path = os.path.join(MODEL_DIR, MODEL_FILES["category"])
-    reason_path = os.path.join(MODEL_DIR, MODEL_FILES["reason"])
-    meta_path = os.path.join(MODEL_DIR, META_FILE)
+def _get_models(version: Optional[str] = None) -> Dict[str, Any]:
+    # One snapshot per request: a hot-swap during the request doesn't mix
+    # heads of two versions
+    try:
+        return _registry.get(version)
+    except UnknownModelVersion:
+        raise _BadRequest(f"unknown model version: {version}")
+
+
+# Readiness of this process: starting -> warming -> ready (or failed, retried)
+_readiness: Dict[str, Any] = {"state": "starting", "pid": None, "model_version": None, "seconds": None,
+                              "error": None}
+_readiness_lock = threading.Lock()
+_WARMUP_LOG = {
+    "message": "Warm-up request finished on /api/health [GET] 200",
+    "level": "INFO",
+    "service": "warmup",
+    "route": "/api/health",
+    "status_code": 200
+}
+
+
+def _warm_up() -> None:
+    # Loads the active model (unless preload_models did in the gunicorn
+    # master) and runs one throwaway inference, so the first real request
+    # doesn't pay for unpickling, lazy imports or page faults
+    started = time.perf_counter()
+    models = _registry.current()
+    if any(models.get(key) is not None for key in ("category", "priority", "reason")):
+        predict_texts(models, [build_text(_WARMUP_LOG)])
+    _readiness.update(state="ready", model_version=models["version"], error=None,
+                      seconds=round(time.perf_counter() - started, 4))
+
+
+def _warm_up_loop() -> None:
+    while True:
+        try:
+            _warm_up()
+            return
+        except Exception as exc:
+            _readiness.update(state="failed", error=str(exc))
+            time.sleep(WARMUP_RETRY_SECONDS)
+
+
+def preload_models() -> None:
+    # gunicorn master, before gc.freeze() and the fork: the active model is
+    # loaded once and its pages are shared copy-on-write by the workers.
+    # If it fails, every worker loads the model in its warm-up instead.
+    try:
+        _registry.reload()
+    except Exception as exc:
+        _readiness.update(error=str(exc))
+
+
+def start_warmup() -> None:
+    # Once per process (gunicorn: in every worker after the fork). A worker
+    # forked from a master that warmed up in blocking mode is ready as is.
+    with _readiness_lock:
+        if _readiness["state"] == "ready":
+            return
+        if _readiness["state"] in ("warming", "failed") and _readiness["pid"] == os.getpid():
+            return
+        _readiness.update(state="warming", pid=os.getpid())
+    threading.Thread(target=_warm_up_loop, name="model-warmup", daemon=True).start()
+
 
-    if os.path.exists(priority_path):
-        _models["priority"] = joblib.load(priority_path)
-    if os.path.exists(category_path):
-        _models["category"] = joblib.load(category_path)
-    if os.path.exists(reason_path):
-        _models["reason"] = joblib.load(reason_path)
-    if os.path.exists(meta_path):
-        with open(meta_path, "r", encoding="utf-8") as fh:
-            _models["meta"] = json.load(fh)
+@app.get("/health/live")
+def health_live():
+    # Liveness: the process answers; never touches the models
+    return jsonify({"ok": True, "pid": os.getpid()})
 
 
-def _ensure_models() -> None:
-    if _models["priority"] is None or _models["category"] is None or _models["reason"] is None:
-        _load_models()
+@app.get("/health/ready")
+def health_ready():
+    # Readiness: models loaded and warmed up (also when there is no model
+    # yet - the instance can serve uploads and training then)
+    ready = _readiness["state"] == "ready"
+    body = {"ready": ready, **{k: v for k, v in _readiness.items() if k != "pid"}, "pid": os.getpid()}
+    return jsonify(body), 200 if ready else 503
 
 
 @app.get("/health")
 def health():
-    _ensure_models()
+    # Doesn't wait for a model that is still being loaded
+    models = _get_models() if _readiness["state"] == "ready" else _registry.snapshot()
     return jsonify({
         "ok": True,
+        "ready": _readiness["state"] == "ready",
         "time": datetime.utcnow().isoformat() + "Z",
+        "model_version": models["version"],
+        "model_format": models.get("format"),
+        # Tells apart the worker processes behind one port
+        "pid": os.getpid(),
         "models": {
-            "priority": _models["priority"] is not None,
-            "category": _models["category"] is not None,
-            "reason": _models["reason"] is not None
+            "priority": models["priority"] is not None,
+            "category": models["category"] is not None,
+            "reason": models["reason"] is not None
         }
     })
 
 
-@app.post("/train")
-def train_endpoint():
-    payload = request.get_json(silent=True) or {}
-    data_path = payload.get("data_path") or os.getenv("ML_LOG_ANALYZER_DATA", "data/logs_train.jsonl")
-    out_dir = payload.get("out_dir") or MODEL_DIR
+def _submit_job(kind: str, params: Dict[str, Any]):
+    record = _jobs.submit(kind, params)
+    return jsonify({"ok": True, "job": record}), 202
+
+
+def _prepare_train(payload: Dict[str, Any]) -> Dict[str, Any]:
+    mode = payload.get("mode") or "full"
+    if mode not in ("full", "incremental"):
+        raise _BadRequest("mode must be 'full' or 'incremental'")
+    sizes: Dict[str, Optional[int]] = {}
+    for key in ("chunk_size", "max_per_class"):
+        try:
+            sizes[key] = int(payload[key]) if payload.get(key) is not None else None
+        except (TypeError, ValueError):
+            sizes[key] = 0
+        if sizes[key] is not None and sizes[key] <= 0:
+            raise _BadRequest(f"{key} must be a positive integer")
+    return {
+        "data_path": payload.get("data_path") or os.getenv("ML_LOG_ANALYZER_DATA", "data/logs_train.jsonl"),
+        "out_dir": payload.get("out_dir") or MODEL_DIR,
+        "mode": mode,
+        "fresh": bool(payload.get("fresh")),
+        **sizes
+    }
 
-    result = train_models(data_path=data_path, out_dir=out_dir)
+
+def _run_train(params: Dict[str, Any], progress: Optional[JobProgress] = None) -> Dict[str, Any]:
+    # Each run becomes a new version under MODEL_DIR/versions and is only
+    # activated once it is completely written
+    registry = _registry if params["out_dir"] == MODEL_DIR else ModelRegistry(params["out_dir"])
+    started = time.perf_counter()
+    result = registry.train(
+        data_path=params["data_path"],
+        progress=progress.update if progress else None,
+        mode=params.get("mode") or "full",
+        chunk_size=params.get("chunk_size"),
+        fresh=bool(params.get("fresh")),
+        max_per_class=params.get("max_per_class")
+    )
+    total_seconds = time.perf_counter() - started
+    observe_stage("train_total", total_seconds)
+    result.setdefault("timings", {})["total_seconds"] = round(total_seconds, 4)
     os.makedirs(TRAINING_DIR, exist_ok=True)
     stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
     report_name = f"training_{stamp}.json"
     report_path = os.path.join(TRAINING_DIR, report_name)
     with open(report_path, "w", encoding="utf-8") as fh:
         json.dump(result, fh, indent=2)
-    _load_models()
-    return jsonify({"ok": True, "result": result, "report_file": report_name})
+    return {"ok": True, "result": result, "report_file": report_name, "model_version": result["version"]}
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    # Prometheus text format; see metrics.py for the multi-worker setup
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/prediction-cache")
+def prediction_cache_stats():
+    return jsonify({"model_version": _get_models()["version"], "cache": _prediction_cache.stats()})
+
+
+@app.post("/train")
+def train_endpoint():
+    payload = request.get_json(silent=True) or {}
+    params = _prepare_train(payload)
+    if payload.get("async"):
+        return _submit_job("train", params)
+    # Counts against TRAIN_JOB_LIMIT like a train job
+    with _jobs.slot("train"):
+        result = _run_train(params)
+    return jsonify(result)
 
 
 @app.post("/upload-file")
 def upload_file():
-    if "file" not in request.files:
-        return jsonify({"error": "file is required"}), 400
-    file = request.files.get("file")
-    if not file or not file.filename:
-        return jsonify({"error": "file is required"}), 400
-
-    filename = secure_filename(file.filename)
+    # Either multipart ("file" field) or the raw file as request body with
+    # ?name=...; the raw body is streamed to disk block by block
+    raw_body = request.mimetype == "application/octet-stream"
+    if raw_body:
+        filename = secure_filename(request.args.get("name") or "")
+    else:
+        file = request.files.get("file")
+        if not file or not file.filename:
+            return jsonify({"error": "file is required"}), 400
+        filename = secure_filename(file.filename)
     if not filename:
         return jsonify({"error": "invalid filename"}), 400
 
-    ext = os.path.splitext(filename)[1].lower()
+    # Compressed uploads (app.log.gz) are kept compressed
+    ext = base_suffix(filename)
     if ext not in _UPLOAD_EXTENSIONS:
         allowed = ", ".join(sorted(_UPLOAD_EXTENSIONS))
-        return jsonify({"error": f"unsupported file type. Allowed: {allowed}"}), 400
+        compressed = ", ".join(COMPRESSION_SUFFIXES)
+        return jsonify({"error": f"unsupported file type. Allowed: {allowed} (optionally {compressed})"}), 400
 
     os.makedirs(DATA_DIR, exist_ok=True)
     dest = _safe_join_data(filename)
     if not dest:
         return jsonify({"error": "invalid destination"}), 400
 
-    file.save(dest)
-    return jsonify({"ok": True, "name": filename, "size": os.path.getsize(dest)})
+    if raw_body:
+        partial = dest + ".partial"
+        try:
+            with open(partial, "wb") as out:
+                for block in iter(lambda: request.stream.read(UPLOAD_CHUNK_BYTES), b""):
+                    out.write(block)
+            os.replace(partial, dest)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+    else:
+        file.save(dest)
+    size = os.path.getsize(dest)
+    count_bytes("upload", size)
+    return jsonify({"ok": True, "name": filename, "size": size})
 
 
 @app.get("/data-files")
@@ -211,9 +482,17 @@ def list_data_files():
 
     files = []
     for name in os.listdir(base_dir):
-        if not (name.endswith(".jsonl") or name.endswith(".json")):
-            continue
         full = os.path.join(base_dir, name)
+        if is_logcol(name) and os.path.isdir(full):
+            files.append({
+                "name": name,
+                "path": name,
+                "size": logcol_size(full),
+                "format": "logcol"
+            })
+            continue
+        if base_suffix(name) not in _LOG_EXTENSIONS or name.endswith(".templates.json"):
+            continue
         if os.path.isfile(full):
             files.append({
                 "name": name,
@@ -264,30 +543,110 @@ def list_analysis_files():
 
     files = []
     for name in os.listdir(base_dir):
-        if not name.endswith(".json"):
-            continue
         full = os.path.join(base_dir, name)
-        if os.path.isfile(full):
+        if is_paged_report(name) and os.path.isdir(full):
             files.append({
                 "name": name,
                 "path": name,
-                "size": os.path.getsize(full)
+                "size": report_size(full),
+                "format": "report"
+            })
+        elif name.endswith(".json") and os.path.isfile(full):
+            files.append({
+                "name": name,
+                "path": name,
+                "size": os.path.getsize(full),
+                "format": "json"
             })
     files.sort(key=lambda x: x["name"], reverse=True)
     return jsonify({"files": files})
 
 
+def _open_paged_report(name: Optional[str]) -> PagedReport:
+    safe_path = _safe_join_analysis(name)
+    if not safe_path or not is_paged_report(safe_path) or not os.path.isdir(safe_path):
+        raise _BadRequest("report not found or not a paged report")
+    try:
+        return PagedReport(safe_path)
+    except (OSError, ValueError) as exc:
+        raise _BadRequest(str(exc))
+
+
 @app.get("/analysis-report")
 def get_analysis_report():
     name = request.args.get("name")
     safe_path = _safe_join_analysis(name)
     if not safe_path or not os.path.exists(safe_path):
         return jsonify({"error": "file not found or not allowed"}), 400
+    if is_paged_report(safe_path):
+        # Only the metadata; rows come page by page from /analysis-report/rows
+        return jsonify({"name": name, "paged": True, "report": _open_paged_report(name).meta})
     with open(safe_path, "r", encoding="utf-8") as fh:
         data = json.load(fh)
     return jsonify({"name": name, "report": data})
 
 
+def _report_filters(report: PagedReport) -> Dict[str, List[str]]:
+    # ?priority=high&priority=critical or ?priority=high,critical
+    filters: Dict[str, List[str]] = {}
+    for column, _, _ in FILTER_COLUMNS:
+        values = [v.strip() for raw in request.args.getlist(column) for v in raw.split(",")]
+        values = [v for v in values if v]
+        if not values:
+            continue
+        if column not in report.columns:
+            raise _BadRequest(f"report has no column '{column}'")
+        filters[column] = values
+    return filters
+
+
+def _report_query(report: PagedReport) -> Dict[str, Any]:
+    # Row selection shared by the page and aggregate endpoints
+    return {
+        "filters": _report_filters(report),
+        "search": (request.args.get("q") or "").strip() or None,
+        "errors": request.args.get("errors", "").lower() in ("1", "true", "yes")
+    }
+
+
+@app.get("/analysis-report/rows")
+def get_analysis_report_rows():
+    report = _open_paged_report(request.args.get("name"))
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = int(request.args.get("limit", 50))
+    except ValueError:
+        raise _BadRequest("offset and limit must be integers")
+    if offset < 0 or limit <= 0:
+        raise _BadRequest("offset must be >= 0 and limit > 0")
+    sort = request.args.get("sort") or None
+    if sort not in (None, "priority"):
+        raise _BadRequest("sort must be 'priority'")
+    page = report.page(offset, min(limit, REPORT_PAGE_MAX), sort=sort, **_report_query(report))
+    return jsonify({"name": request.args.get("name"), "count": len(report), **page})
+
+
+@app.get("/analysis-report/aggregate")
+def get_analysis_report_aggregate():
+    # ?group_by=route,status&errors=1&service=api -> value counts per column
+    report = _open_paged_report(request.args.get("name"))
+    group_by = [v.strip() for raw in request.args.getlist("group_by") for v in raw.split(",") if v.strip()]
+    if not group_by:
+        group_by = list(report.columns)
+    unknown = [column for column in group_by if column not in report.columns]
+    if unknown:
+        raise _BadRequest("unknown group_by column", columns=unknown, available=list(report.columns))
+    try:
+        top = int(request.args.get("top", 0))
+    except ValueError:
+        raise _BadRequest("top must be an integer")
+    result = report.aggregate(group_by, **_report_query(report))
+    if top > 0:
+        for group in result["groups"].values():
+            group["counts"] = dict(list(group["counts"].items())[:top])
+    return jsonify({"name": request.args.get("name"), "count": len(report), **result})
+
+
 @app.get("/raw-files")
 def list_raw_files():
     base_dir = os.path.abspath(DATA_DIR)
@@ -296,7 +655,7 @@ def list_raw_files():
 
     files = []
     for name in os.listdir(base_dir):
-        if not (name.endswith(".txt") or name.endswith(".log") or name.endswith(".html")):
+        if base_suffix(name) not in _RAW_EXTENSIONS:
             continue
         full = os.path.join(base_dir, name)
         if os.path.isfile(full):
@@ -309,16 +668,54 @@ def list_raw_files():
     return jsonify({"files": files})
 
 
-@app.post("/predict-file")
-def predict_file():
-    _ensure_models()
-    payload = request.get_json(silent=True) or {}
+def _prepare_predict_file(payload: Dict[str, Any]) -> Dict[str, Any]:
     raw_path = payload.get("file_path") or payload.get("path")
     safe_path = _safe_join_data(raw_path)
     if not safe_path or not os.path.exists(safe_path):
-        return jsonify({"error": "file not found or not allowed"}), 400
+        raise _BadRequest("file not found or not allowed")
+    try:
+        batch_size = _parse_batch_size(payload)
+    except (TypeError, ValueError):
+        raise _BadRequest("batch_size must be a positive integer")
+    model_version = payload.get("model_version") or None
+    _get_models(model_version)
+    templates = bool(payload.get("templates"))
+    return {
+        "path": safe_path,
+        "batch_size": batch_size,
+        "templates": templates,
+        "model_version": model_version,
+        # Opt-in per request or via CHUNK_REUSE (stores every chunk's results
+        # on disk). Template ids depend on everything mined before a row, so
+        # template runs can't reuse chunks.
+        "reuse": bool(payload.get("reuse", CHUNK_REUSE)) and not templates
+    }
+
+
+@app.post("/predict-file")
+def predict_file():
+    payload = request.get_json(silent=True) or {}
+    params = _prepare_predict_file(payload)
+    safe_path = params["path"]
+    batch_size = params["batch_size"]
+
+    if payload.get("async"):
+        return _submit_job("predict-file", params)
+
+    if payload.get("stream"):
+        if not (base_suffix(safe_path) in _LOG_EXTENSIONS or is_logcol(safe_path)):
+            return jsonify({"error": "unsupported file format"}), 400
+        return Response(
+            stream_with_context(_stream_predict_file(
+                safe_path, batch_size or PREDICT_BATCH_SIZE, _get_models(params["model_version"]), params["templates"],
+                params["reuse"]
+            )),
+            mimetype="application/x-ndjson"
+        )
+
+    timings = StageTimings()
     try:
-        logs, warnings = _read_logs_file(safe_path)
+        logs, warnings = _read_logs_file(safe_path, timings)
     except Exception as exc:
         return jsonify({"error": str(exc)}), 400
 
@@ -327,246 +724,657 @@ def predict_file():
     if not logs:
         return jsonify({"error": "no valid logs parsed", "warnings": warnings}), 400
 
-    results = _predict_logs(logs)
-    os.makedirs(ANALYSIS_DIR, exist_ok=True)
-    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-    report_name = f"analysis_{stamp}.json"
-    report_path = os.path.join(ANALYSIS_DIR, report_name)
-    with open(report_path, "w", encoding="utf-8") as fh:
-        json.dump({
-            "created_at": stamp,
-            "source": os.path.basename(safe_path),
-            "count": len(logs),
-            "results": results,
-            "logs": logs
-        }, fh, indent=2)
-    response = {"logs": logs, "results": results, "report_file": report_name}
+    models = _get_models(params["model_version"])
+    miner = TemplateMiner() if params["templates"] else None
+    chunked = _new_chunked_predictor(params, models, timings)
+    if miner is not None:
+        results = _predict_logs_by_template(logs, miner, {}, batch_size=batch_size, models=models, timings=timings)
+    elif chunked is not None:
+        results = []
+        for _, chunk_results in chunked.add(logs, _build_texts(logs, timings)) + chunked.finish():
+            results.extend(chunk_results)
+    else:
+        results = _predict_logs(logs, batch_size=batch_size, models=models, timings=timings)
+    writer = _new_report_writer(safe_path)
+    try:
+        _write_report_batch(writer, logs, results, timings)
+    except BaseException:
+        writer.abort()
+        raise
+    report_name = writer.close(_report_extra(models, miner, timings, chunked))
+    response = {"logs": logs, "results": results, "report_file": report_name, "model_version": models["version"]}
+    if chunked is not None:
+        response["chunks"] = chunked.summary()
+    if miner is not None:
+        response["templates"] = miner.templates()
     if warnings:
         response["warnings"] = warnings
     return jsonify(response)
 
 
-@app.post("/atomize-file")
-def atomize_file():
-    payload = request.get_json(silent=True) or {}
+def _ndjson(obj: Dict[str, Any]) -> str:
+    return json.dumps(obj) + "\n"
+
+
+def _new_report_writer(safe_path: str, tag: str = "") -> StreamingReportWriter:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    # Analyses finishing in the same second (job threads, other workers)
+    # must not replace each other's report
+    unique = uuid.uuid4().hex[:8]
+    name = f"analysis_{stamp}_{tag}_{unique}{REPORT_SUFFIX}" if tag else f"analysis_{stamp}_{unique}{REPORT_SUFFIX}"
+    return StreamingReportWriter(ANALYSIS_DIR, name, stamp, os.path.basename(safe_path), compress=REPORT_COMPRESS)
+
+
+def _write_report_batch(writer: StreamingReportWriter, logs: List[Dict[str, Any]], results: List[Dict[str, Any]],
+                        timings: StageTimings) -> None:
+    started = time.perf_counter()
+    writer.write_batch(logs, results)
+    observe_stage("write_report", time.perf_counter() - started, len(logs), timings=timings)
+
+
+def _new_chunked_predictor(params: Dict[str, Any], models: Dict[str, Any],
+                           timings: StageTimings) -> Optional[ChunkedPredictor]:
+    if not params.get("reuse") or models.get("version") is None:
+        return None
+    return ChunkedPredictor(_chunk_store, params["path"], models, batch_size=params.get("batch_size"),
+                            cache=_prediction_cache, timings=timings)
+
+
+def _predict_file_batches(safe_path: str, batch_size: int, writer: StreamingReportWriter, warnings: List[str],
+                          models: Dict[str, Any], miner: Optional[TemplateMiner] = None,
+                          timings: Optional[StageTimings] = None, chunked: Optional[ChunkedPredictor] = None
+                          ) -> Iterator[tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    # With chunked, rows come back chunk by chunk instead of per batch
+    timings = timings if timings is not None else StageTimings()
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    batches = _iter_batches(_iter_logs_file(safe_path, warnings), batch_size)
+    while True:
+        # Reading/decoding is lazy, so it is timed as the wait for the next batch
+        started = time.perf_counter()
+        logs = next(batches, None)
+        if logs is None:
+            break
+        observe_stage("read_logs_file", time.perf_counter() - started, len(logs), timings=timings)
+        if chunked is not None:
+            for chunk_logs, chunk_results in chunked.add(logs, _build_texts(logs, timings)):
+                _write_report_batch(writer, chunk_logs, chunk_results, timings)
+                yield chunk_logs, chunk_results
+            continue
+        if miner is not None:
+            results = _predict_logs_by_template(logs, miner, groups, batch_size=batch_size, start_index=writer.count,
+                                                models=models, timings=timings)
+        else:
+            texts = _build_texts(logs, timings)
+            results = predict_texts(models, texts, batch_size=batch_size, start_index=writer.count,
+                                    cache=_prediction_cache, timings=timings)
+        _write_report_batch(writer, logs, results, timings)
+        yield logs, results
+    if chunked is not None:
+        for chunk_logs, chunk_results in chunked.finish():
+            _write_report_batch(writer, chunk_logs, chunk_results, timings)
+            yield chunk_logs, chunk_results
+    count_bytes("read_logs_file", _file_size(safe_path))
+
+
+def _report_extra(models: Dict[str, Any], miner: Optional[TemplateMiner],
+                  timings: Optional[StageTimings] = None,
+                  chunked: Optional[ChunkedPredictor] = None) -> Dict[str, Any]:
+    extra: Dict[str, Any] = {"model_version": models["version"]}
+    if miner is not None:
+        extra["templates"] = miner.templates()
+    if chunked is not None:
+        extra["chunks"] = chunked.summary()
+    if timings is not None:
+        extra["timings"] = timings.as_dict()
+    return extra
+
+
+def _stream_predict_file(safe_path: str, batch_size: int, models: Dict[str, Any],
+                         templates: bool = False, reuse: bool = False) -> Iterator[str]:
+    # One NDJSON line per micro-batch ({"type": "batch", "logs", "results"}),
+    # followed by {"type": "done"} or {"type": "error"}. Only the current
+    # batch is held in memory; the report is appended to as batches finish.
+    writer = _new_report_writer(safe_path)
+    miner = TemplateMiner() if templates else None
+    timings = StageTimings()
+    chunked = _new_chunked_predictor({"path": safe_path, "batch_size": batch_size, "reuse": reuse}, models, timings)
+    warnings: List[str] = []
+    sent_warnings = 0
+    try:
+        for logs, results in _predict_file_batches(safe_path, batch_size, writer, warnings, models, miner, timings,
+                                                   chunked):
+            line: Dict[str, Any] = {"type": "batch", "logs": logs, "results": results}
+            if len(warnings) > sent_warnings:
+                line["warnings"] = warnings[sent_warnings:]
+                sent_warnings = len(warnings)
+            yield _ndjson(line)
+    except GeneratorExit:
+        # Client went away: drop the half-written report
+        writer.abort()
+        raise
+    except Exception as exc:
+        writer.abort()
+        yield _ndjson({"type": "error", "error": str(exc)})
+        return
+
+    if not writer.count:
+        writer.abort()
+        yield _ndjson({"type": "error", "error": "no valid logs parsed", "warnings": warnings[sent_warnings:]})
+        return
+
+    extra = _report_extra(models, miner, timings, chunked)
+    report_name = writer.close(extra)
+    done: Dict[str, Any] = {"type": "done", "count": writer.count, "report_file": report_name, **extra}
+    if len(warnings) > sent_warnings:
+        done["warnings"] = warnings[sent_warnings:]
+    yield _ndjson(done)
+
+
+def _count_lines(file_path: str) -> int:
+    count = 0
+    with open(file_path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            count += block.count(b"\n")
+    return count
+
+
+def _run_predict_file(params: Dict[str, Any], progress: JobProgress) -> Dict[str, Any]:
+    # Job variant of the streaming mode: same incremental report, but the
+    # response only names the report instead of carrying every row.
+    models = _get_models(params.get("model_version"))
+    safe_path = params["path"]
+    batch_size = params["batch_size"] or PREDICT_BATCH_SIZE
+    if is_logcol(safe_path):
+        total: Optional[int] = len(LogColReader(safe_path))
+    else:
+        # Counting a compressed file would mean decompressing it twice
+        total = _count_lines(safe_path) if safe_path.endswith(".jsonl") else None
+    progress.update(stage="predicting", rows=0, total=total)
+
+    writer = _new_report_writer(safe_path)
+    miner = TemplateMiner() if params.get("templates") else None
+    timings = StageTimings()
+    chunked = _new_chunked_predictor(params, models, timings)
+    warnings: List[str] = []
+    try:
+        for _ in _predict_file_batches(safe_path, batch_size, writer, warnings, models, miner, timings, chunked):
+            progress.update(rows=writer.count)
+    except BaseException:
+        writer.abort()
+        raise
+    if not writer.count:
+        writer.abort()
+        raise _BadRequest("no valid logs parsed", warnings=warnings)
+
+    extra = _report_extra(models, miner, timings, chunked)
+    report_name = writer.close(extra)
+    result: Dict[str, Any] = {"count": writer.count, "report_file": report_name, **extra}
+    if warnings:
+        result["warnings"] = warnings
+    return result
+
+
+def _prepare_atomize(payload: Dict[str, Any]) -> Dict[str, Any]:
     raw_path = payload.get("file_path") or payload.get("path")
     out_path = payload.get("out_path")
 
     safe_path = _safe_join_data(raw_path)
     if not safe_path or not os.path.exists(safe_path):
-        return jsonify({"error": "file not found or not allowed"}), 400
-    if not (safe_path.endswith(".txt") or safe_path.endswith(".log") or safe_path.endswith(".html")):
-        return jsonify({"error": "only .txt, .log or .html files supported"}), 400
+        raise _BadRequest("file not found or not allowed")
+    if base_suffix(safe_path) not in _RAW_EXTENSIONS:
+        raise _BadRequest("only .txt, .log or .html files supported (optionally compressed)")
 
-    with open(safe_path, "r", encoding="utf-8") as fh:
-        content = fh.read()
-    if safe_path.endswith(".html"):
-        import re
-        # Try to extract embedded JSON array (e.g., const rawData = [...])
-        first_bracket = content.find("[")
-        last_bracket = content.rfind("]")
-        array_text = None
-        if first_bracket != -1 and last_bracket != -1 and last_bracket > first_bracket:
-            array_text = content[first_bracket:last_bracket + 1]
-
-        array_match = re.search(r"\[[\s\S]*?\]", content)
-        if array_text or array_match:
-            try:
-                raw_json = json.loads(array_text or array_match.group(0))
-                if isinstance(raw_json, list):
-                    lines = []
-                    for item in raw_json:
-                        if isinstance(item, dict):
-                            msg = item.get("msg") or item.get("message") or ""
-                            if msg:
-                                lines.append(str(msg))
-                    if lines:
-                        records = parse_lines(lines)
-                        enriched = [enrich_record(r) for r in records]
-                        if out_path:
-                            safe_out = _safe_join_data(out_path)
-                            if not safe_out:
-                                return jsonify({"error": "out_path not allowed"}), 400
-                            if not safe_out.endswith(".jsonl"):
-                                return jsonify({"error": "out_path must end with .jsonl"}), 400
-                            _write_jsonl(safe_out, enriched)
-                        return jsonify({
-                            "count": len(enriched),
-                            "logs": enriched,
-                            "out_path": out_path
-                        })
-            except Exception:
-                pass
+    safe_out = None
+    if out_path:
+        safe_out = _safe_join_data(out_path)
+        if not safe_out:
+            raise _BadRequest("out_path not allowed")
+        if not (base_suffix(safe_out) == ".jsonl" or is_logcol(safe_out)):
+            raise _BadRequest("out_path must end with .jsonl (optionally .gz/.bz2/.xz/.zst) or .logcol")
 
-        msg_matches = re.findall(r"msg\s*[:=]\s*\"([^\"]*?)\"", content, flags=re.DOTALL)
-        if not msg_matches:
-            msg_matches = re.findall(r"msg\s*[:=]\s*'([^']*?)'", content, flags=re.DOTALL)
-        if not msg_matches:
-            msg_matches = re.findall(r"\\\"msg\\\"\s*:\s*\\\"(.*?)\\\"", content, flags=re.DOTALL)
-        if msg_matches:
-            lines = [m.replace("\\n", "\n").replace("\\r", "\r") for m in msg_matches if m]
-            records = parse_lines(lines)
-            enriched = [enrich_record(r) for r in records]
-            if out_path:
-                safe_out = _safe_join_data(out_path)
-                if not safe_out:
-                    return jsonify({"error": "out_path not allowed"}), 400
-                if not safe_out.endswith(".jsonl"):
-                    return jsonify({"error": "out_path must end with .jsonl"}), 400
-                _write_jsonl(safe_out, enriched)
-            return jsonify({
-                "count": len(enriched),
-                "logs": enriched,
-                "out_path": out_path
-            })
+    try:
+        workers = int(payload.get("workers") or 1)
+    except (TypeError, ValueError):
+        raise _BadRequest("workers must be a positive integer")
+    if workers < 1:
+        raise _BadRequest("workers must be a positive integer")
+    workers = min(workers, os.cpu_count() or 1)
+    return {
+        "path": safe_path,
+        "out_path": out_path,
+        "safe_out": safe_out,
+        "workers": workers,
+        "templates": bool(payload.get("templates"))
+    }
 
-        content = re.sub(r"<script[\s\S]*?>[\s\S]*?<\/script>", "\n", content, flags=re.IGNORECASE)
-        content = re.sub(r"<style[\s\S]*?>[\s\S]*?<\/style>", "\n", content, flags=re.IGNORECASE)
-        content = re.sub(r"<[^>]+>", "\n", content)
-    lines = content.splitlines()
 
-    records = parse_lines(lines)
-    enriched = [enrich_record(r) for r in records]
+def _html_log_lines(content: str) -> List[str]:
+    import re
+    # Try to extract embedded JSON array (e.g., const rawData = [...])
+    first_bracket = content.find("[")
+    last_bracket = content.rfind("]")
+    array_text = None
+    if first_bracket != -1 and last_bracket != -1 and last_bracket > first_bracket:
+        array_text = content[first_bracket:last_bracket + 1]
+
+    array_match = re.search(r"\[[\s\S]*?\]", content)
+    if array_text or array_match:
+        try:
+            raw_json = json.loads(array_text or array_match.group(0))
+            if isinstance(raw_json, list):
+                lines = []
+                for item in raw_json:
+                    if isinstance(item, dict):
+                        msg = item.get("msg") or item.get("message") or ""
+                        if msg:
+                            lines.append(str(msg))
+                if lines:
+                    return lines
+        except Exception:
+            pass
+
+    msg_matches = re.findall(r"msg\s*[:=]\s*\"([^\"]*?)\"", content, flags=re.DOTALL)
+    if not msg_matches:
+        msg_matches = re.findall(r"msg\s*[:=]\s*'([^']*?)'", content, flags=re.DOTALL)
+    if not msg_matches:
+        msg_matches = re.findall(r"\\\"msg\\\"\s*:\s*\\\"(.*?)\\\"", content, flags=re.DOTALL)
+    if msg_matches:
+        return [m.replace("\\n", "\n").replace("\\r", "\r") for m in msg_matches if m]
+
+    content = re.sub(r"<script[\s\S]*?>[\s\S]*?<\/script>", "\n", content, flags=re.IGNORECASE)
+    content = re.sub(r"<style[\s\S]*?>[\s\S]*?<\/style>", "\n", content, flags=re.IGNORECASE)
+    content = re.sub(r"<[^>]+>", "\n", content)
+    return content.splitlines()
+
+
+def _report_rows(lines: Iterable[str], progress: JobProgress, every: int = 10000) -> Iterator[str]:
+    for idx, line in enumerate(lines, start=1):
+        if idx % every == 0:
+            progress.update(rows=idx)
+        yield line
+
+
+def _run_atomize(params: Dict[str, Any], progress: Optional[JobProgress] = None) -> Dict[str, Any]:
+    safe_path = params["path"]
+    safe_out = params["safe_out"]
+    miner = TemplateMiner() if params.get("templates") else None
+    if progress:
+        progress.update(stage="parsing")
+
+    workers = params.get("workers") or 1
+    if safe_out and workers > 1 and base_suffix(safe_path) != ".html":
+        count = atomize_raw_file(safe_path, safe_out, workers=workers, miner=miner)
+        return _atomize_result({"count": count, "out_path": params["out_path"]}, safe_out, miner)
+
+    with open_text(safe_path) as fh:
+        if base_suffix(safe_path) == ".html":
+            lines: Iterable[str] = _html_log_lines(fh.read())
+        else:
+            lines = fh
 
-    if out_path:
-        safe_out = _safe_join_data(out_path)
-        if not safe_out:
-            return jsonify({"error": "out_path not allowed"}), 400
-        if not safe_out.endswith(".jsonl"):
-            return jsonify({"error": "out_path must end with .jsonl"}), 400
-        _write_jsonl(safe_out, enriched)
+        if safe_out:
+            # Stream straight from the input file to the JSONL (or .logcol)
+            # output; only the record being joined is held in memory.
+            if progress:
+                lines = _report_rows(lines, progress)
+            count = atomize_to_path(lines, safe_out, miner)
+            return _atomize_result({"count": count, "out_path": params["out_path"]}, safe_out, miner)
 
-    return jsonify({
+        enriched = list(iter_enriched(parse_lines(lines)))
+        if miner is not None:
+            enriched = list(iter_templated(enriched, miner))
+
+    return _atomize_result({
         "count": len(enriched),
         "logs": enriched,
-        "out_path": out_path
-    })
+        "out_path": params["out_path"]
+    }, None, miner)
 
 
-@app.post("/split-file")
-def split_file():
+def _atomize_result(result: Dict[str, Any], safe_out: Optional[str],
+                    miner: Optional[TemplateMiner]) -> Dict[str, Any]:
+    if miner is None:
+        return result
+    if safe_out:
+        write_templates(templates_path(safe_out), miner)
+    result["templates"] = miner.templates()
+    return result
+
+
+@app.post("/atomize-file")
+def atomize_file():
+    payload = request.get_json(silent=True) or {}
+    params = _prepare_atomize(payload)
+    if payload.get("async"):
+        return _submit_job("atomize-file", params)
+    return jsonify(_run_atomize(params))
+
+
+def _prepare_watch(payload: Dict[str, Any]) -> Dict[str, Any]:
+    # The file may not exist yet; the watch waits for it
+    raw_path = payload.get("file_path") or payload.get("path")
+    safe_path = _safe_join_data(raw_path)
+    if not safe_path or os.path.isdir(safe_path):
+        raise _BadRequest("file not allowed")
+    if os.path.splitext(safe_path)[1] not in (".log", ".txt"):
+        raise _BadRequest("only uncompressed .log or .txt files can be followed")
+
+    out_path = payload.get("out_path")
+    safe_out = None
+    if out_path:
+        safe_out = _safe_join_data(out_path)
+        if not safe_out or not safe_out.endswith(".jsonl"):
+            raise _BadRequest("out_path must be a .jsonl file in the data directory")
+    predict = payload.get("predict", True) is not False
+    if not predict and not safe_out:
+        raise _BadRequest("set out_path and/or predict")
+    model_version = payload.get("model_version") or None
+    if predict and model_version:
+        _get_models(model_version)
+
+    for watch in _watches.list():
+        if watch.get("enabled") and (watch["path"] == safe_path or (safe_out and watch.get("safe_out") == safe_out)):
+            raise _BadRequest(f"already followed by watch {watch['id']}")
+    return {
+        "file_path": raw_path,
+        "path": safe_path,
+        "out_path": out_path,
+        "safe_out": safe_out,
+        "predict": predict,
+        "model_version": model_version,
+        "from_end": bool(payload.get("from_end"))
+    }
+
+
+def _close_watch_report(writer: StreamingReportWriter, models: Dict[str, Any], timings: StageTimings,
+                        watch_id: str) -> str:
+    extra = _report_extra(models, None, timings)
+    extra["watch"] = watch_id
+    return writer.close(extra)
+
+
+def _run_watch(config: Dict[str, Any], ctx: WatchContext) -> None:
+    # Tails config["path"]: new records are atomized (appended to out_path)
+    # and predicted into an analysis report that is closed every
+    # WATCH_REPORT_SECONDS/ROWS. The position is only committed together
+    # with a closed report (and the output size), so after a crash the rows
+    # of the unfinished report are read and written again, not lost or doubled.
+    watch_id = config["id"]
+    follower = LogFollower(config["path"], ctx.checkpoint_path, from_end=bool(config.get("from_end")))
+    out = open_follow_output(config["safe_out"], follower) if config.get("safe_out") else None
+    totals = dict(follower.extra.get("totals") or {"rows": 0, "reports": 0})
+    writer: Optional[StreamingReportWriter] = None
+    models: Dict[str, Any] = {}
+    timings = StageTimings()
+    opened_at = 0.0
+    last_report = ctx.status.get("last_report")
+
+    def commit() -> None:
+        out_bytes = os.fstat(out.fileno()).st_size if out is not None else None
+        follower.commit(out_bytes=out_bytes, totals=totals)
+
+    def status(state: str) -> None:
+        ctx.update(state=state, position=follower.position(), rows=totals["rows"], reports=totals["reports"],
+                   pending_rows=writer.count if writer is not None else 0, last_report=last_report)
+
+    try:
+        status("following")
+        while not ctx.should_stop():
+            started = time.perf_counter()
+            records = follower.poll()
+            if records:
+                observe_stage("follow", time.perf_counter() - started, len(records))
+                logs = list(iter_enriched(records))
+                if out is not None:
+                    write_jsonl(logs, out)
+                    out.flush()
+                if config.get("predict"):
+                    if writer is None:
+                        writer = _new_report_writer(config["path"], watch_id[:8])
+                        timings = StageTimings()
+                        opened_at = time.monotonic()
+                    models = _get_models(config.get("model_version"))
+                    results = predict_texts(models, _build_texts(logs, timings), start_index=writer.count,
+                                            cache=_prediction_cache, timings=timings)
+                    _write_report_batch(writer, logs, results, timings)
+                totals["rows"] += len(logs)
+
+            closed = False
+            if writer is not None and (writer.count >= WATCH_REPORT_ROWS
+                                       or time.monotonic() - opened_at >= WATCH_REPORT_SECONDS):
+                last_report = _close_watch_report(writer, models, timings, watch_id)
+                writer = None
+                totals["reports"] += 1
+                closed = True
+            if writer is None:
+                commit()
+            state = "following" if follower.position()["file_id"] else "waiting"
+            if records or closed or state != ctx.status.get("state"):
+                status(state)
+            if not records:
+                ctx.sleep(WATCH_POLL_SECONDS)
+
+        # Stopped (or shutting down): keep what was read so far
+        if writer is not None:
+            last_report = _close_watch_report(writer, models, timings, watch_id)
+            writer = None
+            totals["reports"] += 1
+        commit()
+        status("stopped")
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    finally:
+        if out is not None:
+            out.close()
+        follower.close()
+
+
+_watches = WatchManager(WATCH_DIR, _run_watch)
+
+
+@app.get("/watches")
+def list_watches():
+    return jsonify({"watches": _watches.list()})
+
+
+@app.post("/watches")
+def create_watch():
     payload = request.get_json(silent=True) or {}
+    return jsonify({"ok": True, "watch": _watches.create(_prepare_watch(payload))}), 201
+
+
+@app.get("/watches/<watch_id>")
+def get_watch(watch_id: str):
+    record = _watches.get(watch_id)
+    if record is None:
+        return jsonify({"error": "watch not found"}), 404
+    return jsonify({"watch": record})
+
+
+@app.post("/watches/<watch_id>/stop")
+def stop_watch(watch_id: str):
+    record = _watches.set_enabled(watch_id, False)
+    if record is None:
+        return jsonify({"error": "watch not found"}), 404
+    return jsonify({"ok": True, "watch": record})
+
+
+@app.post("/watches/<watch_id>/start")
+def start_watch(watch_id: str):
+    record = _watches.config(watch_id)
+    if record is None:
+        return jsonify({"error": "watch not found"}), 404
+    for watch in _watches.list():
+        if watch["id"] != watch_id and watch.get("enabled") and watch["path"] == record["path"]:
+            return jsonify({"error": f"already followed by watch {watch['id']}"}), 400
+    return jsonify({"ok": True, "watch": _watches.set_enabled(watch_id, True)})
+
+
+def _prepare_split(payload: Dict[str, Any]) -> Dict[str, Any]:
     raw_path = payload.get("file_path") or payload.get("path")
     max_mb = payload.get("max_mb") or 4
     try:
         max_mb = float(max_mb)
     except (TypeError, ValueError):
-        return jsonify({"error": "max_mb must be a number"}), 400
+        raise _BadRequest("max_mb must be a number")
 
     if max_mb <= 0:
-        return jsonify({"error": "max_mb must be > 0"}), 400
+        raise _BadRequest("max_mb must be > 0")
+
+    by = payload.get("by") or None
+    if by is not None and by not in SPLIT_KEYS:
+        raise _BadRequest(f"by must be one of {', '.join(SPLIT_KEYS)}")
+    # "gz", "bz2", "xz" or "zst": parts are written compressed
+    compress = payload.get("compress") or ""
+    if compress and f".{compress}" not in COMPRESSION_SUFFIXES:
+        raise _BadRequest(f"compress must be one of {', '.join(s.lstrip('.') for s in COMPRESSION_SUFFIXES)}")
 
     safe_path = _safe_join_data(raw_path)
     if not safe_path or not os.path.exists(safe_path):
-        return jsonify({"error": "file not found or not allowed"}), 400
-
+        raise _BadRequest("file not found or not allowed")
+    return {"path": safe_path, "max_mb": max_mb, "by": by, "compress": compress}
+
+
+def _run_split(params: Dict[str, Any], progress: Optional[JobProgress] = None) -> Dict[str, Any]:
+    # JSONL lines are copied byte for byte (and only decoded when a
+    # partition key is needed); .json/.logcol rows are encoded once
+    safe_path = params["path"]
+    max_bytes = int(params["max_mb"] * 1024 * 1024)
+    by = params.get("by")
+    suffix = f".{params['compress']}" if params.get("compress") else ""
+    warnings: List[str] = []
+    if progress:
+        progress.update(stage="splitting", rows=0)
+    report_rows = (lambda rows: progress.update(rows=rows)) if progress else None
+    started = time.perf_counter()
     try:
-        logs, warnings = _read_logs_file(safe_path)
-    except Exception as exc:
-        return jsonify({"error": str(exc)}), 400
-
-    if not logs:
-        return jsonify({"error": "no valid logs parsed", "warnings": warnings}), 400
-
-    max_bytes = int(max_mb * 1024 * 1024)
-    base_name = os.path.splitext(os.path.basename(safe_path))[0]
-    out_files = []
-    chunk: List[Dict[str, Any]] = []
-
-    def flush_chunk(index: int, rows: List[Dict[str, Any]]):
-        file_name = f"{base_name}_part{index:03d}.jsonl"
-        out_path = _safe_join_data(file_name)
-        if not out_path:
-            raise ValueError("output path not allowed")
-        _write_jsonl(out_path, rows)
-        out_files.append({
-            "name": file_name,
-            "path": file_name,
-            "size": os.path.getsize(out_path)
-        })
-
-    part_index = 1
-    current_bytes = 0
-    for row in logs:
-        row_bytes = len(json.dumps(row, ensure_ascii=True).encode("utf-8")) + 1
-        if chunk and current_bytes + row_bytes > max_bytes:
-            flush_chunk(part_index, chunk)
-            part_index += 1
-            chunk = []
-            current_bytes = 0
-
-        chunk.append(row)
-        current_bytes += row_bytes
-
-    if chunk:
-        flush_chunk(part_index, chunk)
-
-    response = {
-        "count": len(logs),
-        "parts": out_files,
-        "max_mb": max_mb
-    }
+        if base_suffix(safe_path) == ".jsonl":
+            result = split_jsonl(safe_path, DATA_DIR, max_bytes, by, warnings, report_rows, suffix)
+        else:
+            items = (
+                ((json.dumps(row, ensure_ascii=True) + "\n").encode("utf-8"), row)
+                for row in _iter_logs_file(safe_path, warnings)
+            )
+            base_name = os.path.splitext(os.path.basename(strip_compression(safe_path)))[0]
+            result = split_lines(items, DATA_DIR, base_name, max_bytes, by, warnings, report_rows, compression=suffix)
+    except (OSError, ValueError) as exc:
+        raise _BadRequest(str(exc))
+    observe_stage("split_file", time.perf_counter() - started, result["count"])
+    count_bytes("split_file", sum(part["size"] for part in result["parts"]))
+    count_json_warnings("split_file", len(warnings))
+
+    if not result["count"]:
+        raise _BadRequest("no valid logs parsed", warnings=warnings)
+
+    response = {**result, "max_mb": params["max_mb"]}
     if warnings:
         response["warnings"] = warnings
-    return jsonify(response)
+    return response
 
 
-def _predict_logs(logs: List[Dict[str, Any]]):
-    texts = [build_text(x) for x in logs]
-    results: List[Dict[str, Any]] = []
-
-    for idx, raw in enumerate(logs):
-        item: Dict[str, Any] = {"index": idx}
-
-        if _models["category"] is not None:
-            model = _models["category"]
-            pred = model.predict([texts[idx]])[0]
-            item["category"] = pred
-            if hasattr(model, "decision_function"):
-                scores = model.decision_function([texts[idx]])
-                try:
-                    score_value = float(scores[0])
-                except (TypeError, ValueError):
-                    flat = scores.ravel().tolist()
-                    score_value = float(flat[0]) if flat else 0.0
-                item["category_score"] = score_value
-        else:
-            item["category"] = None
-
-        if _models["priority"] is not None:
-            model = _models["priority"]
-            pred = model.predict([texts[idx]])[0]
-            item["priority"] = pred
-            if hasattr(model, "predict_proba"):
-                prob = model.predict_proba([texts[idx]])[0]
-                item["priority_prob"] = [float(p) for p in prob]
-        else:
-            item["priority"] = None
-
-        if _models["reason"] is not None:
-            model = _models["reason"]
-            pred = model.predict([texts[idx]])[0]
-            item["reason"] = pred
-            if hasattr(model, "decision_function"):
-                scores = model.decision_function([texts[idx]])
-                try:
-                    score_value = float(scores[0])
-                except (TypeError, ValueError):
-                    flat = scores.ravel().tolist()
-                    score_value = float(flat[0]) if flat else 0.0
-                item["reason_score"] = score_value
+@app.post("/convert-file")
+def convert_file():
+    # JSONL <-> columnar .logcol, direction by the file extensions
+    payload = request.get_json(silent=True) or {}
+    safe_path = _safe_join_data(payload.get("file_path") or payload.get("path"))
+    safe_out = _safe_join_data(payload.get("out_path"))
+    if not safe_path or not os.path.exists(safe_path):
+        return jsonify({"error": "file not found or not allowed"}), 400
+    if not safe_out:
+        return jsonify({"error": "out_path not allowed"}), 400
+    try:
+        # Both write to a temporary name first: a failed conversion leaves no
+        # partial output behind
+        if base_suffix(safe_path) == ".jsonl" and is_logcol(safe_out):
+            count = jsonl_to_logcol(safe_path, safe_out)
+        elif is_logcol(safe_path) and base_suffix(safe_out) == ".jsonl":
+            count = logcol_to_jsonl(safe_path, safe_out)
         else:
-            item["reason"] = None
+            return jsonify({"error": "convert .jsonl to .logcol or .logcol to .jsonl"}), 400
+    except (OSError, ValueError) as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify({"ok": True, "count": count, "out_path": payload.get("out_path")})
 
-        results.append(item)
 
-    return results
+@app.post("/split-file")
+def split_file():
+    payload = request.get_json(silent=True) or {}
+    params = _prepare_split(payload)
+    if payload.get("async"):
+        return _submit_job("split-file", params)
+    return jsonify(_run_split(params))
+
+
+def _build_texts(logs: List[Dict[str, Any]], timings: Optional[StageTimings] = None) -> List[str]:
+    started = time.perf_counter()
+    texts = [build_text(x) for x in logs]
+    observe_stage("build_text", time.perf_counter() - started, len(texts), timings=timings)
+    return texts
+
+
+def _predict_logs(logs: List[Dict[str, Any]], batch_size: Optional[int] = None,
+                  models: Optional[Dict[str, Any]] = None, timings: Optional[StageTimings] = None):
+    texts = _build_texts(logs, timings)
+    models = models if models is not None else _get_models()
+    return predict_texts(models, texts, batch_size=batch_size, cache=_prediction_cache, timings=timings)
+
+
+def _template_key(log: Dict[str, Any], template_id: int) -> tuple:
+    return (
+        template_id,
+        str(log.get("level")),
+        str(log.get("service")),
+        str(log.get("route")),
+        str(log.get("status_code"))
+    )
+
+
+def _predict_logs_by_template(logs: List[Dict[str, Any]], miner: TemplateMiner, groups: Dict[tuple, Dict[str, Any]],
+                              batch_size: Optional[int] = None, start_index: int = 0,
+                              models: Optional[Dict[str, Any]] = None,
+                              timings: Optional[StageTimings] = None) -> List[Dict[str, Any]]:
+    # Infers once per (template, level, service, route, status) group - the
+    # remaining build_text inputs - using the first record of a group as its
+    # representative; every other member reuses that prediction.
+    if len(groups) > TEMPLATE_GROUPS_MAX:
+        groups.clear()
+    keys = []
+    representatives: Dict[tuple, Dict[str, Any]] = {}
+    for log in logs:
+        template_id = miner.add(str(log.get("message") or ""))
+        key = _template_key(log, template_id)
+        keys.append((template_id, key))
+        if key not in groups and key not in representatives:
+            representatives[key] = log
+
+    if representatives:
+        texts = _build_texts(list(representatives.values()), timings)
+        models = models if models is not None else _get_models()
+        computed = predict_texts(models, texts, batch_size=batch_size, cache=_prediction_cache, timings=timings)
+        for key, item in zip(representatives, computed):
+            item.pop("index")
+            groups[key] = item
+
+    return [
+        {"index": start_index + pos, **groups[key], "template_id": template_id}
+        for pos, (template_id, key) in enumerate(keys)
+    ]
+
+
+def _parse_batch_size(payload: Dict[str, Any]) -> Optional[int]:
+    value = payload.get("batch_size")
+    if value is None:
+        return None
+    size = int(value)
+    if size <= 0:
+        raise ValueError("batch_size must be > 0")
+    return size
 
 
 @app.post("/predict")
 def predict():
-    _ensure_models()
-
     payload = request.get_json(silent=True) or {}
     logs = payload.get("logs")
     if isinstance(payload, dict) and logs is None:
@@ -574,14 +1382,131 @@ def predict():
 
     if not isinstance(logs, list):
         return jsonify({"error": "logs must be a list"}), 400
-    results = _predict_logs(logs)
-    return jsonify({"results": results})
+    try:
+        batch_size = _parse_batch_size(payload)
+    except (TypeError, ValueError):
+        return jsonify({"error": "batch_size must be a positive integer"}), 400
+    models = _get_models(payload.get("model_version") or None)
+    results = _predict_logs(logs, batch_size=batch_size, models=models)
+    return jsonify({"results": results, "model_version": models["version"]})
 
 
-if __name__ == "__main__":
+_jobs.register("train", _run_train)
+_jobs.register("predict-file", _run_predict_file)
+_jobs.register("atomize-file", _run_atomize)
+_jobs.register("split-file", _run_split)
+
+
+@app.get("/models")
+def list_models():
+    return jsonify({"current": _get_models()["version"], "versions": _registry.list()})
+
+
+@app.post("/models/activate")
+def activate_model():
+    payload = request.get_json(silent=True) or {}
+    version = payload.get("version")
+    if not version:
+        return jsonify({"error": "version is required"}), 400
+    try:
+        models = _registry.activate(str(version))
+    except UnknownModelVersion:
+        return jsonify({"error": f"unknown model version: {version}"}), 404
+    return jsonify({"ok": True, "current": models["version"]})
+
+
+@app.post("/models/rollback")
+def rollback_model():
+    payload = request.get_json(silent=True) or {}
+    try:
+        models = _registry.rollback(payload.get("version") or None)
+    except UnknownModelVersion as exc:
+        return jsonify({"error": f"cannot roll back: {exc}"}), 404
+    return jsonify({"ok": True, "current": models["version"]})
+
+
+@app.get("/jobs")
+def list_jobs():
+    return jsonify({"jobs": _jobs.list()})
+
+
+@app.get("/jobs/<job_id>")
+def get_job(job_id: str):
+    record = _jobs.get(job_id)
+    if record is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify({"job": record})
+
+
+@app.get("/jobs/<job_id>/result")
+def get_job_result(job_id: str):
+    record = _jobs.get(job_id)
+    if record is None:
+        return jsonify({"error": "job not found"}), 404
+    if record["status"] != "succeeded":
+        return jsonify({"error": f"job is {record['status']}", "job": record}), 409
+    return jsonify({"job": record, "result": _jobs.result(job_id)})
+
+
+@app.post("/jobs/<job_id>/cancel")
+def cancel_job(job_id: str):
+    record = _jobs.cancel(job_id)
+    if record is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify({"ok": True, "job": record})
+
+
+def startup() -> None:
+    # Once per server, before any worker handles requests (with gunicorn in
+    # the master before forking, see gunicorn.conf.py)
     os.makedirs(MODEL_DIR, exist_ok=True)
     os.makedirs(DATA_DIR, exist_ok=True)
     os.makedirs(TRAINING_DIR, exist_ok=True)
     os.makedirs(ANALYSIS_DIR, exist_ok=True)
-    _load_models()
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    os.makedirs(WATCH_DIR, exist_ok=True)
+    os.makedirs(CHUNK_DIR, exist_ok=True)
+    _jobs.recover()
+    _chunk_store.sweep()
+    if WARMUP_MODE == "blocking":
+        _warm_up()
+
+
+def start_watchers() -> None:
+    # Per process, like the warm-up; the lock files decide which process
+    # runs which watch
+    _watches.start()
+
+
+def start_chunk_sweeper() -> None:
+    # Per process; the lock file in CHUNK_DIR lets one of them sweep per
+    # CHUNK_SWEEP_SECONDS
+    if _chunk_sweeper["pid"] == os.getpid():
+        return
+    _chunk_sweeper["pid"] = os.getpid()
+
+    def loop() -> None:
+        while True:
+            time.sleep(CHUNK_SWEEP_SECONDS)
+            try:
+                _chunk_store.maybe_sweep(CHUNK_SWEEP_SECONDS)
+            except OSError:
+                pass
+
+    threading.Thread(target=loop, name="chunk-sweep", daemon=True).start()
+
+
+def shutdown() -> bool:
+    # False if jobs were still running after SHUTDOWN_SECONDS
+    deadline = time.monotonic() + SHUTDOWN_SECONDS
+    _watches.shutdown(SHUTDOWN_SECONDS)
+    return not _jobs.shutdown(max(0.0, deadline - time.monotonic()))
+
+
+if __name__ == "__main__":
+    # Development server; production runs gunicorn -c gunicorn.conf.py app:app
+    startup()
+    start_warmup()
+    start_watchers()
+    start_chunk_sweeper()
     app.run(host="0.0.0.0", port=APP_PORT)
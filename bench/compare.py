@@ -0,0 +1,73 @@
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+
+def _index(report: Dict[str, Any]) -> Dict[tuple, Dict[str, Any]]:
+    return {(r["stage"], r["size"]): r for r in report.get("results") or []}
+
+
+def _change(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    if not old or new is None:
+        return None
+    return (new - old) / old
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], tolerance: float = 0.10) -> List[Dict[str, Any]]:
+    # One row per (stage, size) present in both results; a regression is a
+    # throughput drop or a peak RSS growth beyond the tolerance
+    old_results = _index(base)
+    rows: List[Dict[str, Any]] = []
+    for key, result in _index(new).items():
+        old = old_results.get(key)
+        if old is None:
+            continue
+        speed = _change(old.get("rows_per_sec"), result.get("rows_per_sec"))
+        rss = _change(old.get("peak_rss_mb"), result.get("peak_rss_mb"))
+        rows.append({
+            "stage": key[0],
+            "size": key[1],
+            "old_rows_per_sec": old.get("rows_per_sec"),
+            "new_rows_per_sec": result.get("rows_per_sec"),
+            "speed_change": speed,
+            "old_peak_rss_mb": old.get("peak_rss_mb"),
+            "new_peak_rss_mb": result.get("peak_rss_mb"),
+            "rss_change": rss,
+            "regression": (speed is not None and speed < -tolerance) or (rss is not None and rss > tolerance),
+        })
+    return rows
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    def pct(value: Optional[float]) -> str:
+        return "n/a" if value is None else f"{value * 100:+.1f}%"
+
+    lines = [f"{'stage':>15} {'size':>5} {'rows/s old':>12} {'rows/s new':>12} {'change':>8} "
+             f"{'RSS old':>9} {'RSS new':>9} {'change':>8}"]
+    for row in rows:
+        lines.append(
+            f"{row['stage']:>15} {row['size']:>5} {row['old_rows_per_sec'] or 0:>12,.0f} "
+            f"{row['new_rows_per_sec'] or 0:>12,.0f} {pct(row['speed_change']):>8} "
+            f"{row['old_peak_rss_mb'] or 0:>9.1f} {row['new_peak_rss_mb'] or 0:>9.1f} {pct(row['rss_change']):>8}"
+            + ("  REGRESSION" if row["regression"] else "")
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as fh:
+        base_report = json.load(fh)
+    with open(args.new, encoding="utf-8") as fh:
+        new_report = json.load(fh)
+    compared = compare(base_report, new_report, args.tolerance)
+    print(format_comparison(compared))
+    if any(row["regression"] for row in compared):
+        sys.exit(1)
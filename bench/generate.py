@@ -0,0 +1,189 @@
+import json
+import os
+import random
+import re
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Synthetic logs for the benchmarks. Everything is derived from the seed, so
+# the same (rows, seed) gives byte-identical files on every machine and
+# commit. Labels come from the templates below, not from the parsing rules,
+# so the labeled data does not change when the code under test does.
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_SEED = 1
+
+SERVICES = ["main-api", "auth", "billing", "worker", "gateway", "scheduler"]
+ROUTES = [
+    "/api/users/{id}", "/api/items", "/api/timeflow/time-entries", "/api/pay",
+    "/api/orders/{id}", "/api/reports/{id}/export", "/api/health", "/api/login"
+]
+METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE"]
+
+# (level, message format, label, priority, reason, traceback error or None)
+TEMPLATES: List[Tuple[str, str, Optional[str], str, Optional[str], Optional[str]]] = [
+    ("INFO", "Request finished on {route} [{method}] 200 in {ms}ms", None, "low", None, None),
+    ("INFO", "User {id} logged in from 10.0.{a}.{b}", None, "low", None, None),
+    ("INFO", "Job {id} scheduled for queue q{a}", None, "low", None, None),
+    ("WARN", "Missing Authorization Header on {route} [{method}] 401", "auth", "medium",
+     "Missing Authorization Header", None),
+    ("WARN", "JWT expired for user {id} 401", "auth", "medium", "Unauthorized", None),
+    ("WARN", "Disk usage {pct} percent on node-{a}", None, "medium", None, None),
+    ("ERROR", "Exception on {route} [{method}]", "api", "high", "NameError",
+     "NameError: name 'user_{id}' is not defined"),
+    ("ERROR", "Unhandled error in handler for {route} [{method}] 500", "api", "high", "ValueError",
+     "ValueError: invalid literal for int() with base 10: '{id}'"),
+    ("ERROR", "DB timeout while fetching time entries on {route} [{method}] 500", "infra", "high", "Timeout", None),
+    ("ERROR", "mongo connection refused host 10.0.{a}.{b}", "db", "high", "Connection Refused", None),
+    ("ERROR", "Bad Gateway upstream {a} on {route} [{method}] 502", "infra", "high", "Bad Gateway", None),
+]
+# Relative frequencies of the templates (mostly INFO, like real traffic)
+WEIGHTS = [30, 12, 8, 6, 5, 4, 5, 4, 3, 2, 2]
+
+START = datetime(2026, 1, 5, 8, 0, 0)
+# Same pattern as STATUS_RE in scripts/parse_logs.py
+_STATUS_RE = re.compile(r"\b([2345]\d{2})\b")
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().lower()
+    if value in SIZES:
+        return SIZES[value]
+    if value.endswith("k"):
+        return int(float(value[:-1]) * 1_000)
+    if value.endswith("m"):
+        return int(float(value[:-1]) * 1_000_000)
+    return int(value)
+
+
+def size_name(rows: int) -> str:
+    for name, count in SIZES.items():
+        if count == rows:
+            return name
+    return str(rows)
+
+
+def iter_events(rows: int, seed: int = DEFAULT_SEED) -> Iterator[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    ts = START
+    for _ in range(rows):
+        level, fmt, label, priority, reason, error = rnd.choices(TEMPLATES, weights=WEIGHTS)[0]
+        values = {
+            "id": rnd.randint(1, 100_000),
+            "a": rnd.randint(0, 255),
+            "b": rnd.randint(1, 254),
+            "ms": rnd.randint(1, 2_000),
+            "pct": rnd.randint(70, 99),
+            "method": rnd.choice(METHODS),
+        }
+        values["route"] = rnd.choice(ROUTES).format(**values)
+        message = fmt.format(**values)
+        ts += timedelta(milliseconds=rnd.randint(1, 500))
+        yield {
+            "timestamp": ts.strftime("%Y-%m-%d %H:%M:%S,") + f"{ts.microsecond // 1000:03d}",
+            "service": rnd.choice(SERVICES),
+            "level": level,
+            "message": message,
+            "route": values["route"] if "{route}" in fmt else None,
+            "method": values["method"] if "{method}" in fmt else None,
+            "label": label,
+            "priority": priority,
+            "reason": reason,
+            "traceback": error.format(**values) if error else None,
+        }
+
+
+def _traceback_lines(event: Dict[str, Any]) -> List[str]:
+    return [
+        "Traceback (most recent call last):",
+        '  File "/srv/app/handlers.py", line 88, in dispatch',
+        "    return view(**kwargs)",
+        '  File "/srv/app/views.py", line 41, in handler',
+        "    result = load(item_id)",
+        event["traceback"],
+    ]
+
+
+def write_raw_logs(path: str, rows: int, seed: int = DEFAULT_SEED) -> int:
+    # "YYYY-MM-DD HH:MM:SS,mmm - service - LEVEL - message" (TIMESTAMP_RE)
+    # with the traceback of an exception on the following lines
+    lines = 0
+    with open(path, "w", encoding="utf-8") as fh:
+        for event in iter_events(rows, seed):
+            fh.write(f"{event['timestamp']} - {event['service']} - {event['level']} - {event['message']}\n")
+            lines += 1
+            if event["traceback"]:
+                for line in _traceback_lines(event):
+                    fh.write(line + "\n")
+                    lines += 1
+    return lines
+
+
+def write_labeled_jsonl(path: str, rows: int, seed: int = DEFAULT_SEED) -> int:
+    # Same events as write_raw_logs, shaped like enrich_record output
+    with open(path, "w", encoding="utf-8") as fh:
+        for event in iter_events(rows, seed):
+            message = event["message"]
+            if event["traceback"]:
+                message = " | ".join([message] + [line.strip() for line in _traceback_lines(event)])
+            status = _STATUS_RE.search(message)
+            row = {
+                "message": message,
+                "level": event["level"],
+                "service": event["service"],
+                "route": event["route"],
+                "method": event["method"],
+                "status_code": int(status.group(1)) if status else None,
+                "timestamp": event["timestamp"],
+                "label": event["label"],
+                "priority": event["priority"],
+                "reason": event["reason"],
+            }
+            fh.write(json.dumps(row, ensure_ascii=True) + "\n")
+    return rows
+
+
+def dataset_paths(work_dir: str, rows: int, seed: int = DEFAULT_SEED) -> Dict[str, str]:
+    name = f"{size_name(rows)}_s{seed}"
+    return {
+        "raw": os.path.join(work_dir, f"raw_{name}.log"),
+        "labeled": os.path.join(work_dir, f"labeled_{name}.jsonl"),
+    }
+
+
+def ensure_datasets(work_dir: str, rows: int, seed: int = DEFAULT_SEED) -> Dict[str, str]:
+    # Generated once per (rows, seed) and reused by later runs
+    os.makedirs(work_dir, exist_ok=True)
+    paths = dataset_paths(work_dir, rows, seed)
+    for kind, writer in (("raw", write_raw_logs), ("labeled", write_labeled_jsonl)):
+        path = paths[kind]
+        if not os.path.exists(path):
+            tmp = f"{path}.partial"
+            writer(tmp, rows, seed)
+            os.replace(tmp, path)
+    return paths
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic logs for the benchmarks")
+    parser.add_argument("--rows", default="10k", help="10k, 100k, 1m or a number")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--raw-out", default=None, help="raw log file (TIMESTAMP_RE format)")
+    parser.add_argument("--jsonl-out", default=None, help="labeled JSONL file")
+    args = parser.parse_args()
+
+    count = parse_size(args.rows)
+    if not args.raw_out and not args.jsonl_out:
+        parser.error("give --raw-out and/or --jsonl-out")
+    if args.raw_out:
+        print(f"{args.raw_out}: {write_raw_logs(args.raw_out, count, args.seed)} lines")
+    if args.jsonl_out:
+        print(f"{args.jsonl_out}: {write_labeled_jsonl(args.jsonl_out, count, args.seed)} rows")
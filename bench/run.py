@@ -0,0 +1,303 @@
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from importlib import metadata
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from bench.compare import compare, format_comparison
+from bench.generate import DEFAULT_SEED, ensure_datasets, parse_size, size_name
+
+STAGES = ("parse_lines", "enrich_record", "build_text", "read_logs_file", "predict_logs", "train_models",
+          "split_file")
+RESULT_VERSION = 1
+DEFAULT_WORK_DIR = os.path.join(tempfile.gettempdir(), "ml-log-analyzer-bench")
+# Result files, kept out of git (see .gitignore)
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _timed(fn: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    # Best of `repeat` runs; the first one also pays for cold caches
+    best: Optional[float] = None
+    result = None
+    for _ in range(max(repeat, 1)):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best or 0.0, result
+
+
+def _app_env(scratch: str, model_dir: Optional[str] = None) -> None:
+    # app.py reads its directories on import, so this runs before importing it.
+    # The prediction cache is off: predict_logs measures inference, not hits.
+    for name in ("data", "analysis", "training", "jobs"):
+        os.makedirs(os.path.join(scratch, name), exist_ok=True)
+    os.environ["ML_LOG_ANALYZER_DATA_DIR"] = os.path.join(scratch, "data")
+    os.environ["ML_LOG_ANALYZER_ANALYSIS_DIR"] = os.path.join(scratch, "analysis")
+    os.environ["ML_LOG_ANALYZER_TRAINING_DIR"] = os.path.join(scratch, "training")
+    os.environ["ML_LOG_ANALYZER_JOBS_DIR"] = os.path.join(scratch, "jobs")
+    os.environ["ML_LOG_ANALYZER_MODEL_DIR"] = model_dir or os.path.join(scratch, "models")
+    os.environ["ML_LOG_ANALYZER_PREDICTION_CACHE_SIZE"] = "0"
+
+
+def _read_lines(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as fh:
+        return fh.readlines()
+
+
+def _read_rows(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def _bench_parse_lines(paths: Dict[str, str], scratch: str, repeat: int) -> Dict[str, Any]:
+    from scripts.parse_logs import parse_lines
+
+    lines = _read_lines(paths["raw"])
+    seconds, records = _timed(lambda: parse_lines(lines), repeat)
+    return {"rows": len(records), "seconds": seconds, "lines": len(lines)}
+
+
+def _bench_enrich_record(paths: Dict[str, str], scratch: str, repeat: int) -> Dict[str, Any]:
+    from scripts.parse_logs import enrich_record, parse_lines
+
+    records = parse_lines(_read_lines(paths["raw"]))
+    seconds, rows = _timed(lambda: [enrich_record(r) for r in records], repeat)
+    return {"rows": len(rows), "seconds": seconds}
+
+
+def _bench_build_text(paths: Dict[str, str], scratch: str, repeat: int) -> Dict[str, Any]:
+    from train import build_text
+
+    rows = _read_rows(paths["labeled"])
+    seconds, texts = _timed(lambda: [build_text(r) for r in rows], repeat)
+    return {"rows": len(texts), "seconds": seconds}
+
+
+def _bench_read_logs_file(paths: Dict[str, str], scratch: str, repeat: int) -> Dict[str, Any]:
+    _app_env(scratch)
+    from app import _read_logs_file
+
+    seconds, (logs, warnings) = _timed(lambda: _read_logs_file(paths["labeled"]), repeat)
+    return {"rows": len(logs), "seconds": seconds, "bytes": os.path.getsize(paths["labeled"]),
+            "warnings": len(warnings)}
+
+
+def _bench_predict_logs(paths: Dict[str, str], scratch: str, repeat: int) -> Dict[str, Any]:
+    _app_env(scratch, paths["model_dir"])
+    from app import _predict_logs, _registry
+
+    models = _registry.get()
+    logs = _read_rows(paths["labeled"])
+    seconds, results = _timed(lambda: _predict_logs(logs, models=models), repeat)
+    return {"rows": len(results), "seconds": seconds, "model_version": models.get("version")}
+
+
+def _bench_train_models(paths: Dict[str, str], scratch: str, repeat: int) -> Dict[str, Any]:
+    from train import train_models
+
+    out_dir = os.path.join(scratch, "trained")
+    seconds, meta = _timed(lambda: train_models(paths["labeled"], out_dir), repeat)
+    return {"rows": meta["dataset"]["rows"], "seconds": seconds, "timings": meta.get("timings")}
+
+
+def _bench_split_file(paths: Dict[str, str], scratch: str, repeat: int) -> Dict[str, Any]:
+    # Through the Flask test client, so request handling is part of the time
+    _app_env(scratch)
+    from app import DATA_DIR, app
+
+    name = os.path.basename(paths["labeled"])
+    target = os.path.join(DATA_DIR, name)
+    try:
+        os.link(paths["labeled"], target)
+    except OSError:
+        shutil.copyfile(paths["labeled"], target)
+    client = app.test_client()
+
+    def run() -> Dict[str, Any]:
+        response = client.post("/split-file", json={"file_path": name, "max_mb": 4})
+        if response.status_code != 200:
+            raise RuntimeError(f"/split-file failed: {response.get_data(as_text=True)}")
+        return response.get_json()
+
+    seconds, result = _timed(run, repeat)
+    return {"rows": result["count"], "seconds": seconds, "bytes": os.path.getsize(paths["labeled"]),
+            "parts": len(result["parts"])}
+
+
+_STAGE_FUNCS = {
+    "parse_lines": _bench_parse_lines,
+    "enrich_record": _bench_enrich_record,
+    "build_text": _bench_build_text,
+    "read_logs_file": _bench_read_logs_file,
+    "predict_logs": _bench_predict_logs,
+    "train_models": _bench_train_models,
+    "split_file": _bench_split_file,
+}
+
+
+def _run_stage(stage: str, paths: Dict[str, str], scratch: str, repeat: int) -> Dict[str, Any]:
+    # Runs in a fresh process: peak RSS belongs to this stage alone
+    # (including its input), and imports/caches of other stages don't leak in
+    result = _STAGE_FUNCS[stage](paths, scratch, repeat)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def _prepare_model(labeled_path: str, scratch: str) -> str:
+    _app_env(scratch)
+    from app import MODEL_DIR, _registry
+
+    _registry.train(labeled_path)
+    return MODEL_DIR
+
+
+def _in_fresh_process(fn: Callable[..., Any], *args: Any) -> Any:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def _git_info() -> Dict[str, Any]:
+    def git(*args: str) -> Optional[str]:
+        try:
+            out = subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=30)
+        except (OSError, subprocess.SubprocessError):
+            return None
+        return out.stdout.strip() if out.returncode == 0 else None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(status) if status is not None else None}
+
+
+def _environment() -> Dict[str, Any]:
+    versions: Dict[str, Optional[str]] = {}
+    for package in ("numpy", "scikit-learn", "flask"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+    }
+
+
+def run_benchmarks(sizes: List[int], stages: List[str], seed: int = DEFAULT_SEED, repeat: int = 1,
+                   work_dir: str = DEFAULT_WORK_DIR, model_rows: int = 10_000,
+                   log: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    log = log or (lambda msg: None)
+    results: List[Dict[str, Any]] = []
+    scratch_root = tempfile.mkdtemp(prefix="run-", dir=_ensure_dir(work_dir))
+    try:
+        model_dir = None
+        if "predict_logs" in stages:
+            # One model for every size, trained on its own (fixed) dataset
+            log(f"training predict_logs model on {size_name(model_rows)} rows")
+            model_paths = ensure_datasets(work_dir, model_rows, seed)
+            model_dir = _in_fresh_process(_prepare_model, model_paths["labeled"],
+                                          os.path.join(scratch_root, "model"))
+        for rows in sizes:
+            log(f"generating {size_name(rows)} rows (seed {seed})")
+            paths = {**ensure_datasets(work_dir, rows, seed), "model_dir": model_dir}
+            for stage in stages:
+                scratch = os.path.join(scratch_root, f"{stage}_{size_name(rows)}")
+                os.makedirs(scratch, exist_ok=True)
+                result = _in_fresh_process(_run_stage, stage, paths, scratch, repeat)
+                seconds = result.pop("seconds")
+                count = result.pop("rows")
+                entry = {
+                    "stage": stage,
+                    "size": size_name(rows),
+                    "rows": count,
+                    "seconds": round(seconds, 4),
+                    "rows_per_sec": round(count / seconds, 1) if count and seconds else None,
+                    "peak_rss_mb": result.pop("peak_rss_mb"),
+                }
+                if result:
+                    entry["details"] = result
+                results.append(entry)
+                log(f"{stage:>15} {entry['size']:>5}: {entry['rows_per_sec'] or 0:>12,.0f} rows/s "
+                    f"{entry['seconds']:>9.3f}s {entry['peak_rss_mb']:>8.1f} MB")
+                shutil.rmtree(scratch, ignore_errors=True)
+    finally:
+        shutil.rmtree(scratch_root, ignore_errors=True)
+
+    return {
+        "version": RESULT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git": _git_info(),
+        "environment": _environment(),
+        "seed": seed,
+        "repeat": repeat,
+        "model_rows": model_rows if "predict_logs" in stages else None,
+        "results": results,
+    }
+
+
+def _ensure_dir(path: str) -> str:
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark parsing, enrichment, inference, training and splitting")
+    parser.add_argument("--sizes", default="10k,100k", help="comma separated: 10k, 100k, 1m or row counts")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma separated subset of {', '.join(STAGES)}")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage, the fastest one counts")
+    parser.add_argument("--model-rows", default="10k", help="rows the predict_logs model is trained on")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR, help="generated datasets are cached here")
+    parser.add_argument("--out", default=None, help="result file (default: bench/results/bench-<commit>.json)")
+    parser.add_argument("--compare", default=None, help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed throughput drop / RSS growth before --compare fails")
+    args = parser.parse_args()
+
+    stage_list = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stage_list if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+    size_list = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+
+    report = run_benchmarks(size_list, stage_list, args.seed, args.repeat, args.work_dir,
+                            parse_size(args.model_rows), log=lambda msg: print(msg, file=sys.stderr))
+    out = args.out
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"bench-{(report['git']['commit'] or 'local')[:10]}.json")
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"results written to {out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            base = json.load(fh)
+        rows = compare(base, report, args.tolerance)
+        print(format_comparison(rows))
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
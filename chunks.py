@@ -0,0 +1,273 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from inference import PredictionCache, predict_texts
+from metrics import StageTimings, observe_stage
+
+# Average rows per chunk. Chunks end after a row whose text hash is a
+# multiple of CHUNK_ROWS (content-defined), so appending to or editing a file
+# only changes the chunks around the edit; the caps bound the chunk size.
+CHUNK_ROWS = int(os.getenv("ML_LOG_ANALYZER_CHUNK_ROWS", "4096"))
+CHUNK_MIN_ROWS = max(1, CHUNK_ROWS // 4)
+CHUNK_MAX_ROWS = max(1, CHUNK_ROWS * 4)
+# Manifests (model versions) kept per source file
+CHUNK_KEEP_VERSIONS = 2
+# Chunks no manifest refers to are removed by sweep() after this long
+CHUNK_ORPHAN_SECONDS = 24 * 3600
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _digest(value: str) -> str:
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+
+
+class ChunkStore:
+    # Prediction results per chunk of a previously analyzed file. Layout:
+    #   objects/<kk>/<key>.json.gz   results of one chunk (without "index");
+    #                                key = digest of model version + the
+    #                                build_text output of every row
+    #   manifests/<source>/<version>.json   chunk keys of one file, in order
+    # Objects are shared between files and runs; the manifests decide which
+    # ones are still needed.
+
+    def __init__(self, root: str, keep_versions: int = CHUNK_KEEP_VERSIONS,
+                 orphan_seconds: float = CHUNK_ORPHAN_SECONDS):
+        self.root = root
+        self.keep_versions = keep_versions
+        self.orphan_seconds = orphan_seconds
+        self._lock = threading.Lock()
+
+    @property
+    def objects_dir(self) -> str:
+        return os.path.join(self.root, "objects")
+
+    @property
+    def manifests_dir(self) -> str:
+        return os.path.join(self.root, "manifests")
+
+    def _object_path(self, key: str) -> str:
+        return os.path.join(self.objects_dir, key[:2], f"{key}.json.gz")
+
+    def _source_dir(self, source: str) -> str:
+        return os.path.join(self.manifests_dir, _digest(source))
+
+    def _manifest_path(self, source: str, version: str) -> str:
+        return os.path.join(self._source_dir(source), f"{_digest(version)}.json")
+
+    def load(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        path = self._object_path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as fh:
+                results = json.load(fh)
+            # Reused by a run whose manifest isn't written yet: sweep() keeps it
+            os.utime(path)
+            return results
+        except (OSError, EOFError, ValueError):
+            # Missing (swept meanwhile) or unreadable: inferred again
+            return None
+
+    def save(self, key: str, results: List[Dict[str, Any]]) -> None:
+        path = self._object_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Fastest level: every miss is stored, and the results compress well anyway
+        _write_atomic(path, gzip.compress(json.dumps(results).encode("utf-8"), compresslevel=1, mtime=0))
+
+    def read_manifest(self, source: str, version: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._manifest_path(source, version), "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def _read_manifests(directory: str) -> List[Tuple[str, Dict[str, Any]]]:
+        found = []
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return found
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                with open(path, "r", encoding="utf-8") as fh:
+                    found.append((path, json.load(fh)))
+            except (OSError, ValueError):
+                continue
+        return found
+
+    def write_manifest(self, source: str, version: str, chunks: List[Dict[str, Any]]) -> None:
+        # Only touches this file's manifests (one per model version) and
+        # keeps the newest keep_versions. Objects are shared between files,
+        # so the ones no longer listed here are left to sweep().
+        os.makedirs(self._source_dir(source), exist_ok=True)
+        with self._lock:
+            manifest = {"source": source, "model_version": version, "updated_at": _now(),
+                        "rows": sum(chunk["rows"] for chunk in chunks), "chunks": chunks}
+            _write_atomic(self._manifest_path(source, version), json.dumps(manifest).encode("utf-8"))
+            entries = self._read_manifests(self._source_dir(source))
+            entries.sort(key=lambda entry: entry[1].get("updated_at") or "", reverse=True)
+            for path, _ in entries[self.keep_versions:]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+
+    def sweep(self) -> int:
+        # Removes objects no manifest refers to once they are older than
+        # orphan_seconds (dropped by a manifest, or left over by an aborted
+        # run; load() refreshes the age of reused ones). Reads the whole
+        # store, so it runs at startup and periodically (maybe_sweep), not
+        # per analysis.
+        referenced: Set[str] = set()
+        if os.path.isdir(self.manifests_dir):
+            for entry in os.scandir(self.manifests_dir):
+                if not entry.is_dir():
+                    continue
+                for _, manifest in self._read_manifests(entry.path):
+                    referenced.update(chunk["key"] for chunk in manifest.get("chunks") or [])
+        if not os.path.isdir(self.objects_dir):
+            return 0
+        cutoff = time.time() - self.orphan_seconds
+        removed = 0
+        for entry in os.scandir(self.objects_dir):
+            if not entry.is_dir():
+                continue
+            for item in os.scandir(entry.path):
+                key = item.name[:-len(".json.gz")] if item.name.endswith(".json.gz") else None
+                if key is None or key in referenced:
+                    continue
+                try:
+                    if item.stat().st_mtime < cutoff:
+                        os.remove(item.path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def maybe_sweep(self, interval: float) -> Optional[int]:
+        # At most one sweep per interval across all processes sharing root:
+        # the mtime of the flock'd .sweep.lock records the last one
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".sweep.lock"), "a") as fh:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # Another process is sweeping
+                return None
+            if time.time() - os.fstat(fh.fileno()).st_mtime < interval:
+                return None
+            os.utime(fh.fileno())
+            return self.sweep()
+
+
+class ChunkedPredictor:
+    # Cuts the rows of one file into content-defined chunks and predicts
+    # only chunks the store has no results for (under this model version);
+    # the rest are read back. Rows are handed back chunk by chunk, with
+    # "index" counted from the first row of the file.
+
+    def __init__(self, store: ChunkStore, source: str, models: Dict[str, Any],
+                 batch_size: Optional[int] = None, cache: Optional[PredictionCache] = None,
+                 timings: Optional[StageTimings] = None):
+        self.store = store
+        self.source = source
+        self.models = models
+        self.version = str(models.get("version"))
+        self.batch_size = batch_size
+        self.cache = cache
+        self.timings = timings
+        self.rows = 0
+        self.chunks: List[Dict[str, Any]] = []
+        self.reused_chunks = 0
+        self.reused_rows = 0
+        self._logs: List[Dict[str, Any]] = []
+        self._texts: List[str] = []
+        self._hash = self._new_hash()
+
+    def _new_hash(self) -> "hashlib.blake2b":
+        return hashlib.blake2b(f"{self.version}\0".encode("utf-8"), digest_size=16)
+
+    def add(self, logs: List[Dict[str, Any]], texts: List[str]
+            ) -> List[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        done = []
+        for log, text in zip(logs, texts):
+            row_hash = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+            self._hash.update(row_hash)
+            self._logs.append(log)
+            self._texts.append(text)
+            count = len(self._texts)
+            if count >= CHUNK_MAX_ROWS or (
+                    count >= CHUNK_MIN_ROWS and int.from_bytes(row_hash, "little") % CHUNK_ROWS == 0):
+                done.append(self._close_chunk())
+        return done
+
+    def _close_chunk(self) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        key = self._hash.hexdigest()
+        logs, texts = self._logs, self._texts
+        started = time.perf_counter()
+        stored = self.store.load(key)
+        if stored is not None and len(stored) == len(texts):
+            observe_stage("chunk_reuse", time.perf_counter() - started, len(texts), timings=self.timings)
+            results = stored
+            self.reused_chunks += 1
+            self.reused_rows += len(texts)
+        else:
+            results = predict_texts(self.models, texts, batch_size=self.batch_size, cache=self.cache,
+                                    timings=self.timings)
+            for item in results:
+                item.pop("index")
+            started = time.perf_counter()
+            self.store.save(key, results)
+            observe_stage("chunk_store", time.perf_counter() - started, len(texts), timings=self.timings)
+        results = [{"index": self.rows + pos, **item} for pos, item in enumerate(results)]
+        self.chunks.append({"key": key, "rows": len(texts)})
+        self.rows += len(texts)
+        self._logs, self._texts = [], []
+        self._hash = self._new_hash()
+        return logs, results
+
+    def finish(self) -> List[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        # The last chunk ends with the file; the manifest is replaced only by
+        # a run that got this far
+        done = [self._close_chunk()] if self._texts else []
+        if self.chunks:
+            self.store.write_manifest(self.source, self.version, self.chunks)
+        return done
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "total": len(self.chunks),
+            "reused": self.reused_chunks,
+            "rows_reused": self.reused_rows,
+            "rows_predicted": self.rows - self.reused_rows
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", default=os.getenv("ML_LOG_ANALYZER_CHUNK_DIR", "chunks"))
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("sweep")
+    args = parser.parse_args()
+    print(json.dumps({"removed": ChunkStore(args.chunks).sweep()}))
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import zipfile
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Compact form of a trained bundle (shared TF-IDF vectorizer + linear heads),
+# scored with NumPy only: no scikit-learn import, no unpickling, and every
+# array is memory-mapped straight out of the (uncompressed) .npz.
+#
+# Arrays:
+#   vocab_hash  uint64, sorted: 64-bit hash of every vocabulary term; the
+#               position of a term in this array is its feature column
+#   idf         float64 per column
+#   weights     float64 (columns x outputs): coef_ of all heads side by side,
+#               so one gather scores every head
+#   intercept   float64 per output
+#   <head>_classes  class labels per head
+#   meta        JSON (analyzer settings, per head: output slice, proba mode)
+COMPACT_FILE = "model_compact.npz"
+FORMAT_VERSION = 1
+# Terms (n-grams) whose vocabulary column is remembered per process
+TERM_CACHE_SIZE = 500000
+
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _npz_member_offset(fh, info: zipfile.ZipInfo) -> int:
+    # Data of a stored member starts after its local header (30 bytes +
+    # file name + extra field, whose lengths can differ from the central one)
+    fh.seek(info.header_offset)
+    header = fh.read(30)
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    return info.header_offset + 30 + name_len + extra_len
+
+
+def load_npz(path: str, mmap: bool = True) -> Dict[str, np.ndarray]:
+    # np.load can't memory-map inside an .npz; uncompressed members are
+    # plain .npy files at a fixed offset, so they are mapped directly
+    arrays: Dict[str, np.ndarray] = {}
+    with zipfile.ZipFile(path) as zf:
+        infos = zf.infolist()
+    with open(path, "rb") as fh:
+        for info in infos:
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            fh.seek(_npz_member_offset(fh, info))
+            version = np.lib.format.read_magic(fh)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(fh)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(fh)
+            if dtype.hasobject:
+                raise ValueError(f"{path}: object arrays are not supported")
+            order = "F" if fortran else "C"
+            if mmap and info.compress_type == zipfile.ZIP_STORED and shape and int(np.prod(shape)):
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=fh.tell(), shape=shape, order=order)
+            elif info.compress_type == zipfile.ZIP_STORED:
+                count = int(np.prod(shape)) if shape else 1
+                data = np.fromfile(fh, dtype=dtype, count=count)
+                arrays[name] = data.reshape(shape, order=order)
+            else:
+                with zipfile.ZipFile(path) as zf, zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+    return arrays
+
+
+class CompactBatch:
+    # Sparse TF-IDF rows of one batch as (row, column, value) triples sorted
+    # by row; scores for all heads are computed once, on first use
+    def __init__(self, model: "CompactModel", n_rows: int, rows: np.ndarray, cols: np.ndarray, data: np.ndarray):
+        self.model = model
+        self.n_rows = n_rows
+        self.rows = rows
+        self.cols = cols
+        self.data = data
+        self._scores: Optional[np.ndarray] = None
+
+    @property
+    def shape(self):
+        return (self.n_rows, len(self.model.idf))
+
+    def scores(self) -> np.ndarray:
+        if self._scores is None:
+            weights = self.model.weights
+            scores = np.zeros((self.n_rows, weights.shape[1]), dtype=np.float64)
+            if len(self.rows):
+                contrib = weights[self.cols] * self.data[:, None]
+                starts = np.flatnonzero(np.r_[True, self.rows[1:] != self.rows[:-1]])
+                scores[self.rows[starts]] = np.add.reduceat(contrib, starts, axis=0)
+            scores += self.model.intercept
+            self._scores = scores
+        return self._scores
+
+
+class CompactVectorizer:
+    # Same output as the fitted TfidfVectorizer (word analyzer, lowercase,
+    # token_pattern, ngram_range, idf weighting, l2 norm)
+    def __init__(self, model: "CompactModel", settings: Dict[str, Any]):
+        self.model = model
+        self.lowercase = bool(settings["lowercase"])
+        self.token_re = re.compile(settings["token_pattern"])
+        self.min_n, self.max_n = settings["ngram_range"]
+        self.norm = settings["norm"]
+        self.sublinear_tf = bool(settings["sublinear_tf"])
+        self._column_cache: Dict[str, int] = {}
+        self._cache_lock = threading.Lock()
+
+    def analyze(self, text: str) -> List[str]:
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.token_re.findall(text)
+        min_n, max_n = self.min_n, self.max_n
+        if max_n == 1:
+            return tokens
+        original = tokens
+        if min_n == 1:
+            tokens = list(original)
+            min_n += 1
+        else:
+            tokens = []
+        count = len(original)
+        append = tokens.append
+        join = " ".join
+        for n in range(min_n, min(max_n + 1, count + 1)):
+            for i in range(count - n + 1):
+                append(join(original[i:i + n]))
+        return tokens
+
+    def _columns(self, terms: List[str]) -> List[int]:
+        # Column per term (-1 = not in the vocabulary); terms seen before come
+        # from a bounded per-process cache instead of being hashed again
+        with self._cache_lock:
+            cache = self._column_cache
+            missing = [term for term in terms if term not in cache]
+            if missing:
+                if len(cache) + len(missing) > TERM_CACHE_SIZE:
+                    cache.clear()
+                hashes = np.fromiter((term_hash(t) for t in missing), dtype=np.uint64, count=len(missing))
+                vocab = self.model.vocab_hash
+                pos = np.searchsorted(vocab, hashes)
+                pos[pos >= len(vocab)] = 0
+                found = vocab[pos] == hashes
+                cache.update(zip(missing, np.where(found, pos, -1).tolist()))
+            return [cache[term] for term in terms]
+
+    def transform(self, texts: Iterable[str]) -> CompactBatch:
+        # Terms are numbered per batch in one pass, then every distinct term
+        # is looked up once
+        ids: Dict[str, int] = {}
+        setdefault = ids.setdefault
+        term_ids: List[int] = []
+        lengths: List[int] = []
+        for text in texts:
+            doc = self.analyze(text)
+            lengths.append(len(doc))
+            term_ids.extend([setdefault(term, len(ids)) for term in doc])
+        n_docs = len(lengths)
+        n_features = len(self.model.idf)
+        empty = np.zeros(0, dtype=np.int64)
+        if not term_ids:
+            return CompactBatch(self.model, n_docs, empty, empty, np.zeros(0, dtype=np.float64))
+
+        columns = np.asarray(self._columns(list(ids)), dtype=np.int64)[np.asarray(term_ids, dtype=np.int64)]
+        rows = np.repeat(np.arange(n_docs, dtype=np.int64), lengths)
+        known = columns >= 0
+        if not known.any():
+            return CompactBatch(self.model, n_docs, empty, empty, np.zeros(0, dtype=np.float64))
+        keys = rows[known] * n_features + columns[known]
+
+        # Term counts per (row, column); np.unique also sorts by row
+        unique, counts = np.unique(keys, return_counts=True)
+        rows = unique // n_features
+        cols = unique % n_features
+        data = counts.astype(np.float64)
+        if self.sublinear_tf:
+            data = np.log(data) + 1.0
+        data *= self.model.idf[cols]
+        if self.norm == "l2":
+            norms = np.sqrt(np.bincount(rows, weights=data * data, minlength=n_docs))
+            norms[norms == 0.0] = 1.0
+            data /= norms[rows]
+        elif self.norm == "l1":
+            norms = np.bincount(rows, weights=np.abs(data), minlength=n_docs)
+            norms[norms == 0.0] = 1.0
+            data /= norms[rows]
+        return CompactBatch(self.model, n_docs, rows, cols, data)
+
+
+class CompactHead:
+    # predict/decision_function as LinearSVC and friends (LinearClassifierMixin)
+    def __init__(self, classes: np.ndarray, start: int, width: int):
+        self.classes_ = classes
+        self.start = start
+        self.width = width
+
+    def decision_function(self, X: CompactBatch) -> np.ndarray:
+        scores = X.scores()[:, self.start:self.start + self.width]
+        return scores[:, 0] if self.width == 1 else scores
+
+    def predict(self, X: CompactBatch) -> np.ndarray:
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            return self.classes_[(scores > 0).astype(int)]
+        return self.classes_[scores.argmax(axis=1)]
+
+
+class CompactProbaHead(CompactHead):
+    # predict_proba as LogisticRegression: one-vs-rest logistic ("ovr") or
+    # softmax over the decision values ("softmax")
+    def __init__(self, classes: np.ndarray, start: int, width: int, proba: str):
+        super().__init__(classes, start, width)
+        self.proba = proba
+
+    def predict_proba(self, X: CompactBatch) -> np.ndarray:
+        decision = self.decision_function(X)
+        if self.proba == "ovr":
+            prob = 1.0 / (1.0 + np.exp(-decision))
+            if prob.ndim == 1:
+                return np.vstack([1 - prob, prob]).T
+            return prob / prob.sum(axis=1).reshape((prob.shape[0], -1))
+        if decision.ndim == 1:
+            decision = np.c_[-decision, decision]
+        shifted = decision - decision.max(axis=1, keepdims=True)
+        exp = np.exp(shifted)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+class CompactModel:
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.meta = json.loads(bytes(arrays["meta"]).decode("utf-8"))
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"unsupported compact model format: {self.meta.get('format')}")
+        self.vocab_hash = arrays["vocab_hash"]
+        self.idf = arrays["idf"]
+        self.weights = arrays["weights"]
+        self.intercept = np.asarray(arrays["intercept"])
+        self.vectorizer = CompactVectorizer(self, self.meta["vectorizer"])
+        self.heads: Dict[str, CompactHead] = {}
+        for head, spec in self.meta["heads"].items():
+            classes = np.asarray(arrays[f"{head}_classes"])
+            if spec.get("proba"):
+                self.heads[head] = CompactProbaHead(classes, spec["start"], spec["width"], spec["proba"])
+            else:
+                self.heads[head] = CompactHead(classes, spec["start"], spec["width"])
+
+
+def compact_path(model_dir: str) -> str:
+    return os.path.join(model_dir, COMPACT_FILE)
+
+
+def load_compact(model_dir: str) -> CompactModel:
+    return CompactModel(load_npz(compact_path(model_dir)))
+
+
+def write_compact(model_dir: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> str:
+    # Uncompressed (np.savez), so load_npz can map the members
+    path = compact_path(model_dir)
+    tmp = f"{path}.tmp.npz"
+    meta_bytes = np.frombuffer(json.dumps({**meta, "format": FORMAT_VERSION}).encode("utf-8"), dtype=np.uint8)
+    np.savez(tmp, meta=meta_bytes, **arrays)
+    os.replace(tmp, path)
+    return path
@@ -0,0 +1,60 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+from typing import IO, Optional
+
+try:
+    import zstandard
+except ImportError:  # in requirements.txt; without it .zst files fail with a clear error
+    zstandard = None
+
+COMPRESSION_SUFFIXES = (".gz", ".bz2", ".xz", ".zst")
+
+
+def compression_suffix(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return ext if ext in COMPRESSION_SUFFIXES else ""
+
+
+def is_compressed(path: str) -> bool:
+    return bool(compression_suffix(path))
+
+
+def strip_compression(path: str) -> str:
+    # "app.log.gz" -> "app.log", so format checks look at the inner suffix
+    suffix = compression_suffix(path)
+    return path[:-len(suffix)] if suffix else path
+
+
+def base_suffix(path: str) -> str:
+    return os.path.splitext(strip_compression(path))[1].lower()
+
+
+def open_binary(path: str, mode: str = "rb") -> IO[bytes]:
+    # Streaming (de)compression by suffix; plain files are opened as they
+    # are. mode is "rb", "wb" or "ab" (appending adds a new stream/frame,
+    # which every reader here handles).
+    suffix = compression_suffix(path)
+    if suffix == ".gz":
+        return gzip.open(path, mode)
+    if suffix == ".bz2":
+        return bz2.open(path, mode)
+    if suffix == ".xz":
+        return lzma.open(path, mode)
+    if suffix == ".zst":
+        if zstandard is None:
+            raise ValueError("reading or writing .zst files requires the zstandard package")
+        raw = open(path, mode)
+        if "r" in mode:
+            return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+    return open(path, mode)
+
+
+def open_text(path: str, mode: str = "r", encoding: str = "utf-8", newline: Optional[str] = None) -> IO[str]:
+    # Text counterpart of open_binary; "r" keeps universal newlines like open()
+    if not is_compressed(path):
+        return open(path, mode, encoding=encoding, newline=newline)
+    return io.TextIOWrapper(open_binary(path, mode + "b"), encoding=encoding, newline=newline)
@@ -17,6 +17,7 @@ const splitSelect = document.getElementById("splitSelect");
 const reloadSplit = document.getElementById("reloadSplit");
 const splitBtn = document.getElementById("splitBtn");
 const splitMaxMb = document.getElementById("splitMaxMb");
+const splitBy = document.getElementById("splitBy");
 const reportSelect = document.getElementById("reportSelect");
 const reloadReports = document.getElementById("reloadReports");
 const openReport = document.getElementById("openReport");
@@ -45,6 +46,9 @@ let currentPage = 1;
 const pageSize = 50;
 let filteredLogs = [];
 let filteredResults = [];
+// Name of the paged report shown in the table; its rows are fetched page by page
+let pagedReport = null;
+let pageRequest = 0;
 
 async function fetchWithTimeout(url, options = {}, timeoutMs = 15000) {
   const controller = new AbortController();
@@ -60,7 +64,11 @@ async function loadHealth() {
   try {
     const res = await fetch(`${API_BASE}/health`);
     const data = await res.json();
-    if (data.ok) {
+    if (data.ok && data.ready === false) {
+      healthStatus.textContent = "Backend: lädt Modelle";
+      healthStatus.style.background = "#d97706";
+      setTimeout(loadHealth, 2000);
+    } else if (data.ok) {
       healthStatus.textContent = "Backend: bereit";
       healthStatus.style.background = "#16a34a";
     } else {
@@ -187,7 +195,6 @@ async function loadRawFiles() {
 }
 
 function buildSummary(items) {
-  const total = items.length;
   const byPriority = {};
   const byCategory = {};
 
@@ -200,6 +207,10 @@ function buildSummary(items) {
     }
   });
 
+  buildSummaryFromCounts(items.length, byPriority, byCategory);
+}
+
+function buildSummaryFromCounts(total, byPriority, byCategory) {
   summary.innerHTML = "";
 
   const totalCard = document.createElement("div");
@@ -230,16 +241,20 @@ function buildSummary(items) {
   });
 }
 
-function renderTable(items, logs) {
+function renderTable(items, logs, page = null) {
+  // page = { total, indexes }: items/logs are already the (sorted) current
+  // page of a paged report
   resultsTable.innerHTML = "";
-  const totalPages = Math.max(1, Math.ceil(items.length / pageSize));
+  const total = page ? page.total : items.length;
+  const totalPages = Math.max(1, Math.ceil(total / pageSize));
   if (currentPage > totalPages) {
     currentPage = totalPages;
   }
-  const start = (currentPage - 1) * pageSize;
+  const start = page ? 0 : (currentPage - 1) * pageSize;
   const end = start + pageSize;
   const pageItems = items.slice(start, end);
   const pageLogs = logs.slice(start, end);
+  const rowNumber = (idx) => (page ? page.indexes[idx] : idx) + 1;
 
   pageInfo.textContent = `Seite ${currentPage} / ${totalPages}`;
   prevPage.disabled = currentPage <= 1;
@@ -257,7 +272,7 @@ function renderTable(items, logs) {
       const raw = pageLogs[idx] || {};
       const row = document.createElement("tr");
       row.innerHTML = `
-        <td>${start + idx + 1}</td>
+        <td>${rowNumber(start + idx)}</td>
         <td>${raw.message || ""}</td>
         <td>${raw.level || ""}</td>
         <td>${raw.service || ""}</td>
@@ -275,15 +290,17 @@ function renderTable(items, logs) {
   const rows = items.map((item, idx) => ({
     item,
     raw: logs[idx] || {},
-    index: idx
+    index: rowNumber(idx) - 1
   }));
 
-  const priorityOrder = ["critical", "high", "medium", "low", "unknown", ""];
-  rows.sort((a, b) => {
-    const pa = String(a.item.priority || "").toLowerCase();
-    const pb = String(b.item.priority || "").toLowerCase();
-    return priorityOrder.indexOf(pa) - priorityOrder.indexOf(pb);
-  });
+  if (!page) {
+    const priorityOrder = ["critical", "high", "medium", "low", "unknown", ""];
+    rows.sort((a, b) => {
+      const pa = String(a.item.priority || "").toLowerCase();
+      const pb = String(b.item.priority || "").toLowerCase();
+      return priorityOrder.indexOf(pa) - priorityOrder.indexOf(pb);
+    });
+  }
 
   const pageRows = rows.slice(start, end);
 
@@ -493,6 +510,10 @@ function renderStats(logs, results) {
     sections.push({ title: "Top 10 Status", data: statusData });
   }
 
+  renderStatsSections(sections, total, missingStatus);
+}
+
+function renderStatsSections(sections, total, missingStatus) {
   stats.innerHTML = "";
   sections.forEach((section) => {
     const card = document.createElement("div");
@@ -516,7 +537,112 @@ function renderStats(logs, results) {
   }
 }
 
+function reportQuery() {
+  const params = new URLSearchParams({ name: pagedReport });
+  if (levelFilter.value) {
+    params.set("level", levelFilter.value);
+  }
+  if (priorityFilter.value) {
+    params.set("priority", priorityFilter.value);
+  }
+  const term = searchFilter.value.trim();
+  if (term) {
+    params.set("q", term);
+  }
+  return params;
+}
+
+async function fetchAggregate(params) {
+  const res = await fetchWithTimeout(`${API_BASE}/analysis-report/aggregate?${params}`);
+  const data = await res.json();
+  if (!res.ok) {
+    throw new Error(data.error || "Fehler");
+  }
+  return data;
+}
+
+async function loadReportStats() {
+  // Counts come from the server (precomputed or one pass over the code
+  // columns); message-based sections need the raw rows and are left out
+  const requestId = pageRequest;
+  try {
+    const params = reportQuery();
+    params.set("group_by", "level,priority,category,reason,route,service,status");
+    const errorParams = reportQuery();
+    errorParams.set("group_by", "route");
+    errorParams.set("errors", "1");
+    const [data, errorData] = await Promise.all([fetchAggregate(params), fetchAggregate(errorParams)]);
+    if (requestId !== pageRequest) {
+      return;
+    }
+    const groups = data.groups || {};
+    const counts = (name) => (groups[name] ? groups[name].counts : {});
+    const sections = [
+      { title: "Levels", data: topNFromMap(counts("level")) },
+      { title: "Priorities (Model)", data: topNFromMap(counts("priority")) },
+      { title: "Kategorien (Model)", data: topNFromMap(counts("category")) },
+      { title: "Top 10 Gründe", data: topNFromMap(counts("reason")) },
+      { title: "Top 10 Error-Endpunkte", data: topNFromMap((errorData.groups.route || {}).counts || {}) },
+      { title: "Top 10 Endpunkte", data: topNFromMap(counts("route")) },
+      { title: "Top 10 Services", data: topNFromMap(counts("service")) }
+    ];
+    const statusData = topNFromMap(counts("status"));
+    if (statusData.length) {
+      sections.push({ title: "Top 10 Status", data: statusData });
+    }
+    const missingStatus = groups.status ? groups.status.missing : 0;
+    renderStatsSections(sections, data.total, missingStatus);
+  } catch (err) {
+    stats.innerHTML = "";
+  }
+}
+
+async function loadReportPage() {
+  const params = reportQuery();
+  params.set("offset", String((currentPage - 1) * pageSize));
+  params.set("limit", String(pageSize));
+  if (groupBy.value !== "none") {
+    params.set("sort", "priority");
+  }
+  // Only the newest request may render (typing in the search field fires many)
+  const requestId = ++pageRequest;
+  try {
+    const res = await fetchWithTimeout(`${API_BASE}/analysis-report/rows?${params}`);
+    const data = await res.json();
+    if (!res.ok) {
+      throw new Error(data.error || "Fehler");
+    }
+    if (requestId !== pageRequest) {
+      return;
+    }
+    const rows = data.rows || [];
+    if (!rows.length && data.total && currentPage > 1) {
+      currentPage = Math.ceil(data.total / pageSize);
+      await loadReportPage();
+      return;
+    }
+    filteredLogs = rows.map((row) => row.log || {});
+    filteredResults = rows.map((row) => row.result || {});
+    renderTable(filteredResults, filteredLogs, { total: data.total, indexes: rows.map((row) => row.index) });
+  } catch (err) {
+    if (requestId === pageRequest) {
+      summary.innerHTML = `<div class="summary-card"><h3>Fehler</h3><span>${err.message}</span></div>`;
+    }
+  }
+}
+
 function applyFilters(resetPage = true) {
+  if (pagedReport) {
+    if (resetPage) {
+      currentPage = 1;
+    }
+    loadReportPage().then(() => {
+      if (resetPage) {
+        loadReportStats();
+      }
+    });
+    return;
+  }
   const level = levelFilter.value;
   const priority = priorityFilter.value;
   const term = searchFilter.value.trim().toLowerCase();
@@ -594,6 +720,31 @@ function showReportModal(title, reportText, fileName) {
   trainModal.classList.add("open");
 }
 
+async function readNdjson(res, onLine) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffer += decoder.decode(value, { stream: true });
+    let newline = buffer.indexOf("\n");
+    while (newline !== -1) {
+      const line = buffer.slice(0, newline).trim();
+      buffer = buffer.slice(newline + 1);
+      if (line) {
+        onLine(JSON.parse(line));
+      }
+      newline = buffer.indexOf("\n");
+    }
+  }
+  if (buffer.trim()) {
+    onLine(JSON.parse(buffer));
+  }
+}
+
 async function analyze() {
   const selected = fileSelect.value;
   if (!selected) {
@@ -606,23 +757,41 @@ async function analyze() {
     const res = await fetchWithTimeout(`${API_BASE}/predict-file`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ file_path: selected })
+      body: JSON.stringify({ file_path: selected, stream: true })
     }, 120000);
-    const data = await res.json();
     if (!res.ok) {
+      const data = await res.json();
       throw new Error(data.error || "Fehler");
     }
 
-    const items = data.results || [];
-    buildSummary(items);
-    lastLogs = data.logs || [];
-    lastResults = items;
+    pagedReport = null;
+    lastLogs = [];
+    lastResults = [];
+    const warnings = [];
+    let streamError = null;
+    await readNdjson(res, (line) => {
+      if (line.warnings) {
+        warnings.push(...line.warnings);
+      }
+      if (line.type === "batch") {
+        lastLogs.push(...(line.logs || []));
+        lastResults.push(...(line.results || []));
+        analyzeBtn.textContent = `Analysiere... (${lastResults.length})`;
+      } else if (line.type === "error") {
+        streamError = line.error || "Fehler";
+      }
+    });
+    if (streamError) {
+      throw new Error(streamError);
+    }
+
+    buildSummary(lastResults);
     applyFilters();
     await loadAnalysisReports();
-    if (data.warnings && data.warnings.length) {
+    if (warnings.length) {
       const warnCard = document.createElement("div");
       warnCard.className = "summary-card";
-      warnCard.innerHTML = `<h3>Warnungen</h3><span>${data.warnings.length}</span>`;
+      warnCard.innerHTML = `<h3>Warnungen</h3><span>${warnings.length}</span>`;
       summary.appendChild(warnCard);
     }
   } catch (err) {
@@ -646,11 +815,11 @@ async function uploadFile() {
   uploadFileBtn.disabled = true;
   uploadFileBtn.textContent = "Lade hoch...";
   try {
-    const form = new FormData();
-    form.append("file", file);
-    const res = await fetchWithTimeout(`${API_BASE}/upload-file`, {
+    // Raw body instead of multipart: the server streams it straight to disk
+    const res = await fetchWithTimeout(`${API_BASE}/upload-file?name=${encodeURIComponent(file.name)}`, {
       method: "POST",
-      body: form
+      headers: { "Content-Type": "application/octet-stream" },
+      body: file
     }, 120000);
     const data = await res.json();
     if (!res.ok) {
@@ -698,6 +867,36 @@ async function atomize() {
   }
 }
 
+function sleep(ms) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+async function waitForJob(jobId, onProgress) {
+  while (true) {
+    const res = await fetchWithTimeout(`${API_BASE}/jobs/${jobId}`);
+    const data = await res.json();
+    if (!res.ok) {
+      throw new Error(data.error || "Fehler");
+    }
+    const job = data.job;
+    if (job.status === "succeeded") {
+      const resultRes = await fetchWithTimeout(`${API_BASE}/jobs/${jobId}/result`);
+      const resultData = await resultRes.json();
+      if (!resultRes.ok) {
+        throw new Error(resultData.error || "Fehler");
+      }
+      return resultData.result;
+    }
+    if (!["queued", "running"].includes(job.status)) {
+      throw new Error(job.error || `Job ${job.status}`);
+    }
+    if (onProgress) {
+      onProgress(job);
+    }
+    await sleep(1000);
+  }
+}
+
 async function trainModels() {
   const selected = trainSelect.value;
   if (!selected) {
@@ -710,12 +909,15 @@ async function trainModels() {
     const res = await fetchWithTimeout(`${API_BASE}/train`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ data_path: `data/${selected}` })
-    }, 60000);
-    const data = await res.json();
+      body: JSON.stringify({ data_path: `data/${selected}`, async: true })
+    });
+    const submitted = await res.json();
     if (!res.ok) {
-      throw new Error(data.error || "Fehler");
+      throw new Error(submitted.error || "Fehler");
     }
+    const data = await waitForJob(submitted.job.id, (job) => {
+      trainBtn.textContent = `Training läuft... (${job.stage || job.status})`;
+    });
     summary.innerHTML = "<div class=\"summary-card\"><h3>Training</h3><span>Fertig</span></div>";
     showReportModal("Training Report", formatTrainingReport(data.result || data), data.report_file);
     await loadHealth();
@@ -787,6 +989,25 @@ async function openAnalysisReport() {
       throw new Error(data.error || "Fehler");
     }
     const report = data.report || {};
+    if (data.paged) {
+      // Rows stay on the server; the modal shows the report metadata
+      pagedReport = data.name;
+      lastLogs = [];
+      lastResults = [];
+      const aggregates = report.aggregates || {};
+      buildSummaryFromCounts(
+        report.count || 0,
+        (aggregates.priority || {}).counts || {},
+        (aggregates.category || {}).counts || {}
+      );
+      currentPage = 1;
+      await loadReportPage();
+      await loadReportStats();
+      const { columns, aggregates: _aggregates, ...meta } = report;
+      showReportModal("Analyse Report", JSON.stringify(meta, null, 2), data.name);
+      return;
+    }
+    pagedReport = null;
     lastLogs = report.logs || [];
     lastResults = report.results || [];
     buildSummary(lastResults);
@@ -815,7 +1036,7 @@ async function splitFile() {
     const res = await fetchWithTimeout(`${API_BASE}/split-file`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ file_path: selected, max_mb: maxMb })
+      body: JSON.stringify({ file_path: selected, max_mb: maxMb, by: splitBy.value || null })
     }, 120000);
     const data = await res.json();
     if (!res.ok) {
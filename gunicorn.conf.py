@@ -0,0 +1,57 @@
+import gc
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('ML_LOG_ANALYZER_PORT', '5050')}"
+workers = int(os.getenv("ML_LOG_ANALYZER_WORKERS", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("ML_LOG_ANALYZER_THREADS", "4"))
+# Import the app and load the active model in the master; forked workers
+# share those pages copy-on-write
+preload_app = True
+# Synchronous /predict-file and /atomize-file calls on big files take a while
+timeout = int(os.getenv("ML_LOG_ANALYZER_WORKER_TIMEOUT", "300"))
+graceful_timeout = int(os.getenv("ML_LOG_ANALYZER_GRACEFUL_TIMEOUT", "30"))
+accesslog = "-"
+
+# Workers share their metrics through snapshot files (read before the app is
+# imported, so the default has to be set here)
+os.environ.setdefault("ML_LOG_ANALYZER_METRICS_DIR",
+                      os.path.join(tempfile.gettempdir(), f"ml-log-analyzer-metrics-{bind.rsplit(':', 1)[1]}"))
+
+
+def on_starting(server):
+    import app
+    import metrics
+
+    metrics.clear_snapshots()
+    app.startup()
+    app.preload_models()
+    # Objects created so far are skipped by the collector, so gc passes in
+    # the workers don't write to (and thereby copy) their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    import metrics
+
+    metrics.start_flusher()
+    # Threads don't survive the fork, so the warm-up (only the throwaway
+    # inference, the model comes from the master), the log watchers and the
+    # chunk sweeper start per worker
+    app.start_warmup()
+    app.start_watchers()
+    app.start_chunk_sweeper()
+
+
+def worker_exit(server, worker):
+    import app
+    import metrics
+
+    stopped = app.shutdown()
+    metrics.flush()
+    if not stopped:
+        # A job thread still runs (its record is marked interrupted); the
+        # interpreter would join it on exit and run into the kill
+        os._exit(0)
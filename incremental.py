@@ -0,0 +1,237 @@
+import json
+import os
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Set
+
+from metrics import observe_stage
+from train import MODEL_BUNDLE_FILE, META_FILE, build_text, _iter_rows, _normalize_labels
+
+# scikit-learn/joblib are imported on use, as in train.py
+if TYPE_CHECKING:
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.linear_model import SGDClassifier
+
+TRAIN_CHUNK_SIZE = int(os.getenv("ML_LOG_ANALYZER_TRAIN_CHUNK_SIZE", "50000"))
+# Every n-th row (by position in the file) is held out for the report
+HOLDOUT_EVERY = 5
+# Only read for new models; updates keep the vectorizer of their base
+HASH_FEATURES = int(os.getenv("ML_LOG_ANALYZER_HASH_FEATURES", str(2 ** 18)))
+
+# (head, label field, loss); hinge keeps decision_function like LinearSVC,
+# log_loss gives the priority head predict_proba like LogisticRegression
+HEADS = [
+    ("category", "label", "hinge"),
+    ("priority", "priority", "log_loss"),
+    ("reason", "reason", "hinge")
+]
+
+
+def _build_hashing_vectorizer() -> "HashingVectorizer":
+    # Stateless: nothing to fit, so chunks can be featurized independently
+    # and the vocabulary never has to be held in memory
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    return HashingVectorizer(n_features=HASH_FEATURES, ngram_range=(1, 2), alternate_sign=False, norm="l2")
+
+
+def _build_classifier(loss: str) -> "SGDClassifier":
+    from sklearn.linear_model import SGDClassifier
+
+    return SGDClassifier(loss=loss, random_state=42)
+
+
+def _iter_chunks(path: str, chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for row in _iter_rows(path):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _scan_classes(path: str, chunk_size: int) -> Dict[str, Any]:
+    # First pass: label sets per head (partial_fit needs all classes up
+    # front) and whether a head's field occurs at all, as in train_models
+    classes: Dict[str, Set[str]] = {head: set() for head, _, _ in HEADS}
+    present: Dict[str, bool] = {head: False for head, _, _ in HEADS}
+    rows = 0
+    for chunk in _iter_chunks(path, chunk_size):
+        rows += len(chunk)
+        for head, field, _ in HEADS:
+            if not present[head] and any(field in r for r in chunk):
+                present[head] = True
+            classes[head].update(_normalize_labels([r.get(field) for r in chunk]))
+    # Rows without a reason are not trained on (see train_models)
+    classes["reason"].discard("unknown")
+    return {"rows": rows, "classes": classes, "present": present}
+
+
+def _transform_distinct(vectorizer: "HashingVectorizer", texts: List[str]):
+    # Repetitive logs: hash every distinct text once and gather the rows
+    distinct = {text: pos for pos, text in enumerate(dict.fromkeys(texts))}
+    X = vectorizer.transform(list(distinct))
+    return X[[distinct[text] for text in texts]]
+
+
+def load_incremental_bundle(model_dir: str) -> Optional[Dict[str, Any]]:
+    # Base for an update: only bundles written by this module qualify, and
+    # they are loaded without mmap since partial_fit updates coef_ in place
+    meta_path = os.path.join(model_dir, META_FILE)
+    bundle_path = os.path.join(model_dir, MODEL_BUNDLE_FILE)
+    if not (os.path.exists(meta_path) and os.path.exists(bundle_path)):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as fh:
+        meta = json.load(fh)
+    if meta.get("mode") != "incremental":
+        return None
+    import joblib
+
+    return joblib.load(bundle_path)
+
+
+def train_incremental(data_path: str, out_dir: str, base: Optional[Dict[str, Any]] = None,
+                      chunk_size: Optional[int] = None,
+                      progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    # Out-of-core variant of train_models: rows are streamed in chunks,
+    # featurized by a HashingVectorizer and fed to SGDClassifier.partial_fit.
+    # With a base bundle the existing heads continue from their weights, so
+    # only new data has to be read.
+    import joblib
+    from sklearn.metrics import classification_report
+
+    if not os.path.exists(data_path):
+        raise FileNotFoundError(f"Data file not found: {data_path}")
+    size = chunk_size or TRAIN_CHUNK_SIZE
+    if size <= 0:
+        raise ValueError("chunk_size must be > 0")
+
+    def stage(name: str) -> None:
+        if progress is not None:
+            progress(name)
+
+    stage("scanning")
+    started = time.perf_counter()
+    scan = _scan_classes(data_path, size)
+    timings: Dict[str, Any] = {"scan_seconds": round(time.perf_counter() - started, 4)}
+    if not scan["rows"]:
+        raise ValueError("No training rows found")
+
+    base_heads = (base or {}).get("heads") or {}
+    vectorizer = (base or {}).get("vectorizer") or _build_hashing_vectorizer()
+    heads: Dict[str, "SGDClassifier"] = {}
+    classes: Dict[str, List[str]] = {}
+    for head, _, loss in HEADS:
+        model = base_heads.get(head)
+        if model is not None:
+            # A fitted head can't grow new classes; rows with unseen labels
+            # are skipped and reported
+            heads[head] = model
+            classes[head] = [str(c) for c in model.classes_]
+        elif scan["present"][head] and len(scan["classes"][head]) >= 2:
+            heads[head] = _build_classifier(loss)
+            classes[head] = sorted(scan["classes"][head])
+
+    trained = Counter()
+    skipped = Counter()
+    stage("training")
+    started = time.perf_counter()
+    fit_seconds: Dict[str, float] = Counter()
+    offset = 0
+    for chunk in _iter_chunks(data_path, size):
+        keep = [i for i in range(len(chunk)) if (offset + i) % HOLDOUT_EVERY]
+        offset += len(chunk)
+        if not keep:
+            continue
+        chunk_started = time.perf_counter()
+        X = _transform_distinct(vectorizer, [build_text(chunk[i]) for i in keep])
+        observe_stage("train_vectorize", time.perf_counter() - chunk_started, len(keep))
+        for head, field, _ in HEADS:
+            if head not in heads:
+                continue
+            known = set(classes[head])
+            labels = _normalize_labels([chunk[i].get(field) for i in keep])
+            rows = [pos for pos, y in enumerate(labels) if y in known]
+            skipped[head] += sum(1 for y in labels if y not in known and not (head == "reason" and y == "unknown"))
+            if not rows:
+                continue
+            head_started = time.perf_counter()
+            heads[head].partial_fit(X[rows], [labels[pos] for pos in rows], classes=classes[head])
+            elapsed = time.perf_counter() - head_started
+            observe_stage("train", elapsed, len(rows), head=head)
+            fit_seconds[head] += elapsed
+            trained[head] += len(rows)
+    timings["train_seconds"] = round(time.perf_counter() - started, 4)
+    timings["heads"] = {head: {"fit_seconds": round(seconds, 4)} for head, seconds in fit_seconds.items()}
+
+    # Heads with classes but no rows yet (e.g. all in the holdout) stay unfitted
+    heads = {head: model for head, model in heads.items() if hasattr(model, "coef_")}
+
+    stage("evaluating")
+    started = time.perf_counter()
+    pairs: Dict[str, Counter] = {head: Counter() for head in heads}
+    offset = 0
+    for chunk in _iter_chunks(data_path, size):
+        hold = [i for i in range(len(chunk)) if (offset + i) % HOLDOUT_EVERY == 0]
+        offset += len(chunk)
+        if not hold or not heads:
+            continue
+        X = _transform_distinct(vectorizer, [build_text(chunk[i]) for i in hold])
+        for head, field, _ in HEADS:
+            if head not in heads:
+                continue
+            known = set(classes[head])
+            labels = _normalize_labels([chunk[i].get(field) for i in hold])
+            rows = [pos for pos, y in enumerate(labels) if y in known]
+            if not rows:
+                continue
+            predicted = heads[head].predict(X[rows])
+            pairs[head].update(zip((labels[pos] for pos in rows), (str(p) for p in predicted)))
+
+    timings["evaluate_seconds"] = round(time.perf_counter() - started, 4)
+
+    meta: Dict[str, Any] = {
+        "data_path": data_path,
+        "model_file": MODEL_BUNDLE_FILE,
+        "mode": "incremental",
+        "rows": scan["rows"],
+        "chunk_size": size
+    }
+    for head, _, _ in HEADS:
+        # Holdout predictions are kept as (true, pred) counts, not per row
+        counts = pairs.get(head)
+        if counts:
+            y_true, y_pred = zip(*counts)
+            meta[f"{head}_report"] = classification_report(
+                list(y_true), list(y_pred), sample_weight=list(counts.values()), output_dict=True, zero_division=0
+            )
+        else:
+            meta[f"{head}_report"] = None
+    meta["trained_rows"] = dict(trained)
+    meta["skipped_unknown_class"] = dict(skipped)
+    meta["timings"] = timings
+
+    stage("saving")
+    os.makedirs(out_dir, exist_ok=True)
+    joblib.dump({"vectorizer": vectorizer, "heads": heads}, os.path.join(out_dir, MODEL_BUNDLE_FILE))
+    with open(os.path.join(out_dir, META_FILE), "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, indent=2)
+
+    return meta
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="data/logs_train.jsonl")
+    parser.add_argument("--out", default="models")
+    parser.add_argument("--base", default=None, help="model directory to continue training from")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    args = parser.parse_args()
+
+    base_bundle = load_incremental_bundle(args.base) if args.base else None
+    result = train_incremental(args.data, args.out, base=base_bundle, chunk_size=args.chunk_size)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import StageTimings, observe_stage
+
+PREDICT_BATCH_SIZE = int(os.getenv("ML_LOG_ANALYZER_PREDICT_BATCH_SIZE", "2048"))
+PREDICTION_CACHE_SIZE = int(os.getenv("ML_LOG_ANALYZER_PREDICTION_CACHE_SIZE", "100000"))
+PREDICTION_CACHE_TTL = float(os.getenv("ML_LOG_ANALYZER_PREDICTION_CACHE_TTL", "3600"))
+
+# (result key, score key, score method) in the order results have always been built
+HEADS = [
+    ("category", "category_score", "decision_function"),
+    ("priority", "priority_prob", "predict_proba"),
+    ("reason", "reason_score", "decision_function")
+]
+
+
+def _split_pipeline(model):
+    # Transform once per head and feed the classifier directly, instead of
+    # letting predict/decision_function/predict_proba each re-run the vectorizer.
+    steps = getattr(model, "steps", None)
+    if steps and len(steps) > 1:
+        return model[:-1], model[-1]
+    return None, model
+
+
+def _first_scores(scores: np.ndarray) -> np.ndarray:
+    # Binary heads return one score per row, multiclass heads one per class;
+    # per-row inference has always reported the first class score.
+    scores = np.asarray(scores)
+    if scores.ndim == 1:
+        return scores
+    return scores[:, 0]
+
+
+def _predict_head(model, texts: List[str], score_method: str, X=None) -> Dict[str, Any]:
+    if X is None:
+        features, clf = _split_pipeline(model)
+        X = features.transform(texts) if features is not None else texts
+    else:
+        clf = model
+    out: Dict[str, Any] = {"pred": clf.predict(X), "score": None}
+    if hasattr(model, score_method):
+        if score_method == "decision_function":
+            out["score"] = _first_scores(clf.decision_function(X)).astype(float).tolist()
+        else:
+            out["score"] = np.asarray(clf.predict_proba(X), dtype=float).tolist()
+    return out
+
+
+class PredictionCache:
+    # Bounded LRU of per-text results (everything but "index"), keyed by a
+    # digest of model version + build_text output, with an optional TTL.
+
+    def __init__(self, max_entries: int = PREDICTION_CACHE_SIZE, ttl_seconds: float = PREDICTION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(version: Optional[str], text: str) -> bytes:
+        return hashlib.blake2b(f"{version}\0{text}".encode("utf-8"), digest_size=16).digest()
+
+    def get_many(self, version: Optional[str], texts: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        found: Dict[str, Dict[str, Any]] = {}
+        if not self.enabled:
+            return found
+        now = time.monotonic()
+        with self._lock:
+            for text in texts:
+                key = self.key(version, text)
+                entry = self._entries.get(key)
+                if entry is not None and self.ttl_seconds > 0 and now - entry[0] > self.ttl_seconds:
+                    del self._entries[key]
+                    self.expired += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[text] = entry[1]
+        return found
+
+    def put_many(self, version: Optional[str], items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for text, value in items:
+                key = self.key(version, text)
+                self._entries[key] = (now, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expired": self.expired
+            }
+
+
+def _predict_batch(models: Dict[str, Any], batch: List[str],
+                   timings: Optional[StageTimings] = None) -> List[Dict[str, Any]]:
+    # Shared-vectorizer bundles featurize the batch once for all heads
+    vectorizer = models.get("vectorizer")
+    X = None
+    if vectorizer is not None:
+        started = time.perf_counter()
+        X = vectorizer.transform(batch)
+        observe_stage("vectorize", time.perf_counter() - started, len(batch), timings=timings)
+    outputs = {}
+    for key, _, score_method in HEADS:
+        model = models.get(key)
+        if model is None:
+            outputs[key] = None
+            continue
+        started = time.perf_counter()
+        outputs[key] = _predict_head(model, batch, score_method, X)
+        observe_stage("predict", time.perf_counter() - started, len(batch), head=key, timings=timings)
+
+    items: List[Dict[str, Any]] = []
+    for pos in range(len(batch)):
+        item: Dict[str, Any] = {}
+        for key, score_key, _ in HEADS:
+            out = outputs[key]
+            if out is None:
+                item[key] = None
+                continue
+            item[key] = out["pred"][pos]
+            if out["score"] is not None:
+                item[score_key] = out["score"][pos]
+        items.append(item)
+    return items
+
+
+def predict_texts(models: Dict[str, Any], texts: List[str], batch_size: Optional[int] = None,
+                  start_index: int = 0, cache: Optional[PredictionCache] = None,
+                  timings: Optional[StageTimings] = None) -> List[Dict[str, Any]]:
+    size = batch_size or PREDICT_BATCH_SIZE
+    if size <= 0:
+        raise ValueError("batch_size must be > 0")
+
+    version = models.get("version")
+    results: List[Dict[str, Any]] = []
+    for offset in range(0, len(texts), size):
+        batch = texts[offset:offset + size]
+        # Identical texts inside a batch are inferred once, and texts seen in
+        # earlier batches/requests come from the cache.
+        unique = list(dict.fromkeys(batch))
+        found = cache.get_many(version, unique) if cache is not None else {}
+        missing = [text for text in unique if text not in found]
+        if missing:
+            computed = list(zip(missing, _predict_batch(models, missing, timings)))
+            found.update(computed)
+            if cache is not None:
+                cache.put_many(version, computed)
+
+        for pos, text in enumerate(batch):
+            results.append({"index": start_index + offset + pos, **found[text]})
+
+    return results
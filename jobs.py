@@ -0,0 +1,422 @@
+import fcntl
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+JOB_STATES_ACTIVE = ("queued", "running")
+# How often a job waiting for a slot held by another process tries again
+SLOT_RETRY_SECONDS = 1.0
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _write_json_atomic(path: str, data: Any) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(data, fh)
+    os.replace(tmp_path, path)
+
+
+class JobProgress:
+    # Handed to the task function. update() records stage/rows/total and is
+    # also the cancellation point: it raises JobCancelled once cancel() was
+    # requested for the job.
+
+    def __init__(self, manager: "JobManager", job_id: str):
+        self._manager = manager
+        self._job_id = job_id
+        self._last_flush = 0.0
+
+    def update(self, stage: Optional[str] = None, rows: Optional[int] = None, total: Optional[int] = None) -> None:
+        if self._manager.is_cancel_requested(self._job_id):
+            raise JobCancelled()
+        changes: Dict[str, Any] = {}
+        if stage is not None:
+            changes["stage"] = stage
+        if rows is not None:
+            changes["rows"] = rows
+        if total is not None:
+            changes["total"] = total
+        now = time.monotonic()
+        # Stage changes are always persisted, row counters at most twice a second
+        force = stage is not None
+        if force or now - self._last_flush >= 0.5:
+            self._last_flush = now
+            self._manager.update_progress(self._job_id, changes)
+        else:
+            self._manager.update_progress(self._job_id, changes, persist=False)
+
+
+class JobManager:
+    # max_workers bounds the jobs of this process; kind_limits bound a kind
+    # across all processes sharing jobs_dir (gunicorn workers): a job of a
+    # limited kind runs while holding one of the flock'd slot files
+    # .<kind>.slot<n>.lock, which the kernel releases if its process dies.
+    # Likewise every queued/running job is held by its owner through
+    # <id>.lock; an active record whose lock is free belongs to a process
+    # that is gone and is marked interrupted by whoever reads it.
+
+    def __init__(self, jobs_dir: str, max_workers: int = 2, kind_limits: Optional[Dict[str, int]] = None):
+        self.jobs_dir = jobs_dir
+        self.max_workers = max(1, max_workers)
+        self.kind_limits = kind_limits or {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._tasks: Dict[str, Callable[[Dict[str, Any], JobProgress], Any]] = {}
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._pending: List[str] = []
+        self._running: Dict[str, int] = {}
+        self._slots: Dict[str, Any] = {}
+        self._owner_locks: Dict[str, Any] = {}
+        self._futures: Dict[str, Future] = {}
+        self._retry: Optional[threading.Timer] = None
+        self._cancel_requested: set = set()
+
+    def register(self, kind: str, fn: Callable[[Dict[str, Any], JobProgress], Any]) -> None:
+        self._tasks[kind] = fn
+
+    def _record_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _result_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.result.json")
+
+    def _cancel_path(self, job_id: str) -> str:
+        # Cancel marker for a job owned by another worker process
+        return os.path.join(self.jobs_dir, f"{job_id}.cancel")
+
+    def _lock_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.lock")
+
+    def _slot_path(self, kind: str, slot: int) -> str:
+        return os.path.join(self.jobs_dir, f".{kind}.slot{slot}.lock")
+
+    def _acquire_slot(self, kind: str, limit: int) -> Optional[Any]:
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        for slot in range(limit):
+            fh = open(self._slot_path(kind, slot), "a")
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # Taken, by this or another process
+                fh.close()
+                continue
+            return fh
+        return None
+
+    @contextmanager
+    def slot(self, kind: str) -> Iterator[None]:
+        # For work of a limited kind that runs outside the pool (synchronous
+        # requests): blocks until one of the kind's slots is free, like a
+        # queued job of that kind would wait
+        limit = self.kind_limits.get(kind)
+        if limit is None:
+            yield
+            return
+        while True:
+            with self._lock:
+                fh = self._acquire_slot(kind, limit)
+            if fh is not None:
+                break
+            time.sleep(SLOT_RETRY_SECONDS)
+        try:
+            yield
+        finally:
+            fh.close()
+            with self._lock:
+                # Jobs of this process queued meanwhile needn't wait for the retry
+                self._dispatch_locked()
+
+    def _hold_locked(self, job_id: str) -> None:
+        fh = open(self._lock_path(job_id), "a")
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        self._owner_locks[job_id] = fh
+
+    def _release_locked(self, job_id: str) -> None:
+        # After the final state is persisted: readers that find no lock file
+        # (or a free one) re-read the record and see it finished
+        fh = self._owner_locks.pop(job_id, None)
+        if fh is not None:
+            try:
+                os.remove(self._lock_path(job_id))
+            except FileNotFoundError:
+                pass
+            fh.close()
+
+    def _owner_alive(self, job_id: str) -> bool:
+        try:
+            fh = open(self._lock_path(job_id), "r")
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        finally:
+            fh.close()
+        return False
+
+    def _reap(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        # Active record of a job owned by another process
+        if record.get("status") not in JOB_STATES_ACTIVE or self._owner_alive(record["id"]):
+            return record
+        stored = self._read_record(record["id"])
+        if stored is None or stored.get("status") not in JOB_STATES_ACTIVE:
+            return stored or record
+        stored.update(status="interrupted", finished_at=_now(),
+                      error=f"worker process {stored.get('pid')} exited before the job finished")
+        self._persist(stored)
+        self._clear_cancel_marker(stored["id"])
+        try:
+            os.remove(self._lock_path(stored["id"]))
+        except FileNotFoundError:
+            pass
+        return stored
+
+    def _persist(self, record: Dict[str, Any]) -> None:
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        _write_json_atomic(self._record_path(record["id"]), record)
+
+    def recover(self) -> None:
+        # Jobs that were queued or running when the process died cannot be
+        # resumed; mark them so clients polling them get a final state.
+        if not os.path.isdir(self.jobs_dir):
+            return
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json") or name.endswith(".result.json"):
+                continue
+            record = self._read_record(name[:-len(".json")])
+            if record and record.get("status") in JOB_STATES_ACTIVE:
+                record["status"] = "interrupted"
+                record["finished_at"] = _now()
+                record["error"] = "server restarted before the job finished"
+                self._persist(record)
+            self._clear_cancel_marker(name[:-len(".json")])
+            try:
+                os.remove(self._lock_path(name[:-len(".json")]))
+            except FileNotFoundError:
+                pass
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if kind not in self._tasks:
+            raise ValueError(f"unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        record = {
+            "id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "params": params,
+            # Owner process; the job ends with it
+            "pid": os.getpid(),
+            "stage": "queued",
+            "rows": 0,
+            "total": None,
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None
+        }
+        with self._lock:
+            self._records[job_id] = record
+            os.makedirs(self.jobs_dir, exist_ok=True)
+            self._hold_locked(job_id)
+            self._persist(record)
+            self._pending.append(job_id)
+            self._dispatch_locked()
+        return self.get(job_id)
+
+    def _dispatch_locked(self) -> None:
+        running_total = sum(self._running.values())
+        waiting = False
+        for job_id in list(self._pending):
+            if running_total >= self.max_workers:
+                break
+            kind = self._records[job_id]["kind"]
+            limit = self.kind_limits.get(kind)
+            if limit is not None:
+                slot = self._acquire_slot(kind, limit)
+                if slot is None:
+                    waiting = True
+                    continue
+                self._slots[job_id] = slot
+            self._pending.remove(job_id)
+            self._running[kind] = self._running.get(kind, 0) + 1
+            running_total += 1
+            self._futures[job_id] = self._executor.submit(self._run, job_id)
+        if waiting and self._retry is None:
+            # Slots freed by other processes aren't signalled; poll for them
+            self._retry = threading.Timer(SLOT_RETRY_SECONDS, self._retry_dispatch)
+            self._retry.daemon = True
+            self._retry.start()
+
+    def _retry_dispatch(self) -> None:
+        with self._lock:
+            self._retry = None
+            self._dispatch_locked()
+
+    def _run(self, job_id: str) -> None:
+        record = self._records[job_id]
+        kind = record["kind"]
+        try:
+            if job_id in self._cancel_requested:
+                raise JobCancelled()
+            self._set(job_id, status="running", stage="starting", started_at=_now())
+            result = self._tasks[kind](record["params"], JobProgress(self, job_id))
+            _write_json_atomic(self._result_path(job_id), result)
+            self._set(job_id, status="succeeded", stage="done", finished_at=_now())
+        except JobCancelled:
+            self._set(job_id, status="cancelled", finished_at=_now())
+        except Exception as exc:
+            self._set(job_id, status="failed", finished_at=_now(), error=str(exc),
+                      traceback=traceback.format_exc(limit=5))
+        finally:
+            self._clear_cancel_marker(job_id)
+            with self._lock:
+                self._running[kind] -= 1
+                slot = self._slots.pop(job_id, None)
+                if slot is not None:
+                    slot.close()
+                self._release_locked(job_id)
+                self._futures.pop(job_id, None)
+                self._cancel_requested.discard(job_id)
+                self._dispatch_locked()
+
+    def _set(self, job_id: str, **changes: Any) -> None:
+        with self._lock:
+            record = self._records[job_id]
+            record.update(changes)
+            self._persist(record)
+
+    def update_progress(self, job_id: str, changes: Dict[str, Any], persist: bool = True) -> None:
+        with self._lock:
+            record = self._records[job_id]
+            record.update(changes)
+            if persist:
+                self._persist(record)
+
+    def _clear_cancel_marker(self, job_id: str) -> None:
+        try:
+            os.remove(self._cancel_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        return job_id in self._cancel_requested or os.path.exists(self._cancel_path(job_id))
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(job_id)
+            if record is not None and record["status"] in JOB_STATES_ACTIVE:
+                self._cancel_requested.add(job_id)
+                if job_id in self._pending:
+                    self._pending.remove(job_id)
+                    self._cancel_requested.discard(job_id)
+                    record.update(status="cancelled", finished_at=_now())
+                    self._persist(record)
+                    self._release_locked(job_id)
+        if record is None:
+            # Owned by another worker process (several app workers share
+            # jobs_dir): leave a marker its progress updates will see.
+            # Records from before a restart are already final.
+            stored = self._read_record(job_id)
+            if stored is not None and stored.get("status") in JOB_STATES_ACTIVE:
+                with open(self._cancel_path(job_id), "w", encoding="utf-8"):
+                    pass
+        return self.get(job_id)
+
+    def shutdown(self, timeout: float = 10.0) -> List[str]:
+        # Worker exit: queued jobs are cancelled, running ones are asked to
+        # stop at their next progress update and waited for at most timeout
+        # seconds (a fit can't be interrupted, and gunicorn kills the worker
+        # after its graceful timeout). Jobs still running then are marked
+        # interrupted and returned; their threads would hold up the
+        # interpreter exit, so the caller ends the process without waiting.
+        with self._lock:
+            if self._retry is not None:
+                self._retry.cancel()
+                self._retry = None
+            for job_id in self._pending:
+                record = self._records[job_id]
+                record.update(status="cancelled", finished_at=_now(), error="server shutting down")
+                self._persist(record)
+                self._release_locked(job_id)
+            self._pending.clear()
+            self._cancel_requested.update(
+                job_id for job_id, record in self._records.items() if record["status"] in JOB_STATES_ACTIVE
+            )
+            futures = list(self._futures.values())
+        wait(futures, timeout=timeout)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        unfinished = []
+        with self._lock:
+            for job_id in list(self._futures):
+                record = self._records[job_id]
+                if record["status"] in JOB_STATES_ACTIVE:
+                    record.update(status="interrupted", finished_at=_now(), error="server shutting down")
+                    self._persist(record)
+                    self._release_locked(job_id)
+                    unfinished.append(job_id)
+        return unfinished
+
+    def _read_record(self, job_id: str) -> Optional[Dict[str, Any]]:
+        path = self._record_path(job_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(job_id)
+            record = dict(record) if record is not None else None
+        if record is None:
+            record = self._read_record(job_id)
+            if record is None:
+                return None
+            record = self._reap(record)
+        record["cancel_requested"] = self.is_cancel_requested(job_id)
+        record["eta_seconds"] = _eta_seconds(record)
+        return record
+
+    def list(self) -> List[Dict[str, Any]]:
+        ids = set(self._records)
+        if os.path.isdir(self.jobs_dir):
+            for name in os.listdir(self.jobs_dir):
+                if name.endswith(".json") and not name.endswith(".result.json"):
+                    ids.add(name[:-len(".json")])
+        records = [r for r in (self.get(job_id) for job_id in ids) if r is not None]
+        records.sort(key=lambda r: r.get("created_at") or "", reverse=True)
+        return records
+
+    def result(self, job_id: str) -> Any:
+        path = self._result_path(job_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+
+
+def _eta_seconds(record: Dict[str, Any]) -> Optional[float]:
+    if record.get("status") != "running" or not record.get("started_at"):
+        return None
+    rows = record.get("rows") or 0
+    total = record.get("total")
+    if not total or rows <= 0:
+        return None
+    started = datetime.fromisoformat(record["started_at"].replace("Z", "+00:00"))
+    elapsed = (datetime.now(timezone.utc) - started).total_seconds()
+    remaining = max(total - rows, 0)
+    return round(elapsed / rows * remaining, 1)
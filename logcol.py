@@ -0,0 +1,377 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+import numpy as np
+
+from compression import open_text
+
+LOGCOL_SUFFIX = ".logcol"
+FORMAT_VERSION = 1
+META_NAME = "meta.json"
+# High-cardinality fields start out as offsets + blob columns right away
+TEXT_COLUMNS = ("message", "timestamp")
+# A dictionary column with more distinct values is turned into a text column
+DICT_MAX_VALUES = 4096
+FLUSH_ROWS = 65536
+
+# Dictionary codes below 0; text column states
+CODE_NULL = -1
+CODE_ABSENT = -2
+STATE_STR = 0
+STATE_NULL = 1
+STATE_ABSENT = 2
+STATE_JSON = 3
+
+_ABSENT = object()
+
+
+def is_logcol(path: str) -> bool:
+    return path.endswith(LOGCOL_SUFFIX)
+
+
+def _value_key(value: Any) -> Any:
+    # 500 and "500" (or True and 1) must get different codes
+    return (type(value).__name__, value)
+
+
+class _DictColumn:
+    def __init__(self, spool_dir: str, index: int):
+        self.index = index
+        self.values: List[Any] = []
+        self._codes_by_key: Dict[Any, int] = {}
+        self._codes_path = os.path.join(spool_dir, f"c{index}.codes.tmp")
+        self._codes_fh = open(self._codes_path, "wb")
+        self._buffer = array("i")
+
+    def add(self, value: Any) -> bool:
+        # False if the value doesn't fit a dictionary column (caller switches
+        # the column to text); nothing has been recorded in that case
+        if value is _ABSENT:
+            code = CODE_ABSENT
+        elif value is None:
+            code = CODE_NULL
+        else:
+            if isinstance(value, (dict, list)):
+                return False
+            key = _value_key(value)
+            code = self._codes_by_key.get(key)
+            if code is None:
+                if len(self.values) >= DICT_MAX_VALUES:
+                    return False
+                code = len(self.values)
+                self._codes_by_key[key] = code
+                self.values.append(value)
+        self._buffer.append(code)
+        if len(self._buffer) >= FLUSH_ROWS:
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        self._buffer.tofile(self._codes_fh)
+        self._buffer = array("i")
+
+    def iter_values(self) -> Iterator[Any]:
+        self.flush()
+        self._codes_fh.close()
+        lookup = self.values + [_ABSENT, None]
+        for code in np.fromfile(self._codes_path, dtype=np.int32).tolist():
+            yield lookup[code]
+        os.remove(self._codes_path)
+
+    def finish(self, out_dir: str) -> Dict[str, Any]:
+        self.flush()
+        self._codes_fh.close()
+        codes = np.fromfile(self._codes_path, dtype=np.int32)
+        os.remove(self._codes_path)
+        # Smallest signed type that holds the codes plus the two sentinels
+        for dtype in (np.int8, np.int16, np.int32):
+            if len(self.values) <= np.iinfo(dtype).max:
+                break
+        np.save(os.path.join(out_dir, f"c{self.index}.codes.npy"), codes.astype(dtype))
+        return {"kind": "dict", "values": self.values}
+
+
+class _TextColumn:
+    def __init__(self, spool_dir: str, index: int):
+        self.index = index
+        self._blob_path = os.path.join(spool_dir, f"c{index}.blob")
+        self._offsets_path = os.path.join(spool_dir, f"c{index}.offsets.tmp")
+        self._states_path = os.path.join(spool_dir, f"c{index}.states.tmp")
+        self._blob = open(self._blob_path, "wb")
+        self._offsets_fh = open(self._offsets_path, "wb")
+        self._states_fh = open(self._states_path, "wb")
+        self._offsets = array("q", [0])
+        self._states = array("b")
+        self._end = 0
+
+    def add(self, value: Any) -> bool:
+        if value is _ABSENT:
+            state, data = STATE_ABSENT, b""
+        elif value is None:
+            state, data = STATE_NULL, b""
+        elif isinstance(value, str):
+            state, data = STATE_STR, value.encode("utf-8")
+        else:
+            state, data = STATE_JSON, json.dumps(value).encode("utf-8")
+        if data:
+            self._blob.write(data)
+            self._end += len(data)
+        self._offsets.append(self._end)
+        self._states.append(state)
+        if len(self._states) >= FLUSH_ROWS:
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        self._offsets.tofile(self._offsets_fh)
+        self._states.tofile(self._states_fh)
+        self._offsets = array("q")
+        self._states = array("b")
+
+    def finish(self, out_dir: str) -> Dict[str, Any]:
+        # The blob is already written in place (spool dir == output dir)
+        self.flush()
+        for fh in (self._blob, self._offsets_fh, self._states_fh):
+            fh.close()
+        np.save(os.path.join(out_dir, f"c{self.index}.offsets.npy"), np.fromfile(self._offsets_path, dtype=np.int64))
+        np.save(os.path.join(out_dir, f"c{self.index}.states.npy"), np.fromfile(self._states_path, dtype=np.int8))
+        os.remove(self._offsets_path)
+        os.remove(self._states_path)
+        return {"kind": "text"}
+
+
+class LogColWriter:
+    # Writes rows (dicts) into a .logcol directory:
+    #   meta.json          row count, column names/kinds, dictionaries
+    #   c<i>.codes.npy     dictionary codes per row (-1 null, -2 key absent)
+    #   c<i>.offsets.npy   n+1 byte offsets into c<i>.blob (text columns)
+    #   c<i>.states.npy    str / null / absent / JSON-encoded per row
+    # Columns are spooled to disk while writing; the directory only appears
+    # under its final name once close() succeeded.
+
+    def __init__(self, path: str):
+        self.path = path
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self._tmp_dir = tempfile.mkdtemp(dir=parent, prefix=f".{os.path.basename(path)}.")
+        self._columns: Dict[str, Any] = {}
+        self.count = 0
+
+    def _new_column(self, name: str):
+        index = len(self._columns)
+        column = _TextColumn(self._tmp_dir, index) if name in TEXT_COLUMNS else _DictColumn(self._tmp_dir, index)
+        for _ in range(self.count):
+            column.add(_ABSENT)
+        return column
+
+    def _to_text(self, name: str) -> _TextColumn:
+        old = self._columns[name]
+        column = _TextColumn(self._tmp_dir, old.index)
+        for value in old.iter_values():
+            column.add(value)
+        self._columns[name] = column
+        return column
+
+    def write(self, row: Dict[str, Any]) -> None:
+        if not isinstance(row, dict):
+            raise ValueError(f"row {self.count + 1} is not a JSON object but {type(row).__name__}")
+        for name in row:
+            if name not in self._columns:
+                self._columns[name] = self._new_column(name)
+        for name, column in self._columns.items():
+            value = row.get(name, _ABSENT)
+            if not column.add(value):
+                self._to_text(name).add(value)
+        self.count += 1
+
+    def write_many(self, rows: Iterable[Dict[str, Any]]) -> int:
+        for row in rows:
+            self.write(row)
+        return self.count
+
+    def close(self) -> int:
+        columns = []
+        for name, column in self._columns.items():
+            columns.append({"name": name, **column.finish(self._tmp_dir)})
+        with open(os.path.join(self._tmp_dir, META_NAME), "w", encoding="utf-8") as fh:
+            json.dump({"format": "logcol", "version": FORMAT_VERSION, "rows": self.count, "columns": columns}, fh)
+        # os.replace can't overwrite a non-empty directory: move the old one
+        # aside first and drop it afterwards
+        old = None
+        if os.path.exists(self.path):
+            old = self._tmp_dir + ".old"
+            os.replace(self.path, old)
+        os.replace(self._tmp_dir, self.path)
+        if old:
+            shutil.rmtree(old, ignore_errors=True)
+        return self.count
+
+    def abort(self) -> None:
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+
+def write_logcol(rows: Iterable[Dict[str, Any]], path: str) -> int:
+    writer = LogColWriter(path)
+    try:
+        writer.write_many(rows)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+class LogColReader:
+    # Memory-mapped view of a .logcol directory. Rows are rebuilt as dicts
+    # batch by batch; dictionary columns can also be used as code arrays
+    # without building any rows.
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, META_NAME), "r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        if meta.get("format") != "logcol" or meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"not a logcol v{FORMAT_VERSION} directory: {path}")
+        self.rows = int(meta["rows"])
+        self.columns: List[Dict[str, Any]] = meta["columns"]
+        self._arrays: Dict[str, Dict[str, Any]] = {}
+        for index, column in enumerate(self.columns):
+            base = os.path.join(path, f"c{index}")
+            if column["kind"] == "dict":
+                self._arrays[column["name"]] = {"codes": np.load(base + ".codes.npy", mmap_mode="r")}
+            else:
+                blob_size = os.path.getsize(base + ".blob")
+                self._arrays[column["name"]] = {
+                    "offsets": np.load(base + ".offsets.npy", mmap_mode="r"),
+                    "states": np.load(base + ".states.npy", mmap_mode="r"),
+                    "blob": np.memmap(base + ".blob", dtype=np.uint8, mode="r") if blob_size else b""
+                }
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @property
+    def column_names(self) -> List[str]:
+        return [c["name"] for c in self.columns]
+
+    def dictionary(self, name: str) -> Optional[tuple]:
+        # (codes, values) of a dictionary column, None for text columns
+        for column in self.columns:
+            if column["name"] == name and column["kind"] == "dict":
+                return self._arrays[name]["codes"], column["values"]
+        return None
+
+    def read_column(self, name: str, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        # Absent keys come back as None here
+        return [None if v is _ABSENT else v for v in self._read(name, start, stop)]
+
+    def _read(self, name: str, start: int, stop: Optional[int]) -> List[Any]:
+        stop = self.rows if stop is None else min(stop, self.rows)
+        column = next(c for c in self.columns if c["name"] == name)
+        arrays = self._arrays[name]
+        if column["kind"] == "dict":
+            lookup = column["values"] + [_ABSENT, None]
+            return [lookup[code] for code in arrays["codes"][start:stop].tolist()]
+
+        offsets = arrays["offsets"][start:stop + 1].tolist()
+        states = arrays["states"][start:stop].tolist()
+        if not states:
+            return []
+        base = offsets[0]
+        data = bytes(arrays["blob"][base:offsets[-1]])
+        if all(state == STATE_STR for state in states):
+            return [data[a - base:b - base].decode("utf-8") for a, b in zip(offsets, offsets[1:])]
+        out: List[Any] = []
+        for pos, state in enumerate(states):
+            if state == STATE_STR:
+                out.append(data[offsets[pos] - base:offsets[pos + 1] - base].decode("utf-8"))
+            elif state == STATE_NULL:
+                out.append(None)
+            elif state == STATE_JSON:
+                out.append(json.loads(data[offsets[pos] - base:offsets[pos + 1] - base]))
+            else:
+                out.append(_ABSENT)
+        return out
+
+    def iter_batches(self, size: int = 8192, start: int = 0, stop: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        stop = self.rows if stop is None else min(stop, self.rows)
+        names = self.column_names
+        for offset in range(start, stop, size):
+            end = min(offset + size, stop)
+            values = [self._read(name, offset, end) for name in names]
+            yield [
+                {name: value for name, value in zip(names, row) if value is not _ABSENT}
+                for row in zip(*values)
+            ]
+
+    def iter_rows(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        for batch in self.iter_batches(start=start, stop=stop):
+            yield from batch
+
+
+def logcol_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def jsonl_to_logcol(src: str, dst: str) -> int:
+    # Raises ValueError naming the line for invalid JSON or non-object rows;
+    # dst is left untouched then
+    def rows() -> Iterator[Dict[str, Any]]:
+        with open_text(src) as fh:
+            for idx, line in enumerate(fh, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    raise ValueError(f"Invalid JSON at line {idx}: {exc}") from None
+                if not isinstance(row, dict):
+                    raise ValueError(f"Line {idx} is not a JSON object")
+                yield row
+
+    return write_logcol(rows(), dst)
+
+
+def write_jsonl_rows(rows: Iterable[Dict[str, Any]], out: TextIO) -> int:
+    count = 0
+    for row in rows:
+        out.write(json.dumps(row, ensure_ascii=True) + "\n")
+        count += 1
+    return count
+
+
+def logcol_to_jsonl(src: str, dst: str) -> int:
+    # Written under a temporary name (same suffix, so the same compression)
+    # and renamed once complete
+    tmp_path = os.path.join(os.path.dirname(dst), f".{os.getpid()}.{threading.get_ident()}.{os.path.basename(dst)}")
+    try:
+        with open_text(tmp_path, "w") as out:
+            count = write_jsonl_rows(LogColReader(src).iter_rows(), out)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert logs between JSONL and the columnar .logcol format")
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    args = parser.parse_args()
+
+    if is_logcol(args.dst):
+        count = jsonl_to_logcol(args.src, args.dst)
+    elif is_logcol(args.src):
+        count = logcol_to_jsonl(args.src, args.dst)
+    else:
+        parser.error("one of src/dst must end with .logcol")
+    print(f"Wrote {count} records to {args.dst}")
@@ -0,0 +1,302 @@
+import atexit
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Process-local metrics in the Prometheus text format. Recording is a dict
+# update under an uncontended lock, done once per request/batch/call (never
+# per row), so it costs next to nothing whether or not anything scrapes.
+#
+# Several gunicorn workers: with METRICS_DIR set, every process writes a
+# snapshot of its counters/histograms there every METRICS_FLUSH_SECONDS and
+# /metrics adds up the snapshots of all processes (dead ones included, so
+# counters don't go backwards when a worker is replaced).
+METRICS_DIR = os.getenv("ML_LOG_ANALYZER_METRICS_DIR") or None
+METRICS_FLUSH_SECONDS = float(os.getenv("ML_LOG_ANALYZER_METRICS_FLUSH_SECONDS", "5"))
+
+PREFIX = "ml_log_analyzer"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Requests range from health checks to synchronous training runs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# Stages are timed per call or per micro-batch
+STAGE_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 120.0, 600.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    # Empty label values are left out (same meaning in Prometheus)
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values) if value != ""]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help_text
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def snapshot(self) -> List[Any]:
+        with self._lock:
+            return [[list(labels), json.loads(json.dumps(value))] for labels, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    @staticmethod
+    def merge(into: Dict[Tuple[str, ...], Any], labels: Tuple[str, ...], value: Any) -> None:
+        into[labels] = into.get(labels, 0.0) + value
+
+    def render(self, values: Dict[Tuple[str, ...], Any]) -> List[str]:
+        # Text format 0.0.4: HELP/TYPE name the samples' family, so they
+        # carry the _total suffix as well (as client_python writes them)
+        name = f"{self.name}_total"
+        lines = [f"# HELP {name} {self.help}", f"# TYPE {name} {self.kind}"]
+        for labels, value in sorted(values.items()):
+            lines.append(f"{name}{_label_text(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = buckets
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        # Per-bucket (not cumulative) counts + [sum, count]; rendering adds up
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @staticmethod
+    def merge(into: Dict[Tuple[str, ...], Any], labels: Tuple[str, ...], value: Any) -> None:
+        entry = into.get(labels)
+        if entry is None or len(entry[0]) != len(value[0]):
+            into[labels] = [list(value[0]), value[1], value[2]]
+            return
+        entry[0] = [a + b for a, b in zip(entry[0], value[0])]
+        entry[1] += value[1]
+        entry[2] += value[2]
+
+    def render(self, values: Dict[Tuple[str, ...], Any]) -> List[str]:
+        lines = self._header()
+        for labels, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + [math.inf], counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.label_names, labels, le)} {cumulative}")
+            label_text = _label_text(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class GaugeFunc:
+    # Evaluated at scrape time from the process answering the scrape
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...],
+                 read: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help_text
+        self.label_names = label_names
+        self.read = read
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.read()
+        except Exception:
+            return []
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_label_text(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency by route",
+                            ("method", "route", "status"), LATENCY_BUCKETS)
+STAGE_SECONDS = Histogram("stage_duration_seconds", "Time spent per processing stage (per call or batch)",
+                          ("stage", "head"), STAGE_BUCKETS)
+STAGE_ROWS = Counter("stage_rows", "Rows processed per stage", ("stage",))
+BYTES = Counter("bytes", "Bytes read or written per stage", ("stage",))
+JSON_WARNINGS = Counter("json_warnings", "Lines skipped because they were not valid JSON", ("stage",))
+
+_METRICS: List[_Metric] = [REQUEST_SECONDS, STAGE_SECONDS, STAGE_ROWS, BYTES, JSON_WARNINGS]
+_GAUGES: List[GaugeFunc] = []
+
+
+def register_gauge(name: str, help_text: str, label_names: Tuple[str, ...],
+                   read: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+    _GAUGES.append(GaugeFunc(name, help_text, label_names, read))
+
+
+class StageTimings:
+    # Per-run totals of the stage timers, stored in the report of that run
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    def add(self, key: str, seconds: float, rows: int = 0) -> None:
+        entry = self.stages.get(key)
+        if entry is None:
+            entry = self.stages[key] = {"seconds": 0.0, "rows": 0, "calls": 0}
+        entry["seconds"] += seconds
+        entry["rows"] += rows
+        entry["calls"] += 1
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        for key, entry in self.stages.items():
+            seconds = entry["seconds"]
+            out[key] = {
+                "seconds": round(seconds, 4),
+                "rows": int(entry["rows"]),
+                "calls": int(entry["calls"]),
+                "rows_per_sec": round(entry["rows"] / seconds, 1) if entry["rows"] and seconds > 0 else None
+            }
+        return out
+
+
+def observe_stage(stage: str, seconds: float, rows: int = 0, head: str = "",
+                  timings: Optional[StageTimings] = None) -> None:
+    STAGE_SECONDS.observe((stage, head), seconds)
+    if rows:
+        STAGE_ROWS.inc((f"{stage}.{head}" if head else stage,), rows)
+    if timings is not None:
+        timings.add(f"{stage}.{head}" if head else stage, seconds, rows)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    REQUEST_SECONDS.observe((method, route, str(status)), seconds)
+
+
+def count_bytes(stage: str, amount: int) -> None:
+    if amount:
+        BYTES.inc((stage,), amount)
+
+
+def count_json_warnings(stage: str, amount: int = 1) -> None:
+    if amount:
+        JSON_WARNINGS.inc((stage,), amount)
+
+
+def snapshot() -> Dict[str, Any]:
+    return {"pid": os.getpid(), "metrics": {metric.name: metric.snapshot() for metric in _METRICS}}
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+def flush() -> None:
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _snapshot_path(os.getpid())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(snapshot(), fh)
+    os.replace(tmp, path)
+
+
+_flusher: Dict[str, Any] = {"pid": None}
+
+
+def start_flusher() -> None:
+    # Called in every worker process after the fork
+    if not METRICS_DIR or _flusher["pid"] == os.getpid():
+        return
+    _flusher["pid"] = os.getpid()
+
+    def loop() -> None:
+        while True:
+            time.sleep(METRICS_FLUSH_SECONDS)
+            try:
+                flush()
+            except OSError:
+                pass
+
+    threading.Thread(target=loop, name="metrics-flush", daemon=True).start()
+    atexit.register(flush)
+
+
+def clear_snapshots() -> None:
+    # Fresh counters when the server (not just a worker) starts
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return
+    for name in os.listdir(METRICS_DIR):
+        if name.endswith(".json") or name.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(METRICS_DIR, name))
+            except OSError:
+                pass
+
+
+def _other_snapshots() -> List[Dict[str, Any]]:
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return []
+    own = f"{os.getpid()}.json"
+    items = []
+    for name in os.listdir(METRICS_DIR):
+        if not name.endswith(".json") or name == own:
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name), "r", encoding="utf-8") as fh:
+                items.append(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return items
+
+
+def render() -> str:
+    merged: Dict[str, Dict[Tuple[str, ...], Any]] = {}
+    for metric in _METRICS:
+        merged[metric.name] = {tuple(labels): value for labels, value in metric.snapshot()}
+    for other in _other_snapshots():
+        for metric in _METRICS:
+            for labels, value in (other.get("metrics") or {}).get(metric.name, []):
+                metric.merge(merged[metric.name], tuple(labels), value)
+
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.render(merged[metric.name]))
+    for gauge in _GAUGES:
+        lines.extend(gauge.render())
+    return "\n".join(lines) + "\n"
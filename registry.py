@@ -0,0 +1,357 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from compact import COMPACT_FILE, load_compact
+from incremental import load_incremental_bundle, train_incremental
+from train import MODEL_FILES, MODEL_BUNDLE_FILE, META_FILE, train_models
+
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+HISTORY_FILE = "HISTORY"
+MODEL_RELOAD_SECONDS = float(os.getenv("ML_LOG_ANALYZER_MODEL_RELOAD_SECONDS", "2"))
+MODEL_KEEP_VERSIONS = int(os.getenv("ML_LOG_ANALYZER_MODEL_KEEP_VERSIONS", "5"))
+MODEL_LOADED_MAX = int(os.getenv("ML_LOG_ANALYZER_MODEL_LOADED_MAX", "3"))
+# Serve model_compact.npz (NumPy-only scorer) instead of the joblib bundle when present
+COMPACT_MODELS = os.getenv("ML_LOG_ANALYZER_COMPACT_MODELS", "1").lower() not in ("0", "false", "no")
+
+_EMPTY = {
+    "vectorizer": None,
+    "priority": None,
+    "category": None,
+    "reason": None,
+    "meta": None,
+    "version": None,
+    "format": None
+}
+
+
+class UnknownModelVersion(LookupError):
+    pass
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _new_version_id() -> str:
+    # Sorts chronologically; the suffix keeps concurrent runs apart
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ") + "-" + uuid.uuid4().hex[:6]
+
+
+def _write_text_atomic(path: str, text: str) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        fh.write(text)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_model_dir(path: str, version: Optional[str] = None) -> Dict[str, Any]:
+    # Reads one model directory (compact file, bundle or legacy three-file layout) into a
+    # new snapshot dict. Arrays are memory-mapped, so versions loaded in
+    # several processes share the page cache instead of private copies.
+    models = dict(_EMPTY)
+    bundle_path = os.path.join(path, MODEL_BUNDLE_FILE)
+    compact_path = os.path.join(path, COMPACT_FILE)
+    loaded: List[str] = []
+
+    if COMPACT_MODELS and os.path.exists(compact_path):
+        # Same transform/predict API as the bundle, without scikit-learn
+        compact = load_compact(path)
+        models["vectorizer"] = compact.vectorizer
+        for key in MODEL_FILES:
+            models[key] = compact.heads.get(key)
+        models["format"] = "compact"
+        loaded.append(compact_path)
+    elif os.path.exists(bundle_path):
+        # joblib (and scikit-learn, by unpickling) is first imported here
+        import joblib
+
+        bundle = joblib.load(bundle_path, mmap_mode="r")
+        heads = bundle.get("heads") or {}
+        models["vectorizer"] = bundle.get("vectorizer")
+        for key in MODEL_FILES:
+            models[key] = heads.get(key)
+        models["format"] = "bundle"
+        loaded.append(bundle_path)
+    else:
+        # Legacy layout: one full TF-IDF pipeline per head
+        import joblib
+
+        for key, file_name in MODEL_FILES.items():
+            file_path = os.path.join(path, file_name)
+            if os.path.exists(file_path):
+                models[key] = joblib.load(file_path, mmap_mode="r")
+                models["format"] = "legacy"
+                loaded.append(file_path)
+
+    meta_path = os.path.join(path, META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as fh:
+            models["meta"] = json.load(fh)
+
+    if version is None:
+        version = "-".join(f"{os.path.basename(p)}@{os.stat(p).st_mtime_ns}" for p in loaded) or None
+    models["version"] = version
+    return models
+
+
+class ModelRegistry:
+    # Layout below model_dir:
+    #   versions/<id>/   one directory per training run, never modified
+    #   CURRENT          id of the active version, replaced atomically
+    #   HISTORY          activated ids, one per line (used for rollback)
+    # Without CURRENT the flat files in model_dir are served as before.
+    #
+    # Readers call current() and keep the returned dict for the whole
+    # request; a swap rebinds self._current and never mutates a snapshot,
+    # so no reader lock is needed.
+
+    def __init__(self, model_dir: str, on_swap: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 reload_seconds: float = MODEL_RELOAD_SECONDS, max_loaded: int = MODEL_LOADED_MAX):
+        self.model_dir = model_dir
+        self.on_swap = on_swap
+        self.reload_seconds = reload_seconds
+        self.max_loaded = max(1, max_loaded)
+        self._current: Dict[str, Any] = dict(_EMPTY)
+        self._checked_at: Optional[float] = None
+        self._pointer: Any = None
+        self._loaded: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def versions_dir(self) -> str:
+        return os.path.join(self.model_dir, VERSIONS_DIR)
+
+    def version_path(self, version: str) -> str:
+        # Versions come from requests as well: only plain directory names
+        if not version or os.path.basename(version) != version or version.startswith("."):
+            raise UnknownModelVersion(version)
+        return os.path.join(self.versions_dir, version)
+
+    def _current_path(self) -> str:
+        return os.path.join(self.model_dir, CURRENT_FILE)
+
+    def current_version(self) -> Optional[str]:
+        try:
+            with open(self._current_path(), "r", encoding="utf-8") as fh:
+                return fh.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _legacy_pointer(self) -> Any:
+        stamps = []
+        for file_name in [COMPACT_FILE, MODEL_BUNDLE_FILE, *MODEL_FILES.values()]:
+            try:
+                stamps.append((file_name, os.stat(os.path.join(self.model_dir, file_name)).st_mtime_ns))
+            except FileNotFoundError:
+                continue
+        return ("legacy", tuple(stamps))
+
+    def snapshot(self) -> Dict[str, Any]:
+        # Whatever is loaded right now, without checking CURRENT or loading
+        return self._current
+
+    def current(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.reload_seconds:
+            return self._current
+        self._checked_at = now
+        version = self.current_version()
+        pointer = version if version is not None else self._legacy_pointer()
+        if pointer != self._pointer:
+            self.reload()
+        return self._current
+
+    def reload(self) -> Dict[str, Any]:
+        with self._lock:
+            version = self.current_version()
+            pointer: Any = version if version is not None else self._legacy_pointer()
+            self._checked_at = time.monotonic()
+            if pointer == self._pointer:
+                return self._current
+            if version is not None:
+                snapshot = self._get_locked(version)
+            else:
+                snapshot = load_model_dir(self.model_dir)
+            self._pointer = pointer
+            previous = self._current
+            self._current = snapshot
+        if self.on_swap is not None and snapshot["version"] != previous["version"]:
+            self.on_swap(snapshot)
+        return snapshot
+
+    def _get_locked(self, version: str) -> Dict[str, Any]:
+        snapshot = self._loaded.get(version)
+        if snapshot is not None:
+            self._loaded.move_to_end(version)
+            return snapshot
+        path = self.version_path(version)
+        if not os.path.isdir(path):
+            raise UnknownModelVersion(version)
+        snapshot = load_model_dir(path, version)
+        self._loaded[version] = snapshot
+        while len(self._loaded) > self.max_loaded:
+            self._loaded.popitem(last=False)
+        return snapshot
+
+    def get(self, version: Optional[str] = None) -> Dict[str, Any]:
+        # A specific version for one request; loaded once and kept in a
+        # small LRU next to the current one
+        if not version:
+            return self.current()
+        current = self.current()
+        if current["version"] == version:
+            return current
+        with self._lock:
+            return self._get_locked(version)
+
+    def loaded_versions(self) -> List[str]:
+        # Versions held in memory by this process (current one first)
+        with self._lock:
+            loaded = list(self._loaded)
+            current = self._current.get("version")
+        if current is not None:
+            loaded = [current] + [v for v in loaded if v != current]
+        return loaded
+
+    def list(self) -> List[Dict[str, Any]]:
+        current = self.current_version()
+        items = []
+        if os.path.isdir(self.versions_dir):
+            for name in sorted(os.listdir(self.versions_dir), reverse=True):
+                path = self.version_path(name)
+                if name.startswith(".") or not os.path.isdir(path):
+                    continue
+                meta: Dict[str, Any] = {}
+                meta_path = os.path.join(path, META_FILE)
+                if os.path.exists(meta_path):
+                    with open(meta_path, "r", encoding="utf-8") as fh:
+                        meta = json.load(fh)
+                items.append({
+                    "version": name,
+                    "current": name == current,
+                    "trained_at": meta.get("trained_at"),
+                    "data_path": meta.get("data_path"),
+                    "mode": meta.get("mode", "full"),
+                    "base_version": meta.get("base_version")
+                })
+        return items
+
+    def activate(self, version: str) -> Dict[str, Any]:
+        if not os.path.isdir(self.version_path(version)):
+            raise UnknownModelVersion(version)
+        os.makedirs(self.model_dir, exist_ok=True)
+        _write_text_atomic(self._current_path(), version + "\n")
+        with open(os.path.join(self.model_dir, HISTORY_FILE), "a", encoding="utf-8") as fh:
+            fh.write(version + "\n")
+        return self.reload()
+
+    def rollback(self, version: Optional[str] = None) -> Dict[str, Any]:
+        # Without an explicit target, go back to the version that was active
+        # before the current one (skipping versions pruned in the meantime)
+        if version is None:
+            current = self.current_version()
+            history_path = os.path.join(self.model_dir, HISTORY_FILE)
+            history: List[str] = []
+            if os.path.exists(history_path):
+                with open(history_path, "r", encoding="utf-8") as fh:
+                    history = [line.strip() for line in fh if line.strip()]
+            candidates = [v for v in reversed(history) if v != current and os.path.isdir(self.version_path(v))]
+            if not candidates:
+                raise UnknownModelVersion("no previous version to roll back to")
+            version = candidates[0]
+        return self.activate(version)
+
+    def train(self, data_path: str, progress: Optional[Callable[[str], None]] = None, mode: str = "full",
+              chunk_size: Optional[int] = None, fresh: bool = False,
+              max_per_class: Optional[int] = None) -> Dict[str, Any]:
+        # Trains into a hidden staging directory and renames it into place,
+        # so a half-written version is never visible or loaded.
+        # mode="incremental" continues the current version if it was trained
+        # incrementally as well (unless fresh), otherwise starts a new one.
+        if mode not in ("full", "incremental"):
+            raise ValueError(f"unknown training mode: {mode}")
+        version = _new_version_id()
+        staging = os.path.join(self.versions_dir, f".{version}.tmp")
+        os.makedirs(self.versions_dir, exist_ok=True)
+        try:
+            if mode == "incremental":
+                base_version = None if fresh else self.current_version()
+                base = load_incremental_bundle(self.version_path(base_version)) if base_version else None
+                meta = train_incremental(data_path=data_path, out_dir=staging, base=base,
+                                         chunk_size=chunk_size, progress=progress)
+                meta["base_version"] = base_version if base is not None else None
+            else:
+                meta = train_models(data_path=data_path, out_dir=staging, progress=progress,
+                                    max_per_class=max_per_class)
+            meta["version"] = version
+            meta["trained_at"] = _now()
+            with open(os.path.join(staging, META_FILE), "w", encoding="utf-8") as fh:
+                json.dump(meta, fh, indent=2)
+            os.replace(staging, self.version_path(version))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.activate(version)
+        self.prune()
+        return meta
+
+    def prune(self, keep: int = MODEL_KEEP_VERSIONS) -> List[str]:
+        if keep <= 0 or not os.path.isdir(self.versions_dir):
+            return []
+        current = self.current_version()
+        names = sorted(
+            (n for n in os.listdir(self.versions_dir)
+             if not n.startswith(".") and os.path.isdir(self.version_path(n))),
+            reverse=True
+        )
+        removed = []
+        for name in names[keep:]:
+            if name == current:
+                continue
+            shutil.rmtree(self.version_path(name), ignore_errors=True)
+            with self._lock:
+                self._loaded.pop(name, None)
+            removed.append(name)
+        return removed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", default=os.getenv("ML_LOG_ANALYZER_MODEL_DIR", "models"))
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    train_parser = sub.add_parser("train")
+    train_parser.add_argument("--data", default="data/logs_train.jsonl")
+    train_parser.add_argument("--mode", choices=["full", "incremental"], default="full")
+    train_parser.add_argument("--fresh", action="store_true")
+    train_parser.add_argument("--chunk-size", type=int, default=None)
+    train_parser.add_argument("--max-per-class", type=int, default=None)
+    activate_parser = sub.add_parser("activate")
+    activate_parser.add_argument("version")
+    rollback_parser = sub.add_parser("rollback")
+    rollback_parser.add_argument("version", nargs="?")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.models)
+    if args.command == "list":
+        print(json.dumps(registry.list(), indent=2))
+    elif args.command == "train":
+        print(json.dumps(registry.train(args.data, mode=args.mode, chunk_size=args.chunk_size, fresh=args.fresh,
+                                        max_per_class=args.max_per_class),
+                         indent=2))
+    elif args.command == "activate":
+        print(registry.activate(args.version)["version"])
+    else:
+        print(registry.rollback(args.version)["version"])
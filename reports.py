@@ -0,0 +1,322 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from compression import open_binary
+
+REPORT_SUFFIX = ".report"
+FORMAT_VERSION = 1
+META_NAME = "meta.json"
+ROWS_NAME = "rows.jsonl"
+OFFSETS_NAME = "offsets.npy"
+# Compressed reports: rows.jsonl.gz is a series of independent gzip members
+# of BLOCK_ROWS rows each, blocks.npy their start in the file, so a page
+# only decompresses the blocks it touches
+COMPRESSED_ROWS_NAME = "rows.jsonl.gz"
+BLOCKS_NAME = "blocks.npy"
+BLOCK_ROWS = 1024
+# Dictionary-coded columns the page API can filter on: (name, side, field)
+FILTER_COLUMNS = [
+    ("priority", "result", "priority"),
+    ("category", "result", "category"),
+    ("reason", "result", "reason"),
+    ("service", "log", "service"),
+    ("level", "log", "level"),
+    ("route", "log", "route"),
+    ("status", "log", "status_code")
+]
+# Rows the UI counts as errors: either of these matches
+ERROR_LEVELS = ["ERROR", "CRITICAL"]
+ERROR_PRIORITIES = ["high", "critical"]
+# Same order as the priority grouping in the UI; other values follow
+PRIORITY_ORDER = ["critical", "high", "medium", "low", "unknown"]
+CODE_MISSING = -1
+
+
+def is_paged_report(path: str) -> bool:
+    return path.endswith(REPORT_SUFFIX)
+
+
+def _codes_name(column: str) -> str:
+    return f"{column}.codes.npy"
+
+
+def _value_counts(codes: np.ndarray, values: List[str]) -> Dict[str, Any]:
+    # Shift by one so CODE_MISSING lands in bin 0
+    counts = np.bincount(np.asarray(codes, dtype=np.int64) + 1, minlength=len(values) + 1)
+    by_value = {values[code]: int(n) for code, n in enumerate(counts[1:]) if n}
+    return {
+        "counts": dict(sorted(by_value.items(), key=lambda item: item[1], reverse=True)),
+        "missing": int(counts[0])
+    }
+
+
+class StreamingReportWriter:
+    # Writes an analysis report as a .report directory one batch at a time:
+    # rows.jsonl holds one {"log", "result"} line per row, offsets.npy the
+    # byte offset of every line and <column>.codes.npy the dictionary codes
+    # of the filter columns. Only the codes and offsets (a few bytes per
+    # row) are kept in memory until close.
+
+    def __init__(self, report_dir: str, report_name: str, created_at: str, source: str,
+                 compress: bool = False):
+        os.makedirs(report_dir, exist_ok=True)
+        self.report_name = report_name
+        self.path = os.path.join(report_dir, report_name)
+        self.count = 0
+        self.created_at = created_at
+        self.source = source
+        self._tmp_dir = tempfile.mkdtemp(prefix=".report-", dir=report_dir)
+        self.compress = compress
+        self._rows = open(os.path.join(self._tmp_dir, COMPRESSED_ROWS_NAME if compress else ROWS_NAME), "wb")
+        self._block: List[bytes] = []
+        self._blocks = array("q")
+        self._offsets = array("q", [0])
+        self._codes = {name: array("i") for name, _, _ in FILTER_COLUMNS}
+        self._values: Dict[str, Dict[str, int]] = {name: {} for name, _, _ in FILTER_COLUMNS}
+
+    def _code(self, column: str, value: Any) -> int:
+        if value is None or value == "":
+            return CODE_MISSING
+        values = self._values[column]
+        key = str(value)
+        code = values.get(key)
+        if code is None:
+            code = len(values)
+            values[key] = code
+        return code
+
+    def write_batch(self, logs: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> None:
+        for log, result in zip(logs, results):
+            line = (json.dumps({"log": log, "result": result}) + "\n").encode("utf-8")
+            if self.compress:
+                self._block.append(line)
+                if len(self._block) >= BLOCK_ROWS:
+                    self._flush_block()
+            else:
+                self._rows.write(line)
+            self._offsets.append(self._offsets[-1] + len(line))
+            for name, side, field in FILTER_COLUMNS:
+                row = log if side == "log" else result
+                value = row.get(field) if isinstance(row, dict) else None
+                self._codes[name].append(self._code(name, value))
+            self.count += 1
+
+    def _flush_block(self) -> None:
+        if not self._block:
+            return
+        self._blocks.append(self._rows.tell())
+        self._rows.write(gzip.compress(b"".join(self._block), mtime=0))
+        self._block = []
+
+    def close(self, extra: Optional[Dict[str, Any]] = None) -> str:
+        if self.compress:
+            self._flush_block()
+            np.save(os.path.join(self._tmp_dir, BLOCKS_NAME), np.frombuffer(self._blocks, dtype=np.int64))
+        self._rows.close()
+        np.save(os.path.join(self._tmp_dir, OFFSETS_NAME), np.frombuffer(self._offsets, dtype=np.int64))
+        columns = {name: list(values) for name, values in self._values.items()}
+        aggregates = {}
+        for name, codes in self._codes.items():
+            array_codes = np.frombuffer(codes, dtype=np.int32)
+            np.save(os.path.join(self._tmp_dir, _codes_name(name)), array_codes)
+            aggregates[name] = _value_counts(array_codes, columns[name])
+        meta: Dict[str, Any] = {
+            "format": "report",
+            "version": FORMAT_VERSION,
+            "created_at": self.created_at,
+            "source": self.source,
+            "count": self.count,
+            "rows_file": COMPRESSED_ROWS_NAME if self.compress else ROWS_NAME,
+            "columns": columns,
+            "aggregates": aggregates
+        }
+        meta.update(extra or {})
+        with open(os.path.join(self._tmp_dir, META_NAME), "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+        old = None
+        if os.path.exists(self.path):
+            old = self._tmp_dir + ".old"
+            os.replace(self.path, old)
+        os.replace(self._tmp_dir, self.path)
+        if old:
+            shutil.rmtree(old, ignore_errors=True)
+        return self.report_name
+
+    def abort(self) -> None:
+        self._rows.close()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+
+class PagedReport:
+    # Read side of a .report directory. Filters work on the memory-mapped
+    # code arrays; only the rows of the requested page are read and parsed.
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, META_NAME), "r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        if meta.get("format") != "report" or meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported report format: {path}")
+        self.meta = meta
+        self.columns: Dict[str, List[str]] = meta.get("columns") or {}
+        self._offsets = np.load(os.path.join(path, OFFSETS_NAME), mmap_mode="r")
+        self.rows_path = os.path.join(path, meta.get("rows_file") or ROWS_NAME)
+        self._blocks = None
+        if self.rows_path.endswith(".gz"):
+            self._blocks = np.load(os.path.join(path, BLOCKS_NAME), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return int(self.meta.get("count", 0))
+
+    def codes(self, column: str) -> np.ndarray:
+        if column not in self.columns:
+            raise KeyError(column)
+        return np.load(os.path.join(self.path, _codes_name(column)), mmap_mode="r")
+
+    def _match_codes(self, column: str, wanted: Sequence[str]) -> List[int]:
+        # Case-insensitive, like the filters in the UI; "" selects rows
+        # without a value
+        lowered = {str(v).lower() for v in wanted}
+        codes = [code for code, value in enumerate(self.columns[column]) if value.lower() in lowered]
+        if "" in lowered:
+            codes.append(CODE_MISSING)
+        return codes
+
+    def mask(self, filters: Optional[Dict[str, Sequence[str]]] = None, errors: bool = False) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        for column, wanted in (filters or {}).items():
+            if not wanted:
+                continue
+            mask &= np.isin(self.codes(column), self._match_codes(column, wanted))
+        if errors:
+            mask &= (np.isin(self.codes("level"), self._match_codes("level", ERROR_LEVELS))
+                     | np.isin(self.codes("priority"), self._match_codes("priority", ERROR_PRIORITIES)))
+        return mask
+
+    def aggregate(self, group_by: Sequence[str], filters: Optional[Dict[str, Sequence[str]]] = None,
+                  search: Optional[str] = None, errors: bool = False) -> Dict[str, Any]:
+        # Value counts per group_by column over the rows passing the filters;
+        # unfiltered counts were stored by the writer
+        stored = self.meta.get("aggregates") or {}
+        if not filters and not search and not errors and all(column in stored for column in group_by):
+            return {"total": len(self), "groups": {column: stored[column] for column in group_by}}
+        mask = self.mask(filters, errors)
+        if search:
+            mask = self._search_mask(search, mask)
+        groups = {column: _value_counts(np.asarray(self.codes(column))[mask], self.columns[column])
+                  for column in group_by}
+        return {"total": int(mask.sum()), "groups": groups}
+
+    def _search_mask(self, term: str, mask: np.ndarray) -> np.ndarray:
+        # Free-text search has no index: one sequential pass over rows.jsonl
+        # that only parses lines containing the term at all
+        needle = term.lower()
+        found = np.zeros(len(self), dtype=bool)
+        with open_binary(self.rows_path) as fh:
+            for idx, line in enumerate(fh):
+                if not mask[idx]:
+                    continue
+                text = line.decode("utf-8")
+                if needle not in text.lower():
+                    continue
+                log = json.loads(text).get("log") or {}
+                hay = f"{log.get('message') or ''} {log.get('reason') or ''} {log.get('route') or ''}".lower()
+                found[idx] = needle in hay
+        return found
+
+    def _priority_order(self, indices: np.ndarray) -> np.ndarray:
+        values = self.columns.get("priority") or []
+        ranks = np.array(
+            [PRIORITY_ORDER.index(v.lower()) if v.lower() in PRIORITY_ORDER else len(PRIORITY_ORDER) for v in values]
+            + [len(PRIORITY_ORDER) + 1],
+            dtype=np.int32
+        )
+        # CODE_MISSING (-1) picks the last rank
+        row_ranks = ranks[np.asarray(self.codes("priority"))[indices]]
+        return indices[np.argsort(row_ranks, kind="stable")]
+
+    def select(self, filters: Optional[Dict[str, Sequence[str]]] = None, search: Optional[str] = None,
+               sort: Optional[str] = None, errors: bool = False) -> np.ndarray:
+        mask = self.mask(filters, errors)
+        if search:
+            mask = self._search_mask(search, mask)
+        indices = np.flatnonzero(mask)
+        if sort == "priority" and "priority" in self.columns:
+            indices = self._priority_order(indices)
+        return indices
+
+    def _read_block(self, fh, block: int) -> bytes:
+        start = int(self._blocks[block])
+        end = int(self._blocks[block + 1]) if block + 1 < len(self._blocks) else None
+        fh.seek(start)
+        return gzip.decompress(fh.read(end - start if end is not None else -1))
+
+    def read_rows(self, indices: Iterable[int]) -> List[Dict[str, Any]]:
+        rows = []
+        blocks: Dict[int, bytes] = {}
+        with open(self.rows_path, "rb") as fh:
+            for idx in indices:
+                start = int(self._offsets[idx])
+                end = int(self._offsets[idx + 1])
+                if self._blocks is None:
+                    fh.seek(start)
+                    raw = fh.read(end - start)
+                else:
+                    block = int(idx) // BLOCK_ROWS
+                    if block not in blocks:
+                        blocks[block] = self._read_block(fh, block)
+                    base = int(self._offsets[block * BLOCK_ROWS])
+                    raw = blocks[block][start - base:end - base]
+                row = json.loads(raw)
+                row["index"] = int(idx)
+                rows.append(row)
+        return rows
+
+    def page(self, offset: int = 0, limit: int = 50, filters: Optional[Dict[str, Sequence[str]]] = None,
+             search: Optional[str] = None, sort: Optional[str] = None, errors: bool = False) -> Dict[str, Any]:
+        indices = self.select(filters, search, sort, errors)
+        return {
+            "total": int(indices.size),
+            "offset": offset,
+            "limit": limit,
+            "rows": self.read_rows(indices[offset:offset + limit])
+        }
+
+
+def report_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def json_report_to_paged(src: str, dst_dir: str, compress: bool = False) -> str:
+    # One-off conversion of an old analysis_*.json report; the only place
+    # that still loads a whole report
+    with open(src, "r", encoding="utf-8") as fh:
+        report = json.load(fh)
+    name = os.path.splitext(os.path.basename(src))[0] + REPORT_SUFFIX
+    writer = StreamingReportWriter(dst_dir, name, report.get("created_at", ""), report.get("source", ""), compress)
+    try:
+        writer.write_batch(report.get("logs") or [], report.get("results") or [])
+    except BaseException:
+        writer.abort()
+        raise
+    extra = {k: v for k, v in report.items() if k not in ("created_at", "source", "count", "logs", "results")}
+    return writer.close(extra)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert analysis_*.json reports to the paged .report layout")
+    parser.add_argument("reports", nargs="+")
+    parser.add_argument("--compress", action="store_true", help="store the rows gzip-compressed in blocks")
+    args = parser.parse_args()
+
+    for report_path in args.reports:
+        print(json_report_to_paged(report_path, os.path.dirname(os.path.abspath(report_path)), args.compress))
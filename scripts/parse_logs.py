@@ -1,7 +1,25 @@
 import argparse
+import hashlib
 import json
+import multiprocessing
+import os
 import re
-from typing import Dict, List, Optional
+import shutil
+import tempfile
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from compression import is_compressed, open_binary, open_text
+from logcol import is_logcol, write_logcol
+from metrics import observe_stage
+from scripts.templates import TemplateMiner, templates_path, write_templates
 
 TIMESTAMP_RE = re.compile(
     r"^(?P<ts>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - (?P<service>[^ ]+) - (?P<level>[A-Z]+) - (?P<msg>.*)$"
@@ -10,6 +28,13 @@ ROUTE_RE = re.compile(r"\bon (?P<route>/[^\s\[]+)")
 METHOD_RE = re.compile(r"\[(GET|POST|PUT|PATCH|DELETE)\]")
 STATUS_RE = re.compile(r"\b([2345]\d{2})\b")
 
+# Below this many bytes per worker the process pool costs more than it saves
+MIN_PARALLEL_CHUNK_BYTES = 1024 * 1024
+# Follow mode: bytes read per poll at most, and how much of the start of a
+# file identifies it across restarts (inode numbers get reused)
+FOLLOW_READ_BYTES = 8 * 1024 * 1024
+FINGERPRINT_BYTES = 1024
+
 LABEL_RULES = [
     ("missing authorization header", "auth", "medium"),
     ("jwt", "auth", "medium"),
@@ -48,6 +73,132 @@ REASON_RULES = [
 ]
 
 
+# Optional JSON file overriding the tables above:
+# {"label_rules": [[needle, label, priority], ...], "reason_rules": [[needle, reason], ...]}
+RULES_FILE = os.getenv("ML_LOG_ANALYZER_RULES_FILE")
+RULES_RELOAD_SECONDS = float(os.getenv("ML_LOG_ANALYZER_RULES_RELOAD_SECONDS", "2"))
+
+_rules: Dict[str, Any] = {
+    "compiled": None,
+    "source": None,
+    "mtime": None,
+    "checked_at": 0.0,
+    "error": None
+}
+
+
+def _trie_regex(needles: Iterable[str]) -> Optional["re.Pattern[str]"]:
+    # Alternatives are factored into a trie so the regex engine only follows
+    # the branch of the next character instead of trying every needle, and
+    # optional groups are greedy, so each match is the longest needle there.
+    trie: Dict[str, Any] = {}
+    for needle in needles:
+        node = trie
+        for ch in needle:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, Any]) -> str:
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    if not trie:
+        return None
+    return re.compile(emit(trie))
+
+
+def _best_prefix_rules(needles: List[str], table: List[str]) -> Dict[str, Optional[int]]:
+    # Every needle occurring at a position is a prefix of the longest needle
+    # matched there, so the winning rule for a match is the lowest table
+    # index among the prefixes of the matched text.
+    first: Dict[str, int] = {}
+    for idx, needle in enumerate(table):
+        first.setdefault(needle, idx)
+    best: Dict[str, Optional[int]] = {}
+    for needle in needles:
+        hits = [first[needle[:k]] for k in range(1, len(needle) + 1) if needle[:k] in first]
+        best[needle] = min(hits) if hits else None
+    return best
+
+
+def compile_rules(label_rules: List[Tuple[str, str, str]], reason_rules: List[Tuple[str, str]]) -> Dict[str, Any]:
+    label_rules = [(str(n).lower(), label, priority) for n, label, priority in label_rules if n]
+    reason_rules = [(str(n).lower(), reason) for n, reason in reason_rules if n]
+    needles = sorted({n for n, _, _ in label_rules} | {n for n, _ in reason_rules})
+    return {
+        "label_rules": label_rules,
+        "reason_rules": reason_rules,
+        "pattern": _trie_regex(needles),
+        "label_best": _best_prefix_rules(needles, [n for n, _, _ in label_rules]),
+        "reason_best": _best_prefix_rules(needles, [n for n, _ in reason_rules])
+    }
+
+
+def load_rules(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as fh:
+        data = json.load(fh)
+    label_rules = [tuple(r) for r in data.get("label_rules", LABEL_RULES)]
+    reason_rules = [tuple(r) for r in data.get("reason_rules", REASON_RULES)]
+    return compile_rules(label_rules, reason_rules)
+
+
+def _current_rules() -> Dict[str, Any]:
+    # Compiled tables are replaced as a whole, never mutated, so a reload
+    # can't mix rule indexes of the old and the new tables mid-match.
+    if _rules["compiled"] is None:
+        _rules.update(compiled=compile_rules(LABEL_RULES, REASON_RULES), source="builtin")
+    if not RULES_FILE:
+        return _rules["compiled"]
+
+    now = time.monotonic()
+    if now - _rules["checked_at"] < RULES_RELOAD_SECONDS and _rules["source"] == RULES_FILE:
+        return _rules["compiled"]
+    _rules["checked_at"] = now
+    try:
+        mtime = os.stat(RULES_FILE).st_mtime
+        if mtime != _rules["mtime"] or _rules["source"] != RULES_FILE:
+            _rules.update(compiled=load_rules(RULES_FILE), source=RULES_FILE, mtime=mtime, error=None)
+    except (OSError, ValueError, TypeError) as exc:
+        # Keep matching with the last good rules until the file is fixed
+        _rules["error"] = str(exc)
+    return _rules["compiled"]
+
+
+def _match_rules(msg: str) -> Tuple[Optional[Tuple[str, str, str]], Optional[Tuple[str, str]]]:
+    # One pass over the lowercased message for both tables; returns the
+    # winning (first listed) label rule and reason rule. Searching again from
+    # match.start() + 1 also finds needles overlapping a previous match.
+    rules = _current_rules()
+    pattern = rules["pattern"]
+    if pattern is None:
+        return None, None
+    label_best = rules["label_best"]
+    reason_best = rules["reason_best"]
+    label_idx: Optional[int] = None
+    reason_idx: Optional[int] = None
+    pos = 0
+    while True:
+        m = pattern.search(msg, pos)
+        if m is None:
+            break
+        found = m.group()
+        idx = label_best[found]
+        if idx is not None and (label_idx is None or idx < label_idx):
+            label_idx = idx
+        idx = reason_best[found]
+        if idx is not None and (reason_idx is None or idx < reason_idx):
+            reason_idx = idx
+        if label_idx == 0 and reason_idx == 0:
+            break
+        pos = m.start() + 1
+    label_rule = rules["label_rules"][label_idx] if label_idx is not None else None
+    reason_rule = rules["reason_rules"][reason_idx] if reason_idx is not None else None
+    return label_rule, reason_rule
+
+
 def _default_priority(level: str) -> str:
     if level == "ERROR":
         return "high"
@@ -56,29 +207,26 @@ def _default_priority(level: str) -> str:
     return "low"
 
 
-def _apply_rules(message: str, level: str) -> Dict[str, Optional[str]]:
-    msg = message.lower()
-    for needle, label, priority in LABEL_RULES:
-        if needle in msg:
-            return {"label": label, "priority": priority}
-    return {"label": None, "priority": _default_priority(level)}
+def _rules_result(label_rule: Optional[Tuple[str, str, str]], level: str) -> Dict[str, Optional[str]]:
+    if label_rule is None:
+        return {"label": None, "priority": _default_priority(level)}
+    _, label, priority = label_rule
+    return {"label": label, "priority": priority}
 
 
-def _extract_reason(message: str) -> str | None:
-    msg = message.lower()
-    for needle, reason in REASON_RULES:
-        if needle in msg:
-            return reason
-    return None
+def _apply_rules(message: str, level: str) -> Dict[str, Optional[str]]:
+    label_rule, _ = _match_rules(message.lower())
+    return _rules_result(label_rule, level)
 
 
-def _append_record(records: List[Dict[str, str]], current: Optional[Dict[str, str]]) -> None:
-    if current:
-        records.append(current)
+def _extract_reason(message: str) -> str | None:
+    _, reason_rule = _match_rules(message.lower())
+    return reason_rule[1] if reason_rule else None
 
 
-def parse_lines(lines: List[str]) -> List[Dict[str, str]]:
-    records: List[Dict[str, str]] = []
+def iter_records(lines: Iterable[str]) -> Iterator[Dict[str, str]]:
+    # Lazy variant of parse_lines: accepts any line iterable (e.g. an open
+    # file) and yields each record once the next record start is seen.
     current: Optional[Dict[str, str]] = None
 
     for raw in lines:
@@ -88,7 +236,8 @@ def parse_lines(lines: List[str]) -> List[Dict[str, str]]:
 
         m = TIMESTAMP_RE.match(line)
         if m:
-            _append_record(records, current)
+            if current:
+                yield current
             current = {
                 "timestamp": m.group("ts"),
                 "service": m.group("service"),
@@ -107,7 +256,14 @@ def parse_lines(lines: List[str]) -> List[Dict[str, str]]:
         else:
             current["message"] = f"{current['message']} | {line.strip()}"
 
-    _append_record(records, current)
+    if current:
+        yield current
+
+
+def parse_lines(lines: Iterable[str]) -> List[Dict[str, str]]:
+    started = time.perf_counter()
+    records = list(iter_records(lines))
+    observe_stage("parse_lines", time.perf_counter() - started, len(records))
     return records
 
 
@@ -121,8 +277,9 @@ def enrich_record(rec: Dict[str, str]) -> Dict[str, str]:
     method = method_match.group(1) if method_match else None
     status_code = int(status_match.group(1)) if status_match else None
 
-    rules = _apply_rules(message, rec.get("level") or "INFO")
-    reason = _extract_reason(message)
+    label_rule, reason_rule = _match_rules(message.lower())
+    rules = _rules_result(label_rule, rec.get("level") or "INFO")
+    reason = reason_rule[1] if reason_rule else None
 
     return {
         "message": message,
@@ -138,23 +295,490 @@ def enrich_record(rec: Dict[str, str]) -> Dict[str, str]:
     }
 
 
+def iter_enriched(records: Iterable[Dict[str, str]], every: int = 10000) -> Iterator[Dict[str, str]]:
+    # Only the enrich_record calls are timed (not the consumer); the total
+    # is reported every `every` rows instead of per row
+    spent = 0.0
+    count = 0
+    for rec in records:
+        started = time.perf_counter()
+        row = enrich_record(rec)
+        spent += time.perf_counter() - started
+        count += 1
+        if count == every:
+            observe_stage("enrich_record", spent, count)
+            spent = 0.0
+            count = 0
+        yield row
+    if count:
+        observe_stage("enrich_record", spent, count)
+
+
+def write_jsonl(rows: Iterable[Dict[str, str]], out: TextIO) -> int:
+    count = 0
+    for row in rows:
+        out.write(json.dumps(row, ensure_ascii=True) + "\n")
+        count += 1
+    return count
+
+
+def iter_templated(rows: Iterable[Dict[str, Any]], miner: TemplateMiner) -> Iterator[Dict[str, Any]]:
+    for row in rows:
+        row["template_id"] = miner.add(row.get("message") or "")
+        yield row
+
+
+def _iter_atomized(lines: Iterable[str], miner: Optional[TemplateMiner] = None) -> Iterator[Dict[str, Any]]:
+    rows = iter_enriched(iter_records(lines))
+    if miner is not None:
+        rows = iter_templated(rows, miner)
+    return rows
+
+
+def atomize_stream(lines: Iterable[str], out: TextIO, miner: Optional[TemplateMiner] = None) -> int:
+    return write_jsonl(_iter_atomized(lines, miner), out)
+
+
+def atomize_to_path(lines: Iterable[str], output_path: str, miner: Optional[TemplateMiner] = None) -> int:
+    # JSONL (compressed for .jsonl.gz etc.), or the columnar format when
+    # the output ends with .logcol
+    if is_logcol(output_path):
+        return write_logcol(_iter_atomized(lines, miner), output_path)
+    with open_text(output_path, "w") as out:
+        return atomize_stream(lines, out, miner)
+
+
+# Line ends of text-mode reading (universal newlines): a bare \r ends a
+# line as well, also inside what a binary readline() returns as one line
+_LINE_END_RE = re.compile(rb"\r\n|\r|\n")
+
+
+def _split_lines(raw: bytes) -> List[bytes]:
+    # Universal-newline lines of a block of bytes, line ends included; the
+    # last one may have none
+    if b"\r" not in raw:
+        return [raw]
+    lines = []
+    start = 0
+    for m in _LINE_END_RE.finditer(raw):
+        lines.append(raw[start:m.end()])
+        start = m.end()
+    if start < len(raw):
+        lines.append(raw[start:])
+    return lines
+
+
+def _decode_line(raw: bytes) -> str:
+    # One line from _split_lines as text-mode reading returns it
+    line = raw.decode("utf-8")
+    if line.endswith("\r\n"):
+        return line[:-2] + "\n"
+    if line.endswith("\r"):
+        return line[:-1] + "\n"
+    return line
+
+
+def _record_start_offsets(input_path: str, parts: int) -> List[int]:
+    # Split points are moved forward to the next line matching TIMESTAMP_RE,
+    # so continuation lines (tracebacks) always stay with their record and
+    # every range parses exactly like the same lines would in a serial run.
+    size = os.path.getsize(input_path)
+    offsets = [0]
+    with open(input_path, "rb") as fh:
+        for i in range(1, parts):
+            target = max(size * i // parts, offsets[-1])
+            fh.seek(target)
+            if target:
+                fh.readline()
+            while True:
+                pos = fh.tell()
+                raw = fh.readline()
+                if not raw:
+                    pos = size
+                    break
+                if TIMESTAMP_RE.match(_decode_line(_split_lines(raw)[0])):
+                    break
+            if offsets[-1] < pos < size:
+                offsets.append(pos)
+    offsets.append(size)
+    return offsets
+
+
+def _iter_range_lines(input_path: str, start: int, end: int) -> Iterator[str]:
+    with open(input_path, "rb") as fh:
+        fh.seek(start)
+        pos = start
+        while pos < end:
+            raw = fh.readline()
+            if not raw:
+                break
+            pos += len(raw)
+            for line in _split_lines(raw):
+                yield _decode_line(line)
+
+
+def _atomize_range(input_path: str, start: int, end: int, part_path: str) -> int:
+    with open(part_path, "w", encoding="utf-8") as out:
+        return atomize_stream(_iter_range_lines(input_path, start, end), out)
+
+
+def _iter_part_rows(part_paths: List[str]) -> Iterator[Dict[str, Any]]:
+    for part_path in part_paths:
+        with open(part_path, "r", encoding="utf-8") as part:
+            for line in part:
+                yield json.loads(line)
+
+
+def atomize_file(input_path: str, output_path: str, workers: int = 1,
+                 miner: Optional[TemplateMiner] = None) -> int:
+    size = os.path.getsize(input_path)
+    parts = min(max(workers, 1), max(size // MIN_PARALLEL_CHUNK_BYTES, 1))
+    # Compressed input can't be split at byte offsets: read it in one stream
+    if parts <= 1 or is_compressed(input_path):
+        with open_text(input_path) as fh:
+            return atomize_to_path(fh, output_path, miner)
+
+    offsets = _record_start_offsets(input_path, parts)
+    out_dir = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.TemporaryDirectory(dir=out_dir, prefix=".atomize-") as tmp_dir:
+        part_paths = [os.path.join(tmp_dir, f"part{i:04d}.jsonl") for i in range(len(offsets) - 1)]
+        # forkserver: this runs in threaded server processes, where a fork
+        # could inherit locks held by other threads and deadlock
+        with ProcessPoolExecutor(max_workers=min(workers, len(part_paths)),
+                                 mp_context=multiprocessing.get_context("forkserver")) as pool:
+            futures = [
+                pool.submit(_atomize_range, input_path, offsets[i], offsets[i + 1], part_paths[i])
+                for i in range(len(part_paths))
+            ]
+            count = sum(f.result() for f in futures)
+        # Ranges are record aligned, so concatenating in order equals the serial output
+        if miner is not None or is_logcol(output_path):
+            # Template ids depend on the order messages are seen, so mining
+            # happens here, over the merged stream (as does column encoding)
+            rows = _iter_part_rows(part_paths)
+            if miner is not None:
+                rows = iter_templated(rows, miner)
+            if is_logcol(output_path):
+                write_logcol(rows, output_path)
+            else:
+                with open_text(output_path, "w") as out:
+                    write_jsonl(rows, out)
+            return count
+        with open_binary(output_path, "wb") as out:
+            for part_path in part_paths:
+                with open(part_path, "rb") as part:
+                    shutil.copyfileobj(part, out, 1024 * 1024)
+    return count
+
+
+def _write_json_atomic(path: str, data: Any) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(data, fh)
+    os.replace(tmp_path, path)
+
+
+def _stat(path: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def _file_id(st: os.stat_result) -> List[int]:
+    return [st.st_dev, st.st_ino]
+
+
+def _fingerprint(fh, length: int) -> str:
+    return hashlib.blake2b(os.pread(fh.fileno(), length, 0), digest_size=16).hexdigest()
+
+
+class LogFollower:
+    # Tails a raw log: every poll() returns the records completed by the
+    # bytes appended since the last one. A record is complete once the next
+    # TIMESTAMP_RE line (or the end of a rotated/truncated file) is seen, so
+    # tracebacks are never split; a line without its newline yet waits for
+    # the next poll.
+    #
+    # The checkpoint holds the offset of the first record not handed out yet
+    # (buffered lines are simply read again), the file's device/inode and a
+    # hash of its first bytes:
+    #   restart      continue at the offset if it is still the same file
+    #   rotation     (renamed, new file created) the rest of the old file is
+    #                read through the open handle, or after a restart through
+    #                the file next to it with the stored inode; then the new
+    #                file from the start
+    #   truncation   (copytruncate) the file is read again from the start
+    # commit() stores the position once the caller has stored the records,
+    # so a crash in between replays them instead of losing them.
+
+    def __init__(self, path: str, checkpoint_path: str, from_end: bool = False,
+                 read_bytes: int = FOLLOW_READ_BYTES):
+        self.path = path
+        self.checkpoint_path = checkpoint_path
+        self.from_end = from_end
+        self.read_bytes = read_bytes
+        self.rotations = 0
+        self.truncations = 0
+        self._fh = None
+        self._file_id: Optional[List[int]] = None
+        self._read_pos = 0
+        self._record_pos = 0
+        self._pending: List[str] = []
+        self._fingerprint: Optional[str] = None
+        self._fingerprint_bytes = 0
+        self._committed: Any = None
+        self._checkpoint: Optional[Dict[str, Any]] = None
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "r", encoding="utf-8") as fh:
+                self._checkpoint = json.load(fh)
+        checkpoint = self._checkpoint or {}
+        # Caller state stored with the position (e.g. the output size)
+        self.extra: Dict[str, Any] = checkpoint.get("extra") or {}
+        self.rotations = int(checkpoint.get("rotations") or 0)
+        self.truncations = int(checkpoint.get("truncations") or 0)
+
+    def _matches(self, fh, checkpoint: Dict[str, Any]) -> bool:
+        length = int(checkpoint.get("fingerprint_bytes") or 0)
+        if os.fstat(fh.fileno()).st_size < max(int(checkpoint.get("offset") or 0), length):
+            return False
+        return not length or _fingerprint(fh, length) == checkpoint.get("fingerprint")
+
+    def _find_rotated(self, file_id: List[int]) -> Optional[str]:
+        # Rotated copies keep the name as prefix (app.log.1, app.log-2026...)
+        folder = os.path.dirname(os.path.abspath(self.path))
+        base = os.path.basename(self.path)
+        for name in sorted(os.listdir(folder)):
+            if not name.startswith(base) or name == base:
+                continue
+            st = _stat(os.path.join(folder, name))
+            if st is not None and _file_id(st) == file_id:
+                return os.path.join(folder, name)
+        return None
+
+    def _use(self, fh, offset: int) -> None:
+        if self._fh is not None and self._fh is not fh:
+            self._fh.close()
+        self._fh = fh
+        self._file_id = _file_id(os.fstat(fh.fileno()))
+        self._read_pos = self._record_pos = offset
+        self._pending = []
+        self._fingerprint = None
+        self._fingerprint_bytes = 0
+
+    def _open(self) -> None:
+        checkpoint, self._checkpoint = self._checkpoint, None
+        st = _stat(self.path)
+        if checkpoint and checkpoint.get("file_id"):
+            offset = int(checkpoint.get("offset") or 0)
+            if st is not None and _file_id(st) == checkpoint["file_id"]:
+                fh = open(self.path, "rb")
+                if self._matches(fh, checkpoint):
+                    self._use(fh, offset)
+                    return
+                fh.close()
+                self.truncations += 1
+            else:
+                rotated = self._find_rotated(checkpoint["file_id"])
+                if rotated is not None:
+                    fh = open(rotated, "rb")
+                    if self._matches(fh, checkpoint):
+                        # Drained first; poll() moves on to the new file
+                        self._use(fh, offset)
+                        return
+                    fh.close()
+            if st is not None:
+                self._use(open(self.path, "rb"), 0)
+            return
+        if st is not None:
+            self._use(open(self.path, "rb"), st.st_size if self.from_end else 0)
+
+    def _emit(self, records: List[Dict[str, str]]) -> None:
+        if self._pending:
+            records.extend(iter_records(self._pending))
+            self._pending = []
+
+    def _read(self, records: List[Dict[str, str]], final: bool = False) -> bool:
+        # Reads complete lines (about read_bytes at most) and returns whether
+        # it got to the end of the file; final also takes a last line that
+        # has no newline
+        fh = self._fh
+        fh.seek(self._read_pos)
+        data = fh.read(self.read_bytes)
+        at_end = len(data) < self.read_bytes
+        end = data.rfind(b"\n") + 1
+        while not end and not at_end:
+            # A single line longer than read_bytes
+            more = fh.read(self.read_bytes)
+            data += more
+            at_end = len(more) < self.read_bytes
+            end = data.rfind(b"\n") + 1
+        if final and at_end:
+            end = len(data)
+        pos = self._read_pos
+        start = 0
+        while start < end:
+            stop = data.find(b"\n", start, end) + 1 or end
+            for raw in _split_lines(data[start:stop]):
+                line = _decode_line(raw)
+                if self._pending and TIMESTAMP_RE.match(line.rstrip("\n")):
+                    self._emit(records)
+                    self._record_pos = pos
+                self._pending.append(line)
+                pos += len(raw)
+            start = stop
+        self._read_pos = pos
+        return at_end
+
+    def _finish_file(self, records: List[Dict[str, str]]) -> None:
+        # End of a rotated or truncated file: the buffered record is complete
+        self._emit(records)
+        self._record_pos = self._read_pos
+
+    def _truncated(self, st: os.stat_result) -> bool:
+        if st.st_size < self._read_pos:
+            return True
+        # Truncated and already written past the old position again
+        return self._fingerprint is not None and _fingerprint(self._fh, self._fingerprint_bytes) != self._fingerprint
+
+    def poll(self) -> List[Dict[str, str]]:
+        records: List[Dict[str, str]] = []
+        if self._fh is None:
+            self._open()
+            if self._fh is None:
+                return records
+        st = _stat(self.path)
+        if st is not None and _file_id(st) == self._file_id and self._truncated(st):
+            self._finish_file(records)
+            self.truncations += 1
+            self._use(self._fh, 0)
+        drained = self._read(records)
+        if st is None or _file_id(st) == self._file_id:
+            # Same file, or rotated away and not recreated yet
+            return records
+        if drained:
+            self._read(records, final=True)
+            self._finish_file(records)
+            self.rotations += 1
+            self._use(open(self.path, "rb"), 0)
+            self._read(records)
+        return records
+
+    def position(self) -> Dict[str, Any]:
+        return {
+            "file_id": self._file_id,
+            "offset": self._record_pos,
+            "read": self._read_pos,
+            "buffered_lines": len(self._pending),
+            "rotations": self.rotations,
+            "truncations": self.truncations
+        }
+
+    def commit(self, **extra: Any) -> None:
+        self.extra.update(extra)
+        if self._fh is not None and self._fingerprint_bytes < FINGERPRINT_BYTES:
+            length = min(FINGERPRINT_BYTES, os.fstat(self._fh.fileno()).st_size)
+            if length > self._fingerprint_bytes:
+                self._fingerprint = _fingerprint(self._fh, length)
+                self._fingerprint_bytes = length
+        state = {
+            "path": self.path,
+            "file_id": self._file_id,
+            "offset": self._record_pos,
+            "fingerprint": self._fingerprint,
+            "fingerprint_bytes": self._fingerprint_bytes,
+            "rotations": self.rotations,
+            "truncations": self.truncations,
+            "extra": self.extra
+        }
+        if state == self._committed:
+            return
+        _write_json_atomic(self.checkpoint_path, state)
+        self._committed = state
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def follow_checkpoint_path(output_path: str) -> str:
+    return output_path + ".checkpoint.json"
+
+
+def open_follow_output(output_path: str, follower: LogFollower) -> TextIO:
+    # Rows written after the last checkpoint are replayed, so they are cut
+    # off first (exactly-once output across crashes)
+    out_bytes = follower.extra.get("out_bytes")
+    if out_bytes is not None and os.path.exists(output_path) and os.path.getsize(output_path) > out_bytes:
+        os.truncate(output_path, out_bytes)
+    return open(output_path, "a", encoding="utf-8")
+
+
+def follow_file(input_path: str, output_path: str, checkpoint_path: Optional[str] = None,
+                interval: float = 1.0, from_end: bool = False,
+                on_batch: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> int:
+    # Appends the atomized records of everything written to input_path to
+    # output_path until interrupted
+    follower = LogFollower(input_path, checkpoint_path or follow_checkpoint_path(output_path), from_end=from_end)
+    count = 0
+    try:
+        with open_follow_output(output_path, follower) as out:
+            while True:
+                records = follower.poll()
+                if records:
+                    written = write_jsonl(iter_enriched(records), out)
+                    out.flush()
+                    count += written
+                    if on_batch is not None:
+                        on_batch(written, follower.position())
+                follower.commit(out_bytes=os.fstat(out.fileno()).st_size)
+                if not records:
+                    time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        follower.close()
+    return count
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Parse raw logs into JSONL for training")
     parser.add_argument("--in", dest="input_path", required=True)
-    parser.add_argument("--out", dest="output_path", required=True)
+    parser.add_argument("--out", dest="output_path", required=True,
+                        help="output .jsonl (optionally .jsonl.gz/.bz2/.xz/.zst), or a .logcol directory")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="parse record-aligned ranges of the input in this many processes")
+    parser.add_argument("--templates", action="store_true",
+                        help="add a template_id per record and write <out>.templates.json")
+    parser.add_argument("--follow", action="store_true",
+                        help="keep tailing the input (across rotation) and append new records to --out (.jsonl)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="follow mode: position file (default: <out>.checkpoint.json)")
+    parser.add_argument("--interval", type=float, default=1.0, help="follow mode: seconds between polls")
+    parser.add_argument("--from-end", action="store_true",
+                        help="follow mode without checkpoint: skip what is already in the file")
     args = parser.parse_args()
 
-    with open(args.input_path, "r", encoding="utf-8") as fh:
-        lines = fh.readlines()
+    if args.follow:
+        if args.templates or not args.output_path.endswith(".jsonl"):
+            parser.error("--follow writes plain .jsonl output and doesn't support --templates")
+
+        def report(written: int, position: Dict[str, Any]) -> None:
+            print(f"+{written} records (offset {position['offset']})", flush=True)
 
-    records = parse_lines(lines)
-    enriched = [enrich_record(r) for r in records]
+        count = follow_file(args.input_path, args.output_path, args.checkpoint, args.interval, args.from_end,
+                            on_batch=report)
+        print(f"Appended {count} records to {args.output_path}")
+        return
 
-    with open(args.output_path, "w", encoding="utf-8") as out:
-        for row in enriched:
-            out.write(json.dumps(row, ensure_ascii=True) + "\n")
+    miner = TemplateMiner() if args.templates else None
+    count = atomize_file(args.input_path, args.output_path, workers=args.workers, miner=miner)
 
-    print(f"Wrote {len(enriched)} records to {args.output_path}")
+    print(f"Wrote {count} records to {args.output_path}")
+    if miner is not None:
+        write_templates(templates_path(args.output_path), miner)
+        print(f"Found {len(miner.templates())} templates")
 
 
 if __name__ == "__main__":
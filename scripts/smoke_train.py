@@ -6,14 +6,12 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from train import train_models
-from app import _load_models, _models, build_text
+from app import _predict_logs, _registry
 
 if __name__ == "__main__":
-    result = train_models("data/logs_train.jsonl", "models")
+    result = _registry.train("data/logs_train.jsonl")
     print(json.dumps(result, indent=2))
 
-    _load_models()
     sample = {
         "message": "DB timeout while fetching time entries",
         "level": "ERROR",
@@ -21,9 +19,8 @@ if __name__ == "__main__":
         "route": "/api/timeflow/time-entries",
         "status_code": 500
     }
-    text = build_text(sample)
-
-    if _models["category"]:
-        print("category:", _models["category"].predict([text])[0])
-    if _models["priority"]:
-        print("priority:", _models["priority"].predict([text])[0])
+    result = _predict_logs([sample])[0]
+    if result["category"] is not None:
+        print("category:", result["category"])
+    if result["priority"] is not None:
+        print("priority:", result["priority"])
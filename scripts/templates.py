@@ -0,0 +1,104 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+WILDCARD = "<*>"
+
+# Applied in order to the raw message before tokenizing; the most specific
+# patterns come first so e.g. a UUID is not torn apart by the number mask.
+MASKS = [
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<UUID>"),
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?Z?\b"), "<TS>"),
+    (re.compile(r"\b\d{2}:\d{2}:\d{2}(?:[.,]\d+)?\b"), "<TIME>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<IP>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<HEX>"),
+    (re.compile(r"\b[0-9a-fA-F]{16,}\b"), "<HEX>"),
+    (re.compile(r"\b\d+(?:\.\d+)?(?:ms|us|µs|ns|s|m|h)\b"), "<DUR>"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "<NUM>")
+]
+_HAS_DIGIT = re.compile(r"\d")
+
+
+def mask_message(message: str) -> List[str]:
+    # Every mask needs a digit (all-letter hex aside), so most plain text
+    # messages skip the regex passes entirely
+    if not _HAS_DIGIT.search(message):
+        return message.split()
+    for pattern, placeholder in MASKS:
+        message = pattern.sub(placeholder, message)
+    return message.split()
+
+
+class TemplateMiner:
+    # Drain-style online clustering: messages are routed by token count and
+    # their first `depth` tokens to a small leaf of candidate templates; the
+    # most similar candidate above `similarity` absorbs the message (differing
+    # positions become <*>), otherwise a new template is started.
+
+    def __init__(self, depth: int = 2, similarity: float = 0.5, max_children: int = 100):
+        self.depth = depth
+        self.similarity = similarity
+        self.max_children = max_children
+        self._tree: Dict[Any, Any] = {}
+        self._templates: List[List[str]] = []
+        self._counts: List[int] = []
+
+    def _leaf(self, tokens: List[str]) -> List[int]:
+        node = self._tree.setdefault(len(tokens), {})
+        for token in tokens[:self.depth]:
+            # Tokens that still carry digits are likely variables: don't branch on them
+            key = WILDCARD if _HAS_DIGIT.search(token) else token
+            if key not in node and len(node) >= self.max_children:
+                key = WILDCARD
+            node = node.setdefault(key, {})
+        return node.setdefault(None, [])
+
+    def _score(self, template: List[str], tokens: List[str]) -> float:
+        if not tokens:
+            return 1.0
+        same = sum(1 for a, b in zip(template, tokens) if a == b or a == WILDCARD)
+        return same / len(tokens)
+
+    def add(self, message: str) -> int:
+        tokens = mask_message(message or "")
+        leaf = self._leaf(tokens)
+        best_id: Optional[int] = None
+        best_score = -1.0
+        for template_id in leaf:
+            score = self._score(self._templates[template_id], tokens)
+            if score > best_score:
+                best_id, best_score = template_id, score
+
+        if best_id is not None and best_score >= self.similarity:
+            template = self._templates[best_id]
+            for pos, token in enumerate(tokens):
+                if template[pos] != token:
+                    template[pos] = WILDCARD
+            self._counts[best_id] += 1
+            return best_id
+
+        template_id = len(self._templates)
+        self._templates.append(list(tokens))
+        self._counts.append(1)
+        leaf.append(template_id)
+        return template_id
+
+    def template(self, template_id: int) -> str:
+        return " ".join(self._templates[template_id])
+
+    def templates(self) -> List[Dict[str, Any]]:
+        items = [
+            {"id": template_id, "template": self.template(template_id), "count": count}
+            for template_id, count in enumerate(self._counts)
+        ]
+        items.sort(key=lambda x: x["count"], reverse=True)
+        return items
+
+
+def templates_path(jsonl_path: str) -> str:
+    return jsonl_path + ".templates.json"
+
+
+def write_templates(path: str, miner: TemplateMiner) -> None:
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump({"templates": miner.templates()}, fh, indent=2)
@@ -0,0 +1,193 @@
+import json
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from compression import COMPRESSION_SUFFIXES, open_binary, strip_compression
+
+# Fields a file can be partitioned by; "hour" is derived from timestamp
+SPLIT_KEYS = ("service", "level", "hour")
+NO_VALUE = "none"
+# Part files held open while partitioning; others are reopened for append
+MAX_OPEN_PARTS = 64
+MAX_PARTITIONS = 1000
+
+_HOUR_RE = re.compile(r"(\d{4}-\d{2}-\d{2})[ T](\d{2})")
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def iter_jsonl_lines(path: str) -> Iterator[bytes]:
+    # Raw lines, newline-terminated, blank ones dropped; nothing is decoded
+    # (compressed input is only decompressed)
+    with open_binary(path) as fh:
+        for line in fh:
+            stripped = line.rstrip(b"\r\n")
+            if not stripped.strip():
+                continue
+            yield stripped + b"\n"
+
+
+def partition_value(row: Any, by: str) -> str:
+    if not isinstance(row, dict):
+        return NO_VALUE
+    if by == "hour":
+        match = _HOUR_RE.match(str(row.get("timestamp") or ""))
+        return f"{match.group(1)}T{match.group(2)}" if match else NO_VALUE
+    value = row.get(by)
+    if value is None or value == "":
+        return NO_VALUE
+    return _UNSAFE_RE.sub("_", str(value)).strip("._") or NO_VALUE
+
+
+class _Part:
+    def __init__(self, out_dir: str, prefix: str, compression: str = ""):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.compression = compression
+        self.index = 0
+        self.size = 0
+        self.rows = 0
+        self.fh = None
+        self.files: List[Dict[str, Any]] = []
+
+    def _current(self) -> Dict[str, Any]:
+        return self.files[-1]
+
+    def start_next(self) -> None:
+        self.close()
+        self.index += 1
+        self.size = 0
+        self.rows = 0
+        name = f"{self.prefix}_part{self.index:03d}.jsonl{self.compression}"
+        self.files.append({"name": name, "path": name, "size": 0, "rows": 0})
+        self.fh = open_binary(os.path.join(self.out_dir, name), "wb")
+
+    def reopen(self) -> None:
+        self.fh = open_binary(os.path.join(self.out_dir, self._current()["name"]), "ab")
+
+    def write(self, line: bytes) -> None:
+        self.fh.write(line)
+        self.size += len(line)
+        self.rows += 1
+        current = self._current()
+        current["size"] = self.size
+        current["rows"] = self.rows
+
+    def close(self) -> None:
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+
+class JsonlSplitter:
+    # Writes JSONL lines into part files of at most max_bytes, either in
+    # input order or per partition value (one series of parts per value).
+    # Lines are copied as they are; sizes come from their byte length
+    # (uncompressed, also when the parts are written compressed).
+
+    def __init__(self, out_dir: str, base_name: str, max_bytes: int, by: Optional[str] = None,
+                 compression: str = ""):
+        if by is not None and by not in SPLIT_KEYS:
+            raise ValueError(f"by must be one of {', '.join(SPLIT_KEYS)}")
+        if compression and compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"compression must be one of {', '.join(COMPRESSION_SUFFIXES)}")
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.base_name = base_name
+        self.max_bytes = max_bytes
+        self.by = by
+        self.compression = compression
+        self.count = 0
+        self._parts: Dict[str, _Part] = {}
+        self._open: "OrderedDict[str, _Part]" = OrderedDict()
+
+    def _part(self, value: str) -> _Part:
+        part = self._parts.get(value)
+        if part is None:
+            if len(self._parts) >= MAX_PARTITIONS:
+                raise ValueError(f"more than {MAX_PARTITIONS} distinct values for '{self.by}'")
+            prefix = f"{self.base_name}_{self.by}-{value}" if self.by else self.base_name
+            part = _Part(self.out_dir, prefix, self.compression)
+            self._parts[value] = part
+        return part
+
+    def _touch(self, value: str, part: _Part) -> None:
+        # Bounded number of open handles (hours over months of logs)
+        if part.fh is None and part.files:
+            part.reopen()
+        self._open[value] = part
+        self._open.move_to_end(value)
+        while len(self._open) > MAX_OPEN_PARTS:
+            _, oldest = self._open.popitem(last=False)
+            oldest.close()
+
+    def write(self, line: bytes, row: Any = None) -> None:
+        value = ""
+        if self.by:
+            value = partition_value(row if row is not None else json.loads(line), self.by)
+        part = self._part(value)
+        self._touch(value, part)
+        if part.fh is None or (part.rows and part.size + len(line) > self.max_bytes):
+            part.start_next()
+        part.write(line)
+        self.count += 1
+
+    def close(self) -> Dict[str, Any]:
+        for part in self._parts.values():
+            part.close()
+        self._open.clear()
+        parts = []
+        for value, part in self._parts.items():
+            for entry in part.files:
+                parts.append({**entry, "partition": value} if self.by else entry)
+        return {"count": self.count, "parts": parts, "by": self.by}
+
+
+def split_lines(items: Iterable[Tuple[bytes, Any]], out_dir: str, base_name: str, max_bytes: int,
+                by: Optional[str] = None, warnings: Optional[List[str]] = None,
+                progress: Optional[Callable[[int], None]] = None, every: int = 10000,
+                compression: str = "") -> Dict[str, Any]:
+    # items: (line, decoded row or None); a row is only decoded here when a
+    # partition key is needed and the caller didn't have it
+    splitter = JsonlSplitter(out_dir, base_name, max_bytes, by, compression)
+    try:
+        for idx, (line, row) in enumerate(items, start=1):
+            try:
+                splitter.write(line, row)
+            except json.JSONDecodeError as exc:
+                if warnings is not None:
+                    warnings.append(f"Invalid JSON in row {idx}: {exc}")
+            if progress is not None and idx % every == 0:
+                progress(splitter.count)
+    finally:
+        result = splitter.close()
+    return result
+
+
+def split_jsonl(path: str, out_dir: str, max_bytes: int, by: Optional[str] = None,
+                warnings: Optional[List[str]] = None,
+                progress: Optional[Callable[[int], None]] = None, compression: str = "") -> Dict[str, Any]:
+    base_name = os.path.splitext(os.path.basename(strip_compression(path)))[0]
+    items = ((line, None) for line in iter_jsonl_lines(path))
+    return split_lines(items, out_dir, base_name, max_bytes, by, warnings, progress, compression=compression)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Split a JSONL file into size-limited parts")
+    parser.add_argument("path")
+    parser.add_argument("--out", default=None, help="output directory (default: next to the input)")
+    parser.add_argument("--max-mb", type=float, default=4)
+    parser.add_argument("--by", choices=SPLIT_KEYS, default=None)
+    parser.add_argument("--compress", choices=[s.lstrip(".") for s in COMPRESSION_SUFFIXES], default=None)
+    args = parser.parse_args()
+
+    split_warnings: List[str] = []
+    out = args.out or os.path.dirname(os.path.abspath(args.path))
+    result = split_jsonl(args.path, out, int(args.max_mb * 1024 * 1024), args.by, split_warnings,
+                         compression=f".{args.compress}" if args.compress else "")
+    if split_warnings:
+        result["warnings"] = split_warnings
+    print(json.dumps(result, indent=2))
@@ -1,14 +1,26 @@
 import json
+import multiprocessing
 import os
-from typing import Dict, Any, List
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Dict, Any, Callable, Iterator, List, Optional
 
-import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.pipeline import Pipeline
-from sklearn.svm import LinearSVC
-from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
+import numpy as np
+
+from compact import COMPACT_FILE, term_hash, write_compact
+from compression import open_text
+from logcol import LogColReader, is_logcol
+from metrics import observe_stage
+
+# scikit-learn and joblib take about a second to import; they are imported
+# where a model is trained, so importing this module (build_text) stays cheap
+if TYPE_CHECKING:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.svm import LinearSVC
 
 
 MODEL_FILES = {
@@ -16,7 +28,14 @@ MODEL_FILES = {
     "category": "model_category.joblib",
     "reason": "model_reason.joblib"
 }
+MODEL_BUNDLE_FILE = "model_bundle.joblib"
 META_FILE = "meta.json"
+# Processes for fitting the heads in parallel (1 = sequentially in-process)
+TRAIN_WORKERS = int(os.getenv("ML_LOG_ANALYZER_TRAIN_WORKERS", str(min(3, os.cpu_count() or 1))))
+# Below this many distinct texts the process start-up costs more than the fits take
+MIN_PARALLEL_TRAIN_ROWS = 20000
+# Optional cap of distinct samples per class and head (0 = no cap)
+TRAIN_MAX_PER_CLASS = int(os.getenv("ML_LOG_ANALYZER_TRAIN_MAX_PER_CLASS", "0"))
 
 
 def build_text(row: Dict[str, Any]) -> str:
@@ -30,56 +49,96 @@ def build_text(row: Dict[str, Any]) -> str:
     return " ".join(p for p in parts if p and p != "None").strip()
 
 
-def _load_jsonl(path: str) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
-    with open(path, "r", encoding="utf-8") as fh:
+def _iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    # .jsonl.gz/.bz2/.xz/.zst are decompressed on the fly
+    with open_text(path) as fh:
         for line in fh:
             line = line.strip()
             if not line:
                 continue
-            rows.append(json.loads(line))
-    return rows
+            yield json.loads(line)
+
+
+def _iter_rows(path: str) -> Iterator[Dict[str, Any]]:
+    # Columnar .logcol directories are read without any JSON decoding
+    if is_logcol(path):
+        yield from LogColReader(path).iter_rows()
+        return
+    yield from _iter_jsonl(path)
+
+
+def _build_vectorizer() -> "TfidfVectorizer":
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    return TfidfVectorizer(min_df=1, max_df=0.95, ngram_range=(1, 2))
+
 
+def _build_category_model() -> "LinearSVC":
+    from sklearn.svm import LinearSVC
 
-def _train_category(texts, labels) -> Pipeline:
-    return Pipeline([
-        ("tfidf", TfidfVectorizer(min_df=1, max_df=0.95, ngram_range=(1, 2))),
-        ("clf", LinearSVC())
-    ])
+    return LinearSVC()
 
 
-def _train_priority(texts, labels) -> Pipeline:
-    return Pipeline([
-        ("tfidf", TfidfVectorizer(min_df=1, max_df=0.95, ngram_range=(1, 2))),
-        ("clf", LogisticRegression(max_iter=1000))
-    ])
+def _build_priority_model() -> "LogisticRegression":
+    from sklearn.linear_model import LogisticRegression
 
+    return LogisticRegression(max_iter=1000)
 
-def _train_reason(texts, labels) -> Pipeline:
-    return Pipeline([
-        ("tfidf", TfidfVectorizer(min_df=1, max_df=0.95, ngram_range=(1, 2))),
-        ("clf", LinearSVC())
-    ])
 
+def _build_reason_model() -> "LinearSVC":
+    from sklearn.svm import LinearSVC
+
+    return LinearSVC()
+
+
+# Label field per head; the order is the report order
+HEAD_FIELDS = {
+    "category": "label",
+    "priority": "priority",
+    "reason": "reason"
+}
+# Unfitted estimator per head; _fit_head fits it
+HEAD_BUILDERS = {
+    "category": _build_category_model,
+    "priority": _build_priority_model,
+    "reason": _build_reason_model
+}
+
+
+def _safe_split(items, labels, test_size=0.2):
+    from sklearn.model_selection import train_test_split
 
-def _safe_split(texts, labels, test_size=0.2):
     try:
         return train_test_split(
-            texts,
-            labels,
+            items,
             test_size=test_size,
             random_state=42,
             stratify=labels
         )
     except Exception:
         return train_test_split(
-            texts,
-            labels,
+            items,
             test_size=test_size,
             random_state=42
         )
 
 
+def _split_texts(dataset: Dict[str, Any]) -> np.ndarray:
+    # One split for all heads, by distinct text (stratified by category
+    # where possible): the shared vectorizer is fitted on the training texts
+    # only, and no text is seen in training and scored in the test set
+    category: Dict[str, str] = {}
+    for key in dataset["counts"]:
+        category.setdefault(key[0], key[1])
+    indices = np.arange(len(dataset["texts"]))
+    is_test = np.zeros(len(indices), dtype=bool)
+    if len(indices) < 2:
+        return is_test
+    _, test = _safe_split(indices, [category[text] for text in dataset["texts"]])
+    is_test[test] = True
+    return is_test
+
+
 def _normalize_labels(values):
     out = []
     for v in values:
@@ -95,70 +154,297 @@ def _has_enough_classes(values) -> bool:
     return len(set(values)) >= 2
 
 
-def train_models(data_path: str, out_dir: str) -> Dict[str, Any]:
+def _peak_rss_bytes() -> int:
+    # ru_maxrss is in KiB on Linux, in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _fit_head(head: str, X_train, y_train: List[str], w_train: np.ndarray,
+              X_test, y_test: List[str], w_test: np.ndarray) -> Dict[str, Any]:
+    # Runs in a worker process; everything it needs is passed in, and the
+    # timings/peak RSS are measured where the work happens (including the
+    # native allocations of liblinear/NumPy)
+    from sklearn.metrics import classification_report
+
+    started = time.perf_counter()
+    model = HEAD_BUILDERS[head]()
+    # Rescaled to mean 1: relative frequencies are kept, but the loss doesn't
+    # grow with the duplicate count (which would weaken the regularization
+    # and stall liblinear on repetitive logs)
+    model.fit(X_train, y_train, sample_weight=w_train / w_train.mean())
+    fit_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    report = None
+    if y_test:
+        y_pred = model.predict(X_test)
+        # Weighted by occurrences, so the metrics describe the log stream
+        # while no duplicate of a test sample was seen in training
+        report = classification_report(y_test, y_pred, sample_weight=w_test, output_dict=True, zero_division=0)
+    predict_seconds = time.perf_counter() - started
+
+    return {
+        "head": head,
+        "model": model,
+        "report": report,
+        "timings": {
+            "fit_seconds": round(fit_seconds, 4),
+            "predict_seconds": round(predict_seconds, 4),
+            # Peak of the whole process: per head in the pool (one process
+            # per head), the server's own peak when fitted in-process
+            "peak_rss_bytes": _peak_rss_bytes()
+        }
+    }
+
+
+def _load_dataset(path: str) -> Dict[str, Any]:
+    # Streams the file and collapses rows with the same build_text and the
+    # same labels into one entry with a count; memory grows with the number
+    # of distinct rows, not with the file
+    counts: Dict[tuple, int] = {}
+    present = {head: False for head in HEAD_FIELDS}
+    rows = 0
+    for row in _iter_rows(path):
+        rows += 1
+        for head, field in HEAD_FIELDS.items():
+            if not present[head] and field in row:
+                present[head] = True
+        key = (build_text(row), *_normalize_labels([row.get(field) for field in HEAD_FIELDS.values()]))
+        counts[key] = counts.get(key, 0) + 1
+    texts = list(dict.fromkeys(key[0] for key in counts))
+    return {"rows": rows, "counts": counts, "texts": texts, "present": present}
+
+
+def _cap_per_class(pairs: Dict[tuple, int], max_per_class: int) -> Dict[tuple, int]:
+    # Reservoir sample (algorithm R) of at most max_per_class distinct
+    # samples per label; kept samples retain their weights
+    rng = random.Random(42)
+    reservoirs: Dict[str, List[tuple]] = {}
+    seen: Dict[str, int] = {}
+    for key in pairs:
+        label = key[1]
+        seen[label] = seen.get(label, 0) + 1
+        reservoir = reservoirs.setdefault(label, [])
+        if len(reservoir) < max_per_class:
+            reservoir.append(key)
+        else:
+            slot = rng.randrange(seen[label])
+            if slot < max_per_class:
+                reservoir[slot] = key
+    kept = {key for reservoir in reservoirs.values() for key in reservoir}
+    return {key: n for key, n in pairs.items() if key in kept}
+
+
+def _head_inputs(dataset: Dict[str, Any], X_train, X_test, is_test: np.ndarray,
+                 max_per_class: int = 0) -> Dict[str, Any]:
+    # Per head: distinct (text, label) samples weighted by how often they
+    # occur, as (X, labels, weights) of the training texts followed by the
+    # same for the test texts. Heads without usable labels in the training
+    # texts are left out and get a null report, as before.
+    text_index = {text: i for i, text in enumerate(dataset["texts"])}
+    # Row of every text in X_train or X_test
+    rows = np.empty(len(is_test), dtype=np.int64)
+    rows[~is_test] = np.arange(int((~is_test).sum()))
+    rows[is_test] = np.arange(int(is_test.sum()))
+    inputs: Dict[str, Any] = {}
+    for pos, head in enumerate(HEAD_FIELDS, start=1):
+        if not dataset["present"][head]:
+            continue
+        pairs: Dict[tuple, int] = {}
+        for key, n in dataset["counts"].items():
+            label = key[pos]
+            if head == "reason" and label == "unknown":
+                continue
+            pair = (text_index[key[0]], label)
+            pairs[pair] = pairs.get(pair, 0) + n
+        train_pairs = {pair: n for pair, n in pairs.items() if not is_test[pair[0]]}
+        test_pairs = {pair: n for pair, n in pairs.items() if is_test[pair[0]]}
+        if max_per_class > 0:
+            train_pairs = _cap_per_class(train_pairs, max_per_class)
+        if not _has_enough_classes([label for _, label in train_pairs]):
+            continue
+        head_input = []
+        for X, part in ((X_train, train_pairs), (X_test, test_pairs)):
+            weights = np.fromiter(part.values(), dtype=float, count=len(part))
+            head_input += [X[[int(rows[i]) for i, _ in part]], [label for _, label in part], weights]
+        inputs[head] = tuple(head_input)
+    return inputs
+
+
+def _proba_mode(model) -> Optional[str]:
+    # Which predict_proba LogisticRegression uses (same rule as scikit-learn):
+    # one-vs-rest for binary heads, liblinear and multi_class="ovr",
+    # softmax otherwise
+    if not hasattr(model, "predict_proba"):
+        return None
+    multi_class = getattr(model, "multi_class", "auto")
+    if multi_class in ("ovr", "warn"):
+        return "ovr"
+    if multi_class == "multinomial":
+        return "softmax"
+    if len(model.classes_) <= 2 or getattr(model, "solver", None) == "liblinear":
+        return "ovr"
+    return "softmax"
+
+
+def export_compact(vectorizer, heads: Dict[str, Any], out_dir: str) -> Dict[str, Any]:
+    # Compiles the fitted TfidfVectorizer + linear heads into the NumPy-only
+    # form of compact.py; raises ValueError for anything it can't reproduce
+    settings = vectorizer.get_params()
+    if settings["analyzer"] != "word" or settings["preprocessor"] is not None or settings["tokenizer"] is not None:
+        raise ValueError("only the built-in word analyzer can be exported")
+    if settings["strip_accents"] is not None or settings["binary"] or not settings["use_idf"]:
+        raise ValueError("strip_accents, binary and use_idf=False are not supported")
+    if settings["norm"] not in ("l1", "l2", None):
+        raise ValueError(f"unsupported norm: {settings['norm']}")
+    # Stop words are already missing from vocabulary_, so they need no handling
+
+    vocabulary = vectorizer.vocabulary_
+    terms = sorted(vocabulary, key=vocabulary.get)
+    hashes = np.fromiter((term_hash(term) for term in terms), dtype=np.uint64, count=len(terms))
+    order = np.argsort(hashes, kind="stable")
+    sorted_hashes = hashes[order]
+    if len(sorted_hashes) > 1 and bool((sorted_hashes[1:] == sorted_hashes[:-1]).any()):
+        raise ValueError("vocabulary hash collision")
+
+    weights: List[np.ndarray] = []
+    intercepts: List[np.ndarray] = []
+    arrays: Dict[str, np.ndarray] = {}
+    head_meta: Dict[str, Any] = {}
+    start = 0
+    for head, model in heads.items():
+        coef = getattr(model, "coef_", None)
+        if coef is None or not hasattr(model, "intercept_"):
+            raise ValueError(f"head {head} is not a linear model")
+        coef = coef.toarray() if hasattr(coef, "toarray") else np.asarray(coef)
+        coef = np.atleast_2d(coef).astype(np.float64)
+        weights.append(coef.T[order])
+        intercepts.append(np.broadcast_to(np.asarray(model.intercept_, dtype=np.float64), (coef.shape[0],)))
+        arrays[f"{head}_classes"] = np.asarray(model.classes_).astype(str)
+        head_meta[head] = {"start": start, "width": coef.shape[0], "proba": _proba_mode(model)}
+        start += coef.shape[0]
+
+    arrays["vocab_hash"] = sorted_hashes
+    arrays["idf"] = np.asarray(vectorizer.idf_, dtype=np.float64)[order]
+    arrays["weights"] = np.ascontiguousarray(np.hstack(weights)) if weights else np.zeros((len(terms), 0))
+    arrays["intercept"] = np.concatenate(intercepts) if intercepts else np.zeros(0)
+    meta = {
+        "vectorizer": {
+            "lowercase": settings["lowercase"],
+            "token_pattern": settings["token_pattern"],
+            "ngram_range": list(settings["ngram_range"]),
+            "norm": settings["norm"],
+            "sublinear_tf": settings["sublinear_tf"]
+        },
+        "heads": head_meta
+    }
+    path = write_compact(out_dir, arrays, meta)
+    return {"file": COMPACT_FILE, "features": len(terms), "outputs": start, "bytes": os.path.getsize(path)}
+
+
+def _export_compact_safe(vectorizer, heads: Dict[str, Any], out_dir: str) -> Optional[Dict[str, Any]]:
+    # The joblib bundle stays the source of truth; without a compact file
+    # the registry simply loads the bundle
+    try:
+        return export_compact(vectorizer, heads, out_dir)
+    except ValueError as exc:
+        return {"error": str(exc)}
+
+
+def train_models(data_path: str, out_dir: str,
+                 progress: Optional[Callable[[str], None]] = None,
+                 workers: Optional[int] = None, max_per_class: Optional[int] = None) -> Dict[str, Any]:
     if not os.path.exists(data_path):
         raise FileNotFoundError(f"Data file not found: {data_path}")
 
-    rows = _load_jsonl(data_path)
-    if not rows:
-        raise ValueError("No training rows found")
+    def stage(name: str) -> None:
+        if progress is not None:
+            progress(name)
 
-    texts = [build_text(r) for r in rows]
+    stage("loading")
+    started = time.perf_counter()
+    dataset = _load_dataset(data_path)
+    load_seconds = time.perf_counter() - started
+    observe_stage("train_load", load_seconds, dataset["rows"])
+    if not dataset["rows"]:
+        raise ValueError("No training rows found")
+    if max_per_class is None:
+        max_per_class = TRAIN_MAX_PER_CLASS
 
     os.makedirs(out_dir, exist_ok=True)
 
-    meta: Dict[str, Any] = {"data_path": data_path}
-
-    # Category model
-    if any("label" in r for r in rows):
-        y_cat = _normalize_labels([r.get("label") for r in rows])
-        if _has_enough_classes(y_cat):
-            X_train, X_test, y_train, y_test = _safe_split(texts, y_cat)
-            cat_model = _train_category(X_train, y_train)
-            cat_model.fit(X_train, y_train)
-            y_pred = cat_model.predict(X_test)
-            meta["category_report"] = classification_report(y_test, y_pred, output_dict=True, zero_division=0)
-            joblib.dump(cat_model, os.path.join(out_dir, MODEL_FILES["category"]))
-        else:
-            meta["category_report"] = None
-    else:
-        meta["category_report"] = None
-
-    # Priority model
-    if any("priority" in r for r in rows):
-        y_prio = _normalize_labels([r.get("priority") for r in rows])
-        if _has_enough_classes(y_prio):
-            X_train, X_test, y_train, y_test = _safe_split(texts, y_prio)
-            prio_model = _train_priority(X_train, y_train)
-            prio_model.fit(X_train, y_train)
-            y_pred = prio_model.predict(X_test)
-            meta["priority_report"] = classification_report(y_test, y_pred, output_dict=True, zero_division=0)
-            joblib.dump(prio_model, os.path.join(out_dir, MODEL_FILES["priority"]))
-        else:
-            meta["priority_report"] = None
+    meta: Dict[str, Any] = {"data_path": data_path, "model_file": MODEL_BUNDLE_FILE}
+
+    started = time.perf_counter()
+    is_test = _split_texts(dataset)
+    split_seconds = time.perf_counter() - started
+
+    # One vectorizer for all heads, fitted on the training texts: every
+    # distinct text is tokenized once and every classifier is fitted on the
+    # same sparse matrix.
+    stage("vectorizing")
+    started = time.perf_counter()
+    vectorizer = _build_vectorizer()
+    texts = dataset["texts"]
+    X_train = vectorizer.fit_transform([text for text, test in zip(texts, is_test) if not test])
+    X_test = vectorizer.transform([text for text, test in zip(texts, is_test) if test])
+    vectorize_seconds = time.perf_counter() - started
+    observe_stage("train_vectorize", vectorize_seconds, len(texts))
+    timings: Dict[str, Any] = {"load_seconds": round(load_seconds, 4), "split_seconds": round(split_seconds, 4),
+                               "vectorize_seconds": round(vectorize_seconds, 4)}
+    inputs = _head_inputs(dataset, X_train, X_test, is_test, max_per_class)
+    meta["dataset"] = {
+        "rows": dataset["rows"],
+        "distinct_rows": len(dataset["counts"]),
+        "distinct_texts": len(texts),
+        "test_texts": int(is_test.sum()),
+        "max_per_class": max_per_class or None,
+        "samples": {head: len(head_input[1]) + len(head_input[4]) for head, head_input in inputs.items()}
+    }
+
+    # The heads are independent, so they are fitted side by side in a
+    # process pool (LinearSVC/LogisticRegression fit on a single core)
+    stage("training")
+    started = time.perf_counter()
+    workers = min(workers or TRAIN_WORKERS, len(inputs))
+    if X_train.shape[0] < MIN_PARALLEL_TRAIN_ROWS:
+        workers = 1
+    outputs: Dict[str, Dict[str, Any]] = {}
+    if workers > 1:
+        # A fresh process per head, so each head's peak RSS is its own. Not
+        # forked from this (threaded) server process: a fork could inherit
+        # locks held by other threads (logging, BLAS pools) and deadlock.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"),
+                                 max_tasks_per_child=1) as pool:
+            futures = [pool.submit(_fit_head, head, *head_input) for head, head_input in inputs.items()]
+            for future in as_completed(futures):
+                out = future.result()
+                outputs[out["head"]] = out
+                stage(f"trained {out['head']}")
     else:
-        meta["priority_report"] = None
-
-    # Reason model (optional)
-    if any("reason" in r for r in rows):
-        y_reason_all = _normalize_labels([r.get("reason") for r in rows])
-        filtered = [(t, y) for t, y in zip(texts, y_reason_all) if y != "unknown"]
-        if filtered:
-            X_reason, y_reason = zip(*filtered)
-            y_reason = list(y_reason)
-            if _has_enough_classes(y_reason):
-                X_train, X_test, y_train, y_test = _safe_split(list(X_reason), y_reason)
-                reason_model = _train_reason(X_train, y_train)
-                reason_model.fit(X_train, y_train)
-                y_pred = reason_model.predict(X_test)
-                meta["reason_report"] = classification_report(y_test, y_pred, output_dict=True, zero_division=0)
-                joblib.dump(reason_model, os.path.join(out_dir, MODEL_FILES["reason"]))
-            else:
-                meta["reason_report"] = None
-        else:
-            meta["reason_report"] = None
-    else:
-        meta["reason_report"] = None
+        for head, head_input in inputs.items():
+            stage(head)
+            outputs[head] = _fit_head(head, *head_input)
+    timings["train_seconds"] = round(time.perf_counter() - started, 4)
+    timings["workers"] = max(workers, 1)
+
+    heads: Dict[str, Any] = {}
+    timings["heads"] = {}
+    for head in HEAD_FIELDS:
+        out = outputs.get(head)
+        meta[f"{head}_report"] = out["report"] if out else None
+        if out:
+            heads[head] = out["model"]
+            timings["heads"][head] = out["timings"]
+            observe_stage("train", out["timings"]["fit_seconds"], len(inputs[head][1]), head=head)
+    meta["timings"] = timings
+
+    stage("saving")
+    import joblib
+
+    joblib.dump({"vectorizer": vectorizer, "heads": heads}, os.path.join(out_dir, MODEL_BUNDLE_FILE))
+    meta["compact"] = _export_compact_safe(vectorizer, heads, out_dir)
 
     with open(os.path.join(out_dir, META_FILE), "w", encoding="utf-8") as fh:
         json.dump(meta, fh, indent=2)
@@ -172,7 +458,17 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--data", default="data/logs_train.jsonl")
     parser.add_argument("--out", default="models")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-per-class", type=int, default=None)
+    parser.add_argument("--export-compact", metavar="MODEL_DIR", default=None,
+                        help="only write model_compact.npz for an already trained bundle")
     args = parser.parse_args()
 
-    result = train_models(args.data, args.out)
-    print(json.dumps(result, indent=2))
+    if args.export_compact:
+        import joblib
+
+        bundle = joblib.load(os.path.join(args.export_compact, MODEL_BUNDLE_FILE))
+        result = export_compact(bundle["vectorizer"], bundle["heads"], args.export_compact)
+    else:
+        result = train_models(args.data, args.out, workers=args.workers, max_per_class=args.max_per_class)
+    print(json.dumps(result, indent=2))
\ No newline at end of file
@@ -0,0 +1,232 @@
+import fcntl
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+# Seconds between the supervisor's scans for watches nobody runs
+WATCH_SCAN_SECONDS = 2.0
+# Pause before a process picks up a watch again that failed in it
+WATCH_RETRY_SECONDS = 10.0
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _write_json_atomic(path: str, data: Any) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(data, fh)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class WatchContext:
+    # Handed to the runner, which loops until should_stop(): the watch was
+    # stopped through the API or this process is shutting down.
+
+    def __init__(self, manager: "WatchManager", watch_id: str, stop_event: threading.Event):
+        self._manager = manager
+        self.watch_id = watch_id
+        self._stop_event = stop_event
+        self.status: Dict[str, Any] = {}
+
+    @property
+    def checkpoint_path(self) -> str:
+        return self._manager.checkpoint_path(self.watch_id)
+
+    def should_stop(self) -> bool:
+        if self._stop_event.is_set():
+            return True
+        config = self._manager.config(self.watch_id)
+        return config is None or not config.get("enabled")
+
+    def sleep(self, seconds: float) -> None:
+        self._stop_event.wait(seconds)
+
+    def update(self, **changes: Any) -> None:
+        self.status.update(changes, pid=os.getpid(), updated_at=_now())
+        self._manager.write_status(self.watch_id, self.status)
+
+
+class WatchManager:
+    # Long-running followers of log files. Layout of watch_dir:
+    #   <id>.json             settings and "enabled", written by the API
+    #   <id>.status.json      state/progress, written by the running process
+    #   <id>.checkpoint.json  file position (see LogFollower)
+    #   <id>.lock             flock held by the process running the watch
+    # Each process runs a supervisor thread that starts the enabled watches
+    # whose lock is free, so a watch runs in exactly one gunicorn worker and
+    # is taken over by another one when that worker exits.
+
+    def __init__(self, watch_dir: str, runner: Callable[[Dict[str, Any], WatchContext], None],
+                 scan_seconds: float = WATCH_SCAN_SECONDS, retry_seconds: float = WATCH_RETRY_SECONDS):
+        self.watch_dir = watch_dir
+        self.runner = runner
+        self.scan_seconds = scan_seconds
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._running: Dict[str, threading.Thread] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._pid: Optional[int] = None
+
+    def _config_path(self, watch_id: str) -> str:
+        return os.path.join(self.watch_dir, f"{watch_id}.json")
+
+    def _status_path(self, watch_id: str) -> str:
+        return os.path.join(self.watch_dir, f"{watch_id}.status.json")
+
+    def _lock_path(self, watch_id: str) -> str:
+        return os.path.join(self.watch_dir, f"{watch_id}.lock")
+
+    def checkpoint_path(self, watch_id: str) -> str:
+        return os.path.join(self.watch_dir, f"{watch_id}.checkpoint.json")
+
+    def config(self, watch_id: str) -> Optional[Dict[str, Any]]:
+        return _read_json(self._config_path(watch_id))
+
+    def write_status(self, watch_id: str, status: Dict[str, Any]) -> None:
+        _write_json_atomic(self._status_path(watch_id), status)
+
+    def _ids(self) -> List[str]:
+        if not os.path.isdir(self.watch_dir):
+            return []
+        return sorted(name[:-len(".json")] for name in os.listdir(self.watch_dir)
+                      if name.endswith(".json") and name.count(".") == 1)
+
+    def create(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        os.makedirs(self.watch_dir, exist_ok=True)
+        watch_id = uuid.uuid4().hex
+        config = {"id": watch_id, **params, "enabled": True, "created_at": _now()}
+        _write_json_atomic(self._config_path(watch_id), config)
+        self.scan()
+        return self.get(watch_id)
+
+    def set_enabled(self, watch_id: str, enabled: bool) -> Optional[Dict[str, Any]]:
+        # The running process notices a stop at its next poll and finishes
+        # its pending report first
+        config = self.config(watch_id)
+        if config is None:
+            return None
+        config["enabled"] = enabled
+        _write_json_atomic(self._config_path(watch_id), config)
+        if enabled:
+            with self._lock:
+                self._retry_at.pop(watch_id, None)
+            self.scan()
+        return self.get(watch_id)
+
+    def get(self, watch_id: str) -> Optional[Dict[str, Any]]:
+        config = self.config(watch_id)
+        if config is None:
+            return None
+        status = _read_json(self._status_path(watch_id)) or {}
+        state = status.get("state") or "pending"
+        if not config.get("enabled") and state not in ("stopped", "failed"):
+            state = "stopping" if self._locked(watch_id) else "stopped"
+        elif config.get("enabled") and state in ("following", "waiting") and not self._locked(watch_id):
+            # The process that ran it is gone; another one takes over
+            state = "pending"
+        return {**config, **status, "state": state}
+
+    def list(self) -> List[Dict[str, Any]]:
+        records = [r for r in (self.get(watch_id) for watch_id in self._ids()) if r is not None]
+        records.sort(key=lambda r: r.get("created_at") or "", reverse=True)
+        return records
+
+    def _locked(self, watch_id: str) -> bool:
+        with self._lock:
+            if watch_id in self._running:
+                return True
+        try:
+            fh = open(self._lock_path(watch_id), "a")
+        except OSError:
+            return False
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        finally:
+            fh.close()
+        return False
+
+    def scan(self) -> None:
+        if self._pid != os.getpid() or self._stop.is_set():
+            return
+        now = time.monotonic()
+        for watch_id in self._ids():
+            config = self.config(watch_id)
+            if not config or not config.get("enabled"):
+                continue
+            with self._lock:
+                if watch_id in self._running or self._retry_at.get(watch_id, 0) > now:
+                    continue
+            fh = open(self._lock_path(watch_id), "a")
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # Runs in another process
+                fh.close()
+                continue
+            thread = threading.Thread(target=self._run, args=(watch_id, fh), name=f"watch-{watch_id[:8]}",
+                                      daemon=True)
+            with self._lock:
+                self._running[watch_id] = thread
+            thread.start()
+
+    def _run(self, watch_id: str, lock_fh) -> None:
+        ctx = WatchContext(self, watch_id, self._stop)
+        ctx.status = _read_json(self._status_path(watch_id)) or {}
+        try:
+            config = self.config(watch_id)
+            if config is not None:
+                ctx.update(state="starting", error=None, started_at=_now())
+                self.runner(config, ctx)
+                ctx.update(state="stopped" if not self._stop.is_set() else "pending")
+        except Exception as exc:
+            ctx.update(state="failed", error=str(exc), traceback=traceback.format_exc(limit=5))
+            with self._lock:
+                self._retry_at[watch_id] = time.monotonic() + self.retry_seconds
+        finally:
+            with self._lock:
+                self._running.pop(watch_id, None)
+            lock_fh.close()
+
+    def start(self) -> None:
+        # Once per process (gunicorn: in every worker after the fork)
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._stop.clear()
+
+        def loop() -> None:
+            while not self._stop.wait(self.scan_seconds):
+                try:
+                    self.scan()
+                except OSError:
+                    pass
+
+        self.scan()
+        threading.Thread(target=loop, name="watch-supervisor", daemon=True).start()
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        # Runners finish their current batch, store their report and checkpoint
+        self._stop.set()
+        with self._lock:
+            threads = list(self._running.values())
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))